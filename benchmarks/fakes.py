@@ -0,0 +1,157 @@
+"""
+benchmarks/fakes.py
+
+Deterministic offline stand-ins for Gemini and DuckDuckGo with configurable
+simulated latency, so the answer pipeline can be benchmarked without network
+access. install_fakes() plugs them into the model registry and search getter;
+the real prompts, chains and parsers still run on top of them.
+"""
+
+import json
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Non-English benchmark questions and what the fake translator turns them into
+FAKE_TRANSLATIONS = {
+    "¿Cuáles son los síntomas del asma?": "What are the symptoms of asthma?",
+    "¿Qué es el páncreas?": "What is the pancreas?",
+}
+
+_VOCAB = (
+    "insulin glucose pancreas inflammation airway bronchial symptoms treatment therapy dose "
+    "patients clinical guidelines risk factors diagnosis chronic condition management lifestyle "
+    "exercise diet monitoring medication blood pressure cardiovascular evidence trial outcome"
+).split()
+
+DISCLAIMER = "⚠️ *Always consult a healthcare professional for personal medical advice.*"
+
+
+def filler(words: int, seed: int = 0) -> str:
+    """Deterministic pseudo-medical prose of `words` words."""
+    return " ".join(_VOCAB[(seed + i * 7) % len(_VOCAB)] for i in range(words))
+
+
+def fake_markdown_answer(words: int) -> str:
+    """A DocBot-shaped answer: headings, bullets and a (duplicated) disclaimer to clean up."""
+    per_section = max(words // 4, 1)
+    sections = []
+    for i, heading in enumerate(("Overview", "Causes", "Symptoms", "Treatment")):
+        sections.append(f"### {heading}\n- {filler(per_section, seed=i)}.")
+    return "\n\n".join(sections) + f"\n\n{DISCLAIMER}\n\n{DISCLAIMER}"
+
+
+def _after(marker: str, prompt: str) -> str:
+    return prompt.split(marker, 1)[1].strip() if marker in prompt else prompt
+
+
+# --------------------------------
+# Fake Gemini
+# --------------------------------
+class FakeGeminiChat(BaseChatModel):
+    """
+    Answers each pipeline prompt with deterministic, correctly shaped output.
+    Non-streaming calls take `latency + token_latency * chunks`; streaming calls wait
+    `latency` before the first chunk and `token_latency` between chunks.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 300
+    chunk_words: int = 4
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def respond(self, prompt: str) -> str:
+        if "Return strictly JSON" in prompt:
+            text = _after("Text:", prompt)
+            if text in FAKE_TRANSLATIONS or re.search(r"[^\x00-\x7f]", text):
+                translation = FAKE_TRANSLATIONS.get(text, text)
+                return json.dumps({"language": "Spanish", "translation": translation})
+            return json.dumps({"language": "English", "translation": text})
+        if "Translate the following English text" in prompt:
+            return _after("Text to translate:", prompt)
+        if "medical summarisation assistant" in prompt:
+            bullets = (f"- {filler(self.answer_words // 8, seed=i)} (source {i})" for i in range(5))
+            return "\n".join(bullets) + f"\n\n{DISCLAIMER}"
+        return fake_markdown_answer(self.answer_words)
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [
+            " ".join(words[i:i + self.chunk_words]) + (" " if i + self.chunk_words < len(words) else "")
+            for i in range(0, len(words), self.chunk_words)
+        ]
+
+    @staticmethod
+    def _usage(prompt: str, text: str) -> dict:
+        input_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self.respond(prompt)
+        time.sleep(self.latency + self.token_latency * len(self._chunks(text)))
+        message = AIMessage(content=text, usage_metadata=self._usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self.respond(prompt)
+        time.sleep(self.latency)
+        for i, piece in enumerate(self._chunks(text)):
+            if i:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+# --------------------------------
+# Fake DuckDuckGo
+# --------------------------------
+class FakeSearchEngine:
+    """Drop-in for DuckDuckGoSearchRun: `.run("site:<src> <query>")` returns a fixed-size snippet."""
+
+    def __init__(self, latency: float = 0.0, snippet_words: int = 120):
+        self.latency = latency
+        self.snippet_words = snippet_words
+
+    def run(self, query: str) -> str:
+        time.sleep(self.latency)
+        return f"{query}: " + filler(self.snippet_words, seed=len(query))
+
+
+def install_fakes(latency: float = 0.0, token_latency: float = 0.0, search_latency: float = 0.0,
+                  answer_words: int = 300) -> FakeGeminiChat:
+    """Route every Gemini chain and the search tool to the fakes (call before first use)."""
+    from core.config import GEMINI_MODEL
+    from core.llm import register_chat_model
+    from core.token_usage import token_usage_callback
+    from services import medical_agent, search_engine, summariser, translator
+
+    model = FakeGeminiChat(
+        latency=latency,
+        token_latency=token_latency,
+        answer_words=answer_words,
+        callbacks=[token_usage_callback],
+    )
+    register_chat_model(model, GEMINI_MODEL, 0.0)
+    for getter in (
+        translator.get_translator_chain,
+        translator.get_translator_back_chain,
+        summariser.get_summarise_runnable,
+        summariser.get_localised_summarise_runnable,
+        medical_agent.get_medical_runnable,
+        medical_agent.get_localised_medical_runnable,
+    ):
+        getter.reset()  # rebuild on the fake model if anything was built already
+    search_engine.get_search_engine.override(FakeSearchEngine(search_latency))
+    return model
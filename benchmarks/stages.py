@@ -0,0 +1,267 @@
+"""
+benchmarks/stages.py
+
+Offline stage-level benchmarks: each pipeline stage is timed on its own against
+the fakes in benchmarks/fakes.py (no network, deterministic output), from routing
+and formatting helpers through the caches and rate limiter up to the full
+get_medical_answer path, cold and warm.
+
+    python -m benchmarks.stages --repeat 5 --latency 0.05 --search-latency 0.02 -o bench.json
+    python -m benchmarks.stages --baseline bench.json --tolerance 0.25
+    python -m benchmarks.stages --filter cache.
+
+Every run uses a fresh temporary cache root. Prints a JSON report and exits
+non-zero when a benchmark's median is slower than the baseline by more than
+--tolerance.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EN_SEARCH = "What is the treatment for type 2 diabetes?"
+EN_DIRECT = "What is the function of the pancreas?"
+ES_SEARCH = "¿Cuáles son los síntomas del asma?"
+ROUTING_QUERIES = [EN_SEARCH, EN_DIRECT, "How do you diagnose asthma?", "Tell me about the liver", "What causes migraines"]
+
+
+def benchmark(suite: list, name: str, number: int = 100, setup=None, prime: bool = False):
+    """
+    Register fn under `name`. Each repeat times `number` calls; `setup` runs untimed
+    before every call (e.g. clearing caches for a cold path) and `prime` makes one
+    untimed call first so the timed calls measure the warm path.
+    """
+    def register(fn):
+        suite.append({"name": name, "fn": fn, "number": number, "setup": setup, "prime": prime})
+        return fn
+    return register
+
+
+def run_benchmark(bench: dict, repeat: int) -> dict:
+    per_call = []
+    for _ in range(repeat):
+        if bench["prime"]:
+            bench["fn"]()
+        elapsed = 0.0
+        for _ in range(bench["number"]):
+            if bench["setup"]:
+                bench["setup"]()
+            start = time.perf_counter()
+            bench["fn"]()
+            elapsed += time.perf_counter() - start
+        per_call.append(elapsed / bench["number"])
+    median = statistics.median(per_call)
+    return {
+        "median_s": round(median, 9),
+        "min_s": round(min(per_call), 9),
+        "max_s": round(max(per_call), 9),
+        "ops_per_s": round(1 / median, 1) if median else None,
+        "calls": bench["number"] * repeat,
+    }
+
+
+# --------------------------------
+# Suite
+# --------------------------------
+def build_suite(args) -> list:
+    """Define the benchmarks (imports happen here, after the cache root is set)."""
+    import diskcache as dc
+
+    from benchmarks.fakes import fake_markdown_answer, filler, install_fakes
+    from core.cache_manager import cache_result, clear_caches, get_cached_result, summary_cache
+    from core.rate_limiter import SlidingWindowLimiter
+    from core.tiered_cache import TieredCache
+    from services.medical_agent import get_medical_answer, stream_medical_answer
+    from services.router import should_search
+    from services.search_engine import SAFE_SOURCES, medical_search
+    from services.summariser import prepare_sources
+    from services.translator import detect_and_translate
+    from utils.formatting import StreamingCleaner, clean_response_text, format_sources
+
+    install_fakes(args.latency, args.token_latency, args.search_latency, args.answer_words)
+    suite = []
+
+    # --- Pure helpers ---
+    @benchmark(suite, "router.should_search", number=10_000)
+    def _():
+        for query in ROUTING_QUERIES:
+            should_search(query)
+
+    sources = {src: filler(150, seed=i) for i, src in enumerate(SAFE_SOURCES)}
+
+    @benchmark(suite, "formatting.format_sources", number=2_000)
+    def _():
+        format_sources(sources)
+
+    @benchmark(suite, "summarise.prepare_sources", number=500)
+    def _():
+        prepare_sources(sources, EN_SEARCH)
+
+    large_response = "\n\n".join(fake_markdown_answer(2_000) for _ in range(5))  # ~75 KB
+
+    @benchmark(suite, "formatting.clean_response_text.large", number=50)
+    def _():
+        clean_response_text(large_response)
+
+    stream_pieces = [large_response[i:i + 16] for i in range(0, len(large_response), 16)]
+
+    @benchmark(suite, "formatting.streaming_cleaner.large", number=20)
+    def _():
+        cleaner = StreamingCleaner()
+        for piece in stream_pieces:
+            cleaner.feed(piece)
+        cleaner.finish()
+
+    # --- Caches ---
+    summary_text = fake_markdown_answer(args.answer_words)
+    cache_result(summary_cache, "what is the treatment for type 2 diabetes", summary_text)
+    disk_only = TieredCache(summary_cache.disk, ttl=0, name="bench_disk_only")
+
+    @benchmark(suite, "cache.hot_hit", number=5_000)
+    def _():
+        get_cached_result(summary_cache, "what is the treatment for type 2 diabetes")
+
+    @benchmark(suite, "cache.disk_hit", number=1_000)
+    def _():
+        get_cached_result(disk_only, "what is the treatment for type 2 diabetes")
+
+    @benchmark(suite, "cache.miss", number=1_000)
+    def _():
+        get_cached_result(summary_cache, "how long does a sprained ankle take to heal", similar=False)
+
+    @benchmark(suite, "cache.similar_hit", number=500)
+    def _():
+        get_cached_result(summary_cache, "what treatment is there for type 2 diabetes")
+
+    @benchmark(suite, "translate.cache_hit", number=2_000, prime=True)
+    def _():
+        detect_and_translate(ES_SEARCH)
+
+    @benchmark(suite, "translate.english_fast_path", number=2_000)
+    def _():
+        detect_and_translate(EN_SEARCH)
+
+    # --- Rate limiter ---
+    local_limiter = SlidingWindowLimiter(10 ** 12, 60, 1)
+    shared_limiter = SlidingWindowLimiter(10 ** 12, 60, 1, store=dc.Cache(os.path.join(args.cache_root, "bench_rl")))
+
+    def limiter_calls(limiter, calls):
+        for _ in range(calls):
+            if not limiter.would_exceed(100):
+                limiter.record(100)
+
+    @benchmark(suite, "rate_limiter.local.1000_calls", number=20)
+    def _():
+        limiter_calls(local_limiter, 1_000)
+
+    @benchmark(suite, "rate_limiter.local.8_threads_x_1000_calls", number=5)
+    def _():
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: limiter_calls(local_limiter, 1_000), range(8)))
+
+    @benchmark(suite, "rate_limiter.shared.1000_calls", number=2)
+    def _():
+        limiter_calls(shared_limiter, 1_000)
+
+    # --- Search ---
+    @benchmark(suite, "search.cold", number=5, setup=clear_caches)
+    def _():
+        medical_search(EN_SEARCH)
+
+    @benchmark(suite, "search.cached", number=500, prime=True)
+    def _():
+        medical_search(EN_SEARCH)
+
+    # --- Full pipeline ---
+    for label, query in (("en_search", EN_SEARCH), ("en_direct", EN_DIRECT), ("es_search", ES_SEARCH)):
+        benchmark(suite, f"answer.{label}.cold", number=5, setup=clear_caches)(
+            lambda q=query: get_medical_answer(q)
+        )
+        benchmark(suite, f"answer.{label}.warm", number=50, prime=True)(
+            lambda q=query: get_medical_answer(q)
+        )
+
+    @benchmark(suite, "answer.en_search.stream.cold", number=5, setup=clear_caches)
+    def _():
+        "".join(stream_medical_answer(EN_SEARCH))
+
+    @benchmark(suite, "answer.es_search.single_pass.cold", number=5, setup=clear_caches)
+    def _():
+        get_medical_answer(ES_SEARCH, single_pass=True)
+
+    return suite
+
+
+# --------------------------------
+# Baseline Comparison
+# --------------------------------
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return [(name, baseline_s, current_s)] for benchmarks slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before and current["median_s"] > before["median_s"] * (1 + tolerance):
+            regressions.append((name, before["median_s"], current["median_s"]))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmarks with fake Gemini/DuckDuckGo.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Gemini seconds per call.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Fake Gemini seconds per streamed chunk.")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="Fake DuckDuckGo seconds per source.")
+    parser.add_argument("--answer-words", type=int, default=300, help="Length of fake model answers.")
+    parser.add_argument("-o", "--output", help="Write the JSON report here (usable as a later --baseline).")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%).")
+    args = parser.parse_args()
+
+    # Caches, similarity index and rate-limit state go to a throwaway root
+    args.cache_root = tempfile.mkdtemp(prefix="docbot-bench-")
+    os.environ["DOCBOT_CACHE_DIR"] = args.cache_root
+    logging.disable(logging.INFO)
+
+    from core.progress import progress_listener
+
+    results = {}
+    with progress_listener(lambda level, message, data: None):
+        for bench in build_suite(args):
+            if args.filter in bench["name"]:
+                results[bench["name"]] = run_benchmark(bench, args.repeat)
+                print(f"{bench['name']:<45} {results[bench['name']]['median_s'] * 1000:10.3f} ms", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "token_latency": args.token_latency,
+            "search_latency": args.search_latency,
+            "answer_words": args.answer_words,
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            lines = [f"  {name}: {before * 1000:.3f} ms -> {now * 1000:.3f} ms" for name, before, now in regressions]
+            sys.exit("Performance regressions:\n" + "\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+benchmarks/startup.py
+
+Cold-start benchmark: import time of the app and time-to-first-render of app.py,
+each measured in a fresh interpreter so nothing is already cached in sys.modules.
+
+    python -m benchmarks.startup --runs 5 --import-budget 1.0 --render-budget 3.0
+
+Prints a JSON report and exits non-zero when a median exceeds its budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should stay unloaded until the first question is asked
+HEAVY_MODULES = ["langchain", "langchain_google_genai", "google.generativeai", "langchain_community"]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import interface.streamlit_ui
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in HEAVY if m in sys.modules]}))
+"""
+
+RENDER_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120)
+at.secrets["GOOGLE_API_KEY"] = "startup-benchmark"
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [m for m in HEAVY if m in sys.modules],
+    "errors": [e.value for e in at.exception],
+}))
+"""
+
+
+def run_snippet(snippet: str) -> dict:
+    code = f"HEAVY = {HEAVY_MODULES!r}\n{snippet}"
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(snippet: str, runs: int) -> dict:
+    samples = [run_snippet(snippet) for _ in range(runs)]
+    seconds = [s["seconds"] for s in samples]
+    return {
+        "median_s": round(statistics.median(seconds), 4),
+        "min_s": round(min(seconds), 4),
+        "max_s": round(max(seconds), 4),
+        "heavy_modules_loaded": samples[-1]["loaded"],
+        **({"errors": samples[-1]["errors"]} if samples[-1].get("errors") else {}),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-render.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=None, help="Max median import seconds.")
+    parser.add_argument("--render-budget", type=float, default=None, help="Max median first-render seconds.")
+    args = parser.parse_args()
+
+    report = {
+        "import": measure(IMPORT_SNIPPET, args.runs),
+        "first_render": measure(RENDER_SNIPPET, args.runs),
+    }
+    print(json.dumps(report, indent=2))
+
+    over_budget = [
+        name for name, budget in (("import", args.import_budget), ("first_render", args.render_budget))
+        if budget is not None and report[name]["median_s"] > budget
+    ]
+    if over_budget:
+        sys.exit(f"Startup budget exceeded: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,23 +5,65 @@ Handles DiskCache initialization, clearing, and TTLs for search and translation
 """
 
 import os
+import hashlib
 import diskcache as dc
-import streamlit as st
 from datetime import datetime
-from core.config import CACHE_TTL
+from core.compressed_disk import CompressedDisk
+from core.config import (
+    CACHE_TTL,
+    CACHE_ROOT,
+    CACHE_SETTINGS,
+    CACHE_DEFAULT_SETTINGS,
+    CACHE_COMPRESS_LEVEL,
+    SIMILARITY_ENABLED,
+)
+from core.similarity_index import SimilarityIndex
+from core.snippet_corpus import get_snippet_corpus
+from core.tiered_cache import TieredCache
+from core.progress import report
+from core.metrics import count
+from core.lazy import lazy_singleton
 import re
 import logging
 
 
 # --- Initialize caches and logger ---
-BASE_DIR = os.getcwd()
+BASE_DIR = CACHE_ROOT
 CACHE_DIR = os.path.join(BASE_DIR, "medical_cache")
 TRANSLATION_CACHE_DIR = os.path.join(BASE_DIR, "translation_cache")
 BACK_TRANSLATION_CACHE_DIR = os.path.join(BASE_DIR, "back_translation_cache")
+SUMMARY_CACHE_DIR = os.path.join(BASE_DIR, "summary_cache")
+SIMILARITY_INDEX_DIR = os.path.join(BASE_DIR, "similarity_index")
+SINGLE_FLIGHT_DIR = os.path.join(BASE_DIR, "single_flight")
+
+
+def open_cache(directory: str):
+    """
+    Return a getter that opens the SQLite-backed cache on first use, with compressed
+    values and the size limit / eviction policy configured for its directory name.
+    """
+    settings = CACHE_SETTINGS.get(os.path.basename(directory), CACHE_DEFAULT_SETTINGS)
+    return lazy_singleton(lambda: dc.Cache(
+        directory,
+        disk=CompressedDisk,
+        disk_compress_level=CACHE_COMPRESS_LEVEL,
+        **settings,
+    ))
+
+
+# In-memory LRU tier in front of each on-disk store (opened lazily)
+_search_store = open_cache(CACHE_DIR)
+cache = TieredCache(_search_store, name="search")
+# Negative entries share the search store but get their own hot tier and counters
+failure_cache = TieredCache(_search_store, name="search_failures")
+translation_cache = TieredCache(open_cache(TRANSLATION_CACHE_DIR), name="translation")
+back_translation_cache = TieredCache(open_cache(BACK_TRANSLATION_CACHE_DIR), name="back_translation")
+summary_cache = TieredCache(open_cache(SUMMARY_CACHE_DIR), name="summary")
+# Cross-process request-coalescing locks and short-lived shared results (core/single_flight.py)
+flight_store = open_cache(SINGLE_FLIGHT_DIR)
 
-cache = dc.Cache(CACHE_DIR)
-translation_cache = dc.Cache(TRANSLATION_CACHE_DIR)
-back_translation_cache = dc.Cache(BACK_TRANSLATION_CACHE_DIR)
+# Near-duplicate lookup shared by every cache keyed on normalize_query_key()
+query_index = SimilarityIndex(open_cache(SIMILARITY_INDEX_DIR))
 
 logging.basicConfig(
     level=logging.INFO,
@@ -32,34 +74,63 @@ logger = logging.getLogger(__name__)
 
 
 # --- Utilities ---
-def clear_all_caches():
-    """Utility to clear all caches from the sidebar."""
-    if st.sidebar.button("🧹 Clear All Caches"):
-        cache.clear()
-        translation_cache.clear()
-        back_translation_cache.clear()
-        logger.info("All caches cleared via sidebar button.")
-        st.success("✅ All caches cleared successfully!")
-
-def cache_result(cache_obj, key: str, data: dict):
+def clear_caches():
+    """Clear every answer-pipeline cache."""
+    cache.clear()
+    failure_cache.clear()
+    translation_cache.clear()
+    back_translation_cache.clear()
+    summary_cache.clear()
+    query_index.store.clear()
+    flight_store().clear()
+    corpus = get_snippet_corpus()
+    if corpus is not None:
+        corpus.clear()
+    logger.info("All caches cleared.")
+
+def index_query_key(key: str):
+    """Make a normalized query key discoverable by paraphrase lookups."""
+    if SIMILARITY_ENABLED:
+        query_index.add(key)
+
+def cache_result(cache_obj, key: str, data, index: bool = True):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     wrapped = {"timestamp": timestamp, "results": data}
     cache_obj.set(key, wrapped, expire=CACHE_TTL)
+    if index:
+        index_query_key(key)
     logger.info(f"🗂️ Cached new result for key '{key}' at {timestamp}.")
     return wrapped
 
-def get_cached_result(cache_obj, key: str):
-    """Retrieve cached result if available and valid."""
-    if key in cache_obj:
-        data = cache_obj[key]
-        ts = data.get("timestamp", "unknown")
-        msg = f"🔁 Using cached results for '{key}' (last updated {ts})."
-        try:
-            st.caption(msg)
-        except Exception:
-            logger.info(msg)  # fallback if Streamlit isn't active
-        return data["results"]
-    return None
+def get_cached_result(cache_obj, key: str, similar: bool = SIMILARITY_ENABLED):
+    """
+    Retrieve cached result if available and valid.
+    With `similar`, fall back to the closest paraphrase of `key` already in the cache.
+    """
+    matched_key, data = key, cache_obj.get(key)
+    if data is None and similar:
+        for score, candidate in query_index.similar(key):
+            data = cache_obj.get(candidate)
+            if data is not None:
+                matched_key = candidate
+                count("similar_hits_total", cache=getattr(cache_obj, "name", "cache"))
+                logger.info(f"≈ '{key}' matched cached '{candidate}' (similarity {score:.2f}).")
+                break
+
+    if data is None:
+        return None
+
+    ts = data.get("timestamp", "unknown")
+    report("info", f"🔁 Using cached results for '{matched_key}' (last updated {ts}).")
+    return data["results"]
+
+def hashed_key(*parts: str) -> str:
+    """Fixed-size content hash for keys built from arbitrarily long text."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
 
 def normalize_query_key(text: str) -> str:
     """Normalize a query string to ensure consistent cache keys."""
@@ -0,0 +1,132 @@
+"""
+core/circuit_breaker.py
+
+Per-dependency circuit breakers: stop calling a source that keeps failing or
+timing out, then let a single half-open probe decide when to resume.
+
+Use `available()` to decide whether to plan a call and `allow()` right before
+making it: only `allow()` takes the half-open probe, which is released by the
+call's recorded outcome (or abandoned after BREAKER_PROBE_TIMEOUT).
+"""
+
+import threading
+import time
+from collections import deque
+
+from core.config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_RESET_TIMEOUT,
+    BREAKER_PROBE_TIMEOUT,
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """A call was refused because the dependency's breaker is open (or already probing)."""
+
+
+class CircuitBreaker:
+    """Tracks recent outcomes for one dependency; slow calls count as failures."""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        probe_timeout: float = BREAKER_PROBE_TIMEOUT,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._outcomes = deque(maxlen=window)  # True = failed or slow
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started = None  # set while a half-open probe is out
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def _probe_out(self) -> bool:
+        return self._probe_started is not None and time.monotonic() - self._probe_started < self.probe_timeout
+
+    def available(self) -> bool:
+        """True if allow() would let a call through now; takes nothing."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            return not self._probe_out()
+
+    def allow(self) -> bool:
+        """Return True if a call may go through now (at most one probe while half-open)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._probe_out():
+                return False
+            self._probe_started = time.monotonic()
+            return True
+
+    def record_success(self, latency: float = 0.0) -> None:
+        if latency > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probe_started = None
+            self._outcomes.append(False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(True)
+            if (
+                self._state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+            ):
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+
+
+# --------------------------------
+# Registry
+# --------------------------------
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for `name`, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
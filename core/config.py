@@ -4,40 +4,181 @@ core/config.py
 Central configuration and constants for the Custom Medical Agent.
 """
 
+import contextvars
 import os
-import streamlit as st
-import google.generativeai as genai
-
-# -----------------------
-# Streamlit Page Settings
-# -----------------------
-st.set_page_config(page_title="What's up Doc? 🤖🩺")
+import sys
 
 # -----------------------
 # Global Constants
 # -----------------------
 RATE_LIMIT_SECONDS = 60
 MAX_TOKENS_PER_MINUTE = 10_000_000
+RATE_LIMIT_BUCKET_SECONDS = 1    # sliding-window granularity
+RATE_LIMIT_SHARED = True         # share one budget across worker processes via DiskCache
 CACHE_TTL = 60 * 60 * 24 * 7  # 7 days
 
+# Per-source search results: served fresh for a day, then stale-while-revalidate
+SOURCE_FRESH_TTL = 60 * 60 * 24  # 1 day
+SOURCE_STALE_TTL = CACHE_TTL     # hard expiry
+NEGATIVE_CACHE_TTL = 60 * 5      # failed source lookups are retried after 5 minutes
+
+# -----------------------
+# On-disk Caches
+# -----------------------
+CACHE_ROOT = os.environ.get("DOCBOT_CACHE_DIR") or os.getcwd()  # parent of every cache directory
+CACHE_COMPRESS_LEVEL = 6         # zlib level for cached values (0 stores plain pickles)
+CACHE_SETTINGS = {               # per-cache size bound and what to evict first once it is reached
+    "medical_cache": {"size_limit": 512 * 1024 * 1024, "eviction_policy": "least-recently-used"},
+    "translation_cache": {"size_limit": 64 * 1024 * 1024, "eviction_policy": "least-recently-used"},
+    "back_translation_cache": {"size_limit": 256 * 1024 * 1024, "eviction_policy": "least-recently-used"},
+    "summary_cache": {"size_limit": 256 * 1024 * 1024, "eviction_policy": "least-recently-used"},
+    "similarity_index": {"size_limit": 128 * 1024 * 1024, "eviction_policy": "least-recently-stored"},
+    "rate_limit": {"size_limit": 8 * 1024 * 1024, "eviction_policy": "none"},  # a single shared key
+    "single_flight": {"size_limit": 64 * 1024 * 1024, "eviction_policy": "least-recently-stored"},
+}
+CACHE_DEFAULT_SETTINGS = {"size_limit": 256 * 1024 * 1024, "eviction_policy": "least-recently-stored"}
+
+# -----------------------
+# Conversation History
+# -----------------------
+HISTORY_TOKEN_BUDGET = 1200      # estimated tokens of history sent with each question (summary included)
+HISTORY_SUMMARY_WORDS = 120      # target length of the rolling summary of older turns
+HISTORY_COMPACT_TO = 0.5         # after a compaction, verbatim turns use at most this share of the budget
+
+# -----------------------
+# Language Detection
+# -----------------------
+LANG_DETECT_THRESHOLD = 0.75     # local confidence needed to skip the LLM translator for English
+SINGLE_PASS_MULTILINGUAL = False # answer non-English questions directly in their language (no back-translation)
+SPECULATIVE_SEARCH = True        # search the raw query while a probably-English question is being translated
+SPECULATE_MIN_CONFIDENCE = 0.3   # local English confidence needed to speculate (below LANG_DETECT_THRESHOLD)
+BACK_TRANSLATE_SECTIONS = True   # back-translate answers section by section, caching each section per language
+BACK_TRANSLATE_PARALLELISM = 8   # sections of one answer translated at once
+
+# -----------------------
+# Query Routing
+# -----------------------
+ROUTER_CLASSIFIER_ENABLED = True # learned search/no-search classifier (keyword regex as fallback)
+ROUTER_THRESHOLD = None          # override the P(search) cut-off stored with the bundled weights
+
+# -----------------------
+# In-process Hot Cache Tier
+# -----------------------
+HOT_CACHE_MAX_BYTES = 32 * 1024 * 1024  # per cache
+HOT_CACHE_MAX_ITEMS = 2048
+HOT_CACHE_TTL = 60 * 10                 # bounds staleness across worker processes
+
+# -----------------------
+# Near-duplicate Query Cache
+# -----------------------
+SIMILARITY_ENABLED = True        # reuse cached results for paraphrased questions
+SIMILARITY_THRESHOLD = 0.8       # minimum Jaccard similarity of query content words
+SIMILARITY_NUM_PERM = 64         # MinHash permutations
+SIMILARITY_BANDS = 16            # LSH bands (rows per band = NUM_PERM / BANDS)
+
+# -----------------------
+# Search Fan-out
+# -----------------------
+SEARCH_PARALLEL = True           # query all SAFE_SOURCES concurrently
+SEARCH_MAX_WORKERS = 64          # threads shared by every fan-out, hung and hedged calls included
+SEARCH_SOURCE_TIMEOUT = 6.0      # seconds to wait on a single source, from when its call starts
+SEARCH_DEADLINE = 8.0            # seconds to wait on the whole fan-out
+SEARCH_HEDGE_AFTER = 3.0         # re-issue a straggling source after this many seconds (0 disables)
+
+# -----------------------
+# Local Snippet Corpus
+# -----------------------
+CORPUS_ENABLED = True            # keep every fetched snippet in a SQLite FTS5 index, consulted before live search
+CORPUS_MAX_AGE = 60 * 60 * 24 * 30  # snippets older than this no longer stand in for a live search
+CORPUS_MIN_SNIPPETS = 3          # relevant local snippets needed to skip the live search...
+CORPUS_MIN_SOURCES = 2           # ...drawn from at least this many distinct sources
+CORPUS_MIN_COVERAGE = 0.75       # share of a longer question's content words a snippet must contain
+CORPUS_SHORT_QUESTION = 4        # questions with at most this many content words need every one of them
+CORPUS_MAX_ROWS = 200_000        # oldest snippets are pruned beyond this
+
+# -----------------------
+# Source Ranking
+# -----------------------
+SOURCE_RANKING_ENABLED = True    # BM25-rank, dedupe and pack snippets before summarising
+SOURCE_TOKEN_BUDGET = 400        # estimated prompt tokens of source text sent to the summariser
+SOURCE_DUPLICATE_THRESHOLD = 0.5 # shingle Jaccard at which a passage repeats a higher-ranked one
+
+# -----------------------
+# Per-source Circuit Breakers
+# -----------------------
+BREAKER_WINDOW = 10              # recent calls considered per source
+BREAKER_MIN_CALLS = 3            # don't judge a source on fewer calls than this
+BREAKER_FAILURE_RATE = 0.5       # open once half of recent calls failed or were slow
+BREAKER_SLOW_CALL_SECONDS = 5.0  # successful calls slower than this count as failures
+BREAKER_RESET_TIMEOUT = 60 * 2   # wait before letting a half-open probe through
+BREAKER_PROBE_TIMEOUT = 30       # a probe that hasn't reported back by then is abandoned
+
+# -----------------------
+# Gemini Clients
+# -----------------------
+GEMINI_MODEL = "models/gemini-2.0-flash"
+GEMINI_TRANSPORT = "grpc"        # one long-lived HTTP/2 channel per client ("rest" also supported)
+GEMINI_MAX_CONCURRENCY = 16      # in-flight calls per model, shared by every chain
+GEMINI_MAX_CLIENTS = 32          # clients kept open across (model, temperature, API key); least recently used closed first
+
+# -----------------------
+# Instrumentation
+# -----------------------
+METRICS_ENABLED = True           # per-stage timers, cache counters and request traces
+METRICS_OTEL = True              # also emit OpenTelemetry spans when opentelemetry-api is installed
+METRICS_TRACE_HISTORY = 50       # recent request traces kept in memory
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOG_RAW_QUERIES = False          # log questions as typed (INFO) rather than as normalized cache keys; they may hold health details
+
+# -----------------------
+# Request Coalescing
+# -----------------------
+SINGLE_FLIGHT_ENABLED = True     # identical concurrent requests share one search/translation/generation
+SINGLE_FLIGHT_SHARED = True      # ...across worker processes too, via a lock in the cache directory
+SINGLE_FLIGHT_WAIT = 60.0        # longest a duplicate waits before computing on its own
+SINGLE_FLIGHT_LOCK_TTL = 120     # a crashed leader's lock expires after this many seconds
+SINGLE_FLIGHT_RESULT_TTL = 30    # uncached results (direct answers) handed to other processes' waiters
+
+# -----------------------
+# Headless Service
+# -----------------------
+PIPELINE_MAX_CONCURRENCY = 16    # answers computed at once by the async service
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+BATCH_CONCURRENCY = 8            # concurrent LLM calls / searches per stage in batch mode
+BATCH_WAVE_SIZE = 32             # questions admitted through the rate budget at a time in batch mode
+BATCH_RATE_SHARE = 0.5           # share of MAX_TOKENS_PER_MINUTE batch mode may use, leaving room for users
+
+# -----------------------
+# Cache Warming
+# -----------------------
+WARM_LANGUAGES = ("Spanish", "French")  # answers also pre-translated into these (names as the translator reports them)
+WARM_TOP_QUERIES = 200           # most frequent mined queries kept per run
+WARM_CONCURRENCY = 4             # queries warmed at once
+WARM_AHEAD = 60 * 60 * 12        # refresh entries that expire (or go stale) within this window
+WARM_INTERVAL = 60 * 60 * 6      # time between runs with --every (keep below WARM_AHEAD)
+WARM_RATE_SHARE = 0.5            # share of MAX_TOKENS_PER_MINUTE the warmer may use, leaving room for users
+
 # -----------------------
 # API Key Handling
 # -----------------------
-def get_gemini_api_key() -> str:
-    """Fetch Google Gemini API key either from Streamlit Secrets or text input."""
-    with st.sidebar:
-        use_secrets = st.toggle("Use Streamlit Secrets for API Key", value=True)
-        if use_secrets:
-            try:
-                api_key = st.secrets["GOOGLE_API_KEY"]
-            except Exception:
-                st.error("Missing GOOGLE_API_KEY in Streamlit secrets.")
-                st.stop()
-        else:
-            api_key = st.text_input("Gemini API Key", type="password")
-            if not api_key:
-                st.warning("Please enter your Gemini API key!", icon="⚠")
-                st.stop()
+_api_key = contextvars.ContextVar("gemini_api_key", default=None)
+
+
+def configure_gemini(api_key: str) -> None:
+    """
+    Use `api_key` for Gemini calls made from this context (e.g. one Streamlit session)
+    and make it the process default for LangChain and google-generativeai.
+    """
+    _api_key.set(api_key)
     os.environ["GOOGLE_API_KEY"] = api_key
-    genai.configure(api_key=api_key)
-    return api_key
+    # google-generativeai takes ~1s to import; LangChain reads the env var itself,
+    # so only configure the SDK directly if something has already loaded it
+    genai = sys.modules.get("google.generativeai")
+    if genai is not None:
+        genai.configure(api_key=api_key)
+
+
+def gemini_api_key():
+    """The API key configured for the current context, else the process default."""
+    return _api_key.get() or os.environ.get("GOOGLE_API_KEY")
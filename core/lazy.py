@@ -0,0 +1,43 @@
+"""
+core/lazy.py
+
+Process-wide lazy singletons: expensive objects (model clients, chains, search
+tools, SQLite-backed caches) are built on first use instead of at import time.
+"""
+
+import functools
+import threading
+
+
+def lazy_singleton(factory):
+    """
+    Decorate a zero-argument factory so it runs at most once per process.
+
+    The returned getter is thread-safe; `getter.override(obj)` swaps in a
+    replacement (e.g. a fake model for benchmarks) and `getter.reset()` drops
+    the instance so the next call rebuilds it.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def getter():
+        if instance:
+            return instance[0]
+        with lock:
+            if not instance:
+                instance.append(factory())
+        return instance[0]
+
+    def override(obj):
+        with lock:
+            instance[:] = [obj]
+
+    def reset():
+        with lock:
+            instance.clear()
+
+    getter.override = override
+    getter.reset = reset
+    getter.is_initialised = lambda: bool(instance)
+    return getter
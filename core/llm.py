@@ -0,0 +1,160 @@
+"""
+core/llm.py
+
+Shared Gemini client registry.
+
+Every chain (translator, back-translator, summariser, medical answer) gets its
+chat model from get_chat_model(), so one client per (model, temperature, API key)
+is built per process and its transport channel stays open between calls instead
+of paying setup and TLS handshakes on every cache miss. The client is picked when
+the chain runs, from the key configure_gemini() set for the calling context, so
+chains built once still serve every session with its own key. At most
+GEMINI_MAX_CLIENTS clients are kept, least recently used dropped first, and keys
+are held only as digests. Calls to the same
+model share a bounded concurrency limit, and token usage is charged to the rate
+limiter here.
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from core.config import (
+    GEMINI_MODEL,
+    GEMINI_TRANSPORT,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_CLIENTS,
+    gemini_api_key,
+)
+from core.lazy import lazy_singleton
+
+_clients = OrderedDict()  # (model, temperature, key digest) -> client, least recently used first
+_registered = {}  # (model, temperature) -> client served for every key
+_slots = {}
+_lock = threading.Lock()
+
+
+# --------------------------------
+# Per-model Concurrency Limit
+# --------------------------------
+def model_slots(model: str) -> threading.BoundedSemaphore:
+    """Semaphore bounding in-flight calls to `model` across all chains."""
+    with _lock:
+        slots = _slots.get(model)
+        if slots is None:
+            slots = _slots[model] = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+        return slots
+
+
+async def _acquire_async(slots: threading.BoundedSemaphore) -> None:
+    # Poll rather than block a worker thread, so a cancelled task never takes a slot
+    while not slots.acquire(blocking=False):
+        await asyncio.sleep(0.01)
+
+
+# --------------------------------
+# Pooled Chat Model
+# --------------------------------
+@lazy_singleton
+def _pooled_model_class():
+    """ChatGoogleGenerativeAI subclass whose calls hold a per-model slot (built on first use)."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    class PooledChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+        def _generate(self, *args, **kwargs):
+            with model_slots(self.model):
+                return super()._generate(*args, **kwargs)
+
+        def _stream(self, *args, **kwargs):
+            with model_slots(self.model):
+                yield from super()._stream(*args, **kwargs)
+
+        async def _agenerate(self, *args, **kwargs):
+            slots = model_slots(self.model)
+            await _acquire_async(slots)
+            try:
+                return await super()._agenerate(*args, **kwargs)
+            finally:
+                slots.release()
+
+        async def _astream(self, *args, **kwargs):
+            slots = model_slots(self.model)
+            await _acquire_async(slots)
+            try:
+                async for chunk in super()._astream(*args, **kwargs):
+                    yield chunk
+            finally:
+                slots.release()
+
+    return PooledChatGoogleGenerativeAI
+
+
+def _key_digest(api_key):
+    """Stable stand-in for `api_key` in registry keys, so the raw key isn't kept there."""
+    return hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+
+
+def client_for(model: str = GEMINI_MODEL, temperature: float = 0.0, api_key=None):
+    """Return the process-wide client for (model, temperature, api_key), building it once."""
+    registered = _registered.get((model, float(temperature)))
+    if registered is not None:
+        return registered
+    key = (model, float(temperature), _key_digest(api_key))
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+    from core.token_usage import token_usage_callback
+
+    credentials = {"google_api_key": api_key} if api_key else {}  # else LangChain reads GOOGLE_API_KEY
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _pooled_model_class()(
+                model=model,
+                temperature=temperature,
+                transport=GEMINI_TRANSPORT,
+                callbacks=[token_usage_callback],
+                **credentials,
+            )
+            while len(_clients) > GEMINI_MAX_CLIENTS:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(key)
+    return client
+
+
+def forget_api_key(api_key) -> None:
+    """Drop every client built for `api_key`, e.g. once a session switches to another key."""
+    digest = _key_digest(api_key)
+    if digest is None:
+        return
+    with _lock:
+        for key in [k for k in _clients if k[2] == digest]:
+            del _clients[key]
+
+
+def get_chat_model(model: str = GEMINI_MODEL, temperature: float = 0.0):
+    """
+    Chat model step for a chain: each call runs on client_for(model, temperature, key)
+    with the API key of the calling context, streaming and batching included.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    # A RunnableLambda that returns a Runnable hands it the input (and streams from it)
+    return RunnableLambda(
+        lambda _: client_for(model, temperature, gemini_api_key()),
+        name=model.rsplit("/", 1)[-1],
+    )
+
+
+def register_chat_model(client, model: str = GEMINI_MODEL, temperature: float = 0.0) -> None:
+    """
+    Serve `client` for (model, temperature) from now on, whatever the API key,
+    e.g. a fake model in benchmarks.
+    """
+    with _lock:
+        _registered[(model, float(temperature))] = client
@@ -1,14 +1,19 @@
 """
 core/memory_manager.py
 
-Handles conversation memory (LangChain ConversationBufferWindowMemory).
+Handles conversation memory: a token-budgeted ConversationHistory per session.
 """
 
 import streamlit as st
-from langchain.memory import ConversationBufferWindowMemory
 
-def init_memory(k: int = 3):
-    """Initialize session memory for short conversational context."""
+from core.config import HISTORY_TOKEN_BUDGET
+
+def init_memory(budget: int = HISTORY_TOKEN_BUDGET):
+    """Initialize session memory: recent turns within `budget` tokens plus a rolling summary."""
     if "memory" not in st.session_state:
-        st.session_state.memory = ConversationBufferWindowMemory(k=k)
+        # Imported here: the conversation module isn't needed until the first question
+        from services.conversation import ConversationHistory
+
+        st.session_state.memory = ConversationHistory(budget)
+    st.session_state.memory.budget = budget
     return st.session_state.memory
@@ -0,0 +1,314 @@
+"""
+core/metrics.py
+
+Lightweight in-process instrumentation for the answer pipeline.
+
+Stages are timed with `timed(stage)` (a context manager or decorator). Every
+measurement is added to an aggregated latency histogram and, while a request is
+being traced with `trace_request()`, to that request's trace. Counters track
+cache hits and misses. Everything can be exported as JSON or Prometheus text,
+and stages are also emitted as OpenTelemetry spans when opentelemetry-api is
+installed (METRICS_OTEL).
+"""
+
+import contextvars
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+from core.config import (
+    METRICS_ENABLED,
+    METRICS_OTEL,
+    METRICS_TRACE_HISTORY,
+    METRICS_LATENCY_BUCKETS,
+)
+from core.lazy import lazy_singleton
+
+PREFIX = "docbot_"
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (stage, labels) -> Histogram
+recent_traces = deque(maxlen=METRICS_TRACE_HISTORY)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# --------------------------------
+# Histograms
+# --------------------------------
+class Histogram:
+    """Fixed-bucket latency histogram (bucket bounds are upper bounds, in seconds)."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(METRICS_LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(METRICS_LATENCY_BUCKETS):
+                    return METRICS_LATENCY_BUCKETS[-1]
+                lower = METRICS_LATENCY_BUCKETS[i - 1] if i else 0.0
+                return lower + (METRICS_LATENCY_BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return METRICS_LATENCY_BUCKETS[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "buckets": dict(zip([*map(str, METRICS_LATENCY_BUCKETS), "+Inf"], self.counts)),
+        }
+
+
+# --------------------------------
+# Request Traces
+# --------------------------------
+class Trace:
+    """Spans recorded while answering one request, relative to the request start."""
+
+    def __init__(self, name: str, **attributes):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self._t0 = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, labels: dict, error=None) -> None:
+        start = time.perf_counter() - seconds - self._t0
+        self.spans.append({
+            "stage": stage,
+            "labels": labels,
+            "start": round(max(start, 0.0), 6),
+            "duration": round(seconds, 6),
+            "error": error,
+        })
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration": round(self.duration or 0.0, 6),
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+        }
+
+
+@contextmanager
+def trace_request(name: str = "answer", **attributes):
+    """Collect the spans recorded in this context into a Trace (yielded to the caller)."""
+    trace = Trace(name, **attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        recent_traces.append(trace)
+        observe("request", trace.duration, name=name)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+# --------------------------------
+# OpenTelemetry (optional)
+# --------------------------------
+@lazy_singleton
+def _otel_tracer():
+    if not METRICS_OTEL:
+        return None
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        return None
+    return otel_trace.get_tracer("whats-up-doc")
+
+
+def _emit_otel_span(stage: str, seconds: float, labels: dict, error=None) -> None:
+    tracer = _otel_tracer()
+    if tracer is None:
+        return
+    end = time.time_ns()
+    span = tracer.start_span(stage, start_time=end - int(seconds * 1e9), attributes=labels)
+    if error:
+        span.set_attribute("error.type", error)
+    span.end(end_time=end)
+
+
+# --------------------------------
+# Recording API
+# --------------------------------
+def count(name: str, n: int = 1, **labels) -> None:
+    """Increment counter `name` (exported as docbot_<name>)."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    """Add a latency sample to the stage histogram only (no trace, no span)."""
+    if not METRICS_ENABLED:
+        return
+    key = (stage, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(seconds)
+
+
+def record(stage: str, seconds: float, error=None, **labels) -> None:
+    """Record a stage that just finished after `seconds`: histogram, trace span and OTel span."""
+    if not METRICS_ENABLED:
+        return
+    observe(stage, seconds, **labels)
+    if error:
+        count("stage_errors_total", stage=stage, error=error)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds, labels, error)
+    _emit_otel_span(stage, seconds, labels, error)
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    """Time the enclosed block (or decorated function) as `stage`."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, error, **labels)
+
+
+def timed_iter(stage: str, iterable, **labels):
+    """Yield from `iterable`, timing the whole iteration as `stage` (for streamed LLM output)."""
+    with timed(stage, **labels):
+        yield from iterable
+
+
+# --------------------------------
+# Export
+# --------------------------------
+def snapshot(traces: bool = True) -> dict:
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        histograms = [
+            {"stage": stage, "labels": dict(labels), **hist.to_dict()}
+            for (stage, labels), hist in sorted(_histograms.items())
+        ]
+    data = {"counters": counters, "histograms": histograms}
+    if traces:
+        data["traces"] = [trace.to_dict() for trace in list(recent_traces)]
+    return data
+
+
+def to_json(indent=None) -> str:
+    return json.dumps(snapshot(), indent=indent, ensure_ascii=False)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def to_prometheus() -> str:
+    """Render counters and stage histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, hist.counts[:], hist.count, hist.sum) for key, hist in _histograms.items())
+
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            typed.add(name)
+        lines.append(f"{PREFIX}{name}{_prom_labels(labels)} {value}")
+
+    metric = f"{PREFIX}stage_seconds"
+    if histograms:
+        lines.append(f"# TYPE {metric} histogram")
+    for (stage, labels), counts, total, seconds in histograms:
+        base = (("stage", stage), *labels)
+        cumulative = 0
+        for bound, n in zip([*map(str, METRICS_LATENCY_BUCKETS), "+Inf"], counts):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_prom_labels((*base, ('le', bound)))} {cumulative}")
+        lines.append(f"{metric}_sum{_prom_labels(base)} {seconds:.6f}")
+        lines.append(f"{metric}_count{_prom_labels(base)} {total}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_hit_rates() -> dict:
+    """Per-cache {"hits", "misses", "hit_rate"} from the cache_requests_total counter."""
+    rates = {}
+    with _lock:
+        items = list(_counters.items())
+    for (name, labels), value in items:
+        if name != "cache_requests_total":
+            continue
+        labels = dict(labels)
+        entry = rates.setdefault(labels.get("cache", "?"), {"hits": 0, "misses": 0})
+        entry["misses" if labels.get("result") == "miss" else "hits"] += value
+    for entry in rates.values():
+        total = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = round(entry["hits"] / total, 4) if total else 0.0
+    return rates
+
+
+def reset_metrics() -> None:
+    """Drop all counters, histograms and stored traces."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    recent_traces.clear()
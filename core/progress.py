@@ -0,0 +1,53 @@
+"""
+core/progress.py
+
+UI-agnostic progress reporting for the answer pipeline.
+
+Pipeline code calls `report(level, message)`; whoever runs the pipeline decides
+what to do with it (Streamlit captions, an event list in an API response, or
+just the log) by installing a listener with `progress_listener()`.
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Levels: "debug", "info", "success", "warning", "error"
+_LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "success": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+_listener: contextvars.ContextVar[Optional[Callable]] = contextvars.ContextVar(
+    "progress_listener", default=None
+)
+
+
+def report(level: str, message: str, **data) -> None:
+    """Send a progress event to the active listener, or to the log if there is none."""
+    listener = _listener.get()
+    if listener is None:
+        logger.log(_LOG_LEVELS.get(level, logging.INFO), message)
+        return
+    try:
+        listener(level, message, data)
+    except Exception as e:
+        # A broken UI hook must never fail the pipeline
+        logger.warning(f"Progress listener failed: {e}")
+        logger.log(_LOG_LEVELS.get(level, logging.INFO), message)
+
+
+@contextmanager
+def progress_listener(callback: Callable):
+    """Route report() calls in this context to `callback(level, message, data)`."""
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
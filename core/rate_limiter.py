@@ -1,28 +1,129 @@
 """
 core/rate_limiter.py
 
-Simple token-based rate limiter to prevent excessive model calls.
+Bucketed sliding-window token rate limiter to prevent excessive model calls.
+
+Token usage is kept in per-second buckets with a running total, so each call does
+amortised O(1) work. With RATE_LIMIT_SHARED the window lives in a DiskCache store
+next to the other caches and every worker process on the node shares one budget.
+Usage is recorded from the real prompt/completion token counts Gemini reports.
+Offline jobs (warmer, batch) wait for headroom under a share of the budget.
 """
 
+import logging
+import os
+import threading
 import time
-from typing import List, Tuple
+from collections import deque
+
+from core.cache_manager import BASE_DIR, open_cache
+from core.config import (
+    RATE_LIMIT_SECONDS,
+    MAX_TOKENS_PER_MINUTE,
+    RATE_LIMIT_BUCKET_SECONDS,
+    RATE_LIMIT_SHARED,
+)
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DIR = os.path.join(BASE_DIR, "rate_limit")
+_STATE_KEY = "token_window"
+
+EXPECTED_OUTPUT_TOKENS = 600     # completion size assumed when checking the rate budget
+BUDGET_POLL_SECONDS = 1.0
+
+
+class SlidingWindowLimiter:
+    """Sum of tokens over the last `window` seconds, kept in `bucket_seconds` buckets."""
+
+    def __init__(self, limit: int, window: float, bucket_seconds: float = 1.0, store=None):
+        self.limit = limit
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = max(1, int(window // bucket_seconds))
+        self._store = store  # None (process-local), a dc.Cache, or a callable opening one lazily
+        self._state = self._new_state()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self._store() if callable(self._store) else self._store
+
+    @staticmethod
+    def _new_state() -> dict:
+        return {"buckets": deque(), "total": 0}  # buckets: [bucket_index, tokens]
 
-from core.config import RATE_LIMIT_SECONDS, MAX_TOKENS_PER_MINUTE
+    def _evict(self, state: dict, bucket: int) -> None:
+        buckets = state["buckets"]
+        while buckets and buckets[0][0] <= bucket - self.num_buckets:
+            state["total"] -= buckets.popleft()[1]
+
+    def _update(self, fn):
+        """Apply fn(state, bucket) atomically against the local or shared state."""
+        bucket = int(time.time() // self.bucket_seconds)
+        store = self.store
+        if store is None:
+            with self._lock:
+                self._evict(self._state, bucket)
+                return fn(self._state, bucket)
+        with store.transact():
+            state = store.get(_STATE_KEY) or self._new_state()
+            self._evict(state, bucket)
+            result = fn(state, bucket)
+            store.set(_STATE_KEY, state)
+            return result
+
+    def used(self) -> int:
+        return self._update(lambda state, bucket: state["total"])
+
+    def would_exceed(self, tokens: int) -> bool:
+        return self._update(lambda state, bucket: state["total"] + tokens > self.limit)
+
+    def record(self, tokens: int) -> None:
+        def add(state, bucket):
+            buckets = state["buckets"]
+            if buckets and buckets[-1][0] == bucket:
+                buckets[-1][1] += tokens
+            else:
+                buckets.append([bucket, tokens])
+            state["total"] += tokens
+        self._update(add)
+
+
+limiter = SlidingWindowLimiter(
+    MAX_TOKENS_PER_MINUTE,
+    RATE_LIMIT_SECONDS,
+    RATE_LIMIT_BUCKET_SECONDS,
+    store=open_cache(RATE_LIMIT_DIR) if RATE_LIMIT_SHARED else None,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for text that hasn't been sent yet."""
+    return max(len(text) // 4, 1)
 
-# Stores tuples of (timestamp, token_count)
-request_tokens: List[Tuple[float, int]] = []
 
 def is_rate_limited(tokens_this_request: int) -> bool:
-    """Return True if the request exceeds allowed token rate."""
-    global request_tokens
-    now = time.time()
+    """Return True if the request's estimated tokens would exceed the allowed rate."""
+    return limiter.would_exceed(tokens_this_request)
+
+
+def record_usage(tokens: int) -> None:
+    """Charge tokens actually consumed by a model call against the window."""
+    if tokens > 0:
+        limiter.record(tokens)
 
-    # Remove old requests outside the time window
-    request_tokens = [(t, tok) for (t, tok) in request_tokens if now - t < RATE_LIMIT_SECONDS]
-    tokens_used = sum(tok for _, tok in request_tokens)
 
-    if tokens_used + tokens_this_request > MAX_TOKENS_PER_MINUTE:
-        return True
 
-    request_tokens.append((now, tokens_this_request))
-    return False
+def wait_for_headroom(tokens: int, share: float = 1.0, who: str = "Offline job") -> None:
+    """
+    Block until `tokens` more fit in `share` of the token window. Requests larger than
+    the whole allowance wait for it to be entirely free rather than forever.
+    """
+    allowance = limiter.limit * share
+    tokens = min(tokens, allowance)
+    waited = False
+    while limiter.used() + tokens > allowance:
+        if not waited:
+            logger.info(f"{who} is waiting for rate-limit headroom.")
+            waited = True
+        time.sleep(BUDGET_POLL_SECONDS)
@@ -0,0 +1,165 @@
+"""
+core/similarity_index.py
+
+Offline near-duplicate lookup for normalized query keys (MinHash + LSH banding),
+so paraphrased questions can reuse cached search results and summaries.
+"""
+
+import hashlib
+import random
+import re
+from typing import List, Tuple
+
+from core.config import (
+    CACHE_TTL,
+    SIMILARITY_THRESHOLD,
+    SIMILARITY_NUM_PERM,
+    SIMILARITY_BANDS,
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an the of for to in on at by with about from and or is are was were be been
+what whats which who how why when does do did can could should would will i my me
+you your it its this that these those there any some best way ways
+""".split())
+
+
+# --------------------------------
+# Tokenisation
+# --------------------------------
+def _stem(token: str) -> str:
+    """Very light plural folding so 'treatments' and 'treatment' collide."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def content_words(text: str) -> List[str]:
+    """Lower-cased, lightly stemmed words of `text` with stopwords removed, in order."""
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+# Words that change what a question is about while barely moving its word overlap
+ORDINALS = frozenset("first second third fourth fifth sixth seventh eighth ninth tenth".split())
+NEGATIONS = frozenset("""
+no not non never without cant cannot dont doesnt didnt isnt arent wasnt shouldnt wont
+""".split())
+
+
+def essential_terms(words: frozenset) -> frozenset:
+    """
+    The content words that tell apart questions sharing every other word: numbers,
+    one- or two-letter tokens, ordinals and negations ("type 1" / "type 2 diabetes",
+    "hepatitis b" / "hepatitis c", "first" / "third trimester", "can" / "cannot").
+    """
+    return frozenset(
+        w for w in words
+        if len(w) <= 2 or any(c.isdigit() for c in w) or w in ORDINALS or w in NEGATIONS
+    )
+
+
+def query_tokens(text: str) -> frozenset:
+    """Return the set of content-word shingles for a (normalized) query."""
+    return frozenset(content_words(text))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _stable_hash(token: str) -> int:
+    # Python's hash() is salted per process, so use a fixed digest for on-disk signatures
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# --------------------------------
+# Index
+# --------------------------------
+class SimilarityIndex:
+    """MinHash/LSH index of query keys, persisted in a DiskCache store."""
+
+    def __init__(
+        self,
+        store,
+        threshold: float = SIMILARITY_THRESHOLD,
+        num_perm: int = SIMILARITY_NUM_PERM,
+        bands: int = SIMILARITY_BANDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self._store = store  # a dc.Cache, or a zero-argument callable that opens one lazily
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(1)  # fixed seed: signatures must match across processes
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    @property
+    def store(self):
+        return self._store() if callable(self._store) else self._store
+
+    def _signature(self, tokens: frozenset) -> List[int]:
+        hashes = [_stable_hash(t) for t in tokens]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def _band_keys(self, tokens: frozenset) -> List[str]:
+        sig = self._signature(tokens)
+        keys = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(repr(chunk).encode(), digest_size=8).hexdigest()
+            keys.append(f"band::{band}::{digest}")
+        return keys
+
+    def add(self, key: str) -> None:
+        """Index a query key so later paraphrases can find it."""
+        tokens = query_tokens(key)
+        if not tokens:
+            return
+        with self.store.transact():
+            self.store.set(f"sig::{key}", tokens, expire=CACHE_TTL)
+            for band_key in self._band_keys(tokens):
+                members = self.store.get(band_key, set())
+                members.add(key)
+                self.store.set(band_key, members, expire=CACHE_TTL)
+
+    def similar(self, key: str) -> List[Tuple[float, str]]:
+        """
+        Return (score, key) pairs at or above the threshold, best first. A candidate
+        whose essential terms differ from the query's is never a match, however high it scores.
+        """
+        tokens = query_tokens(key)
+        if not tokens:
+            return []
+        essentials = essential_terms(tokens)
+
+        candidates = set()
+        for band_key in self._band_keys(tokens):
+            candidates |= self.store.get(band_key, set())
+        candidates.discard(key)
+
+        matches = []
+        for candidate in candidates:
+            other = self.store.get(f"sig::{candidate}")
+            if other is None:
+                continue  # expired since it was banded
+            if essential_terms(other) != essentials:
+                continue  # e.g. "type 1" vs "type 2 diabetes"
+            score = jaccard(tokens, other)
+            if score >= self.threshold:
+                matches.append((score, candidate))
+        return sorted(matches, reverse=True)
@@ -0,0 +1,187 @@
+"""
+core/single_flight.py
+
+Request coalescing ("single flight") for the expensive pipeline stages.
+
+When many sessions ask the same question at once, only the first caller (the
+leader) does the work. Identical calls in the same process wait on the leader's
+Future and get its result. The leader also holds a lock in the shared cache
+directory, so identical calls in other worker processes wait for it and then
+find the result in the stage's own cache (callers re-check their cache inside
+the flight) or, with `share=True`, in a short-lived result store.
+
+Call these on cache misses only: the cross-process lock costs a DiskCache write.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+from core.cache_manager import flight_store
+from core.config import (
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_SHARED,
+    SINGLE_FLIGHT_WAIT,
+    SINGLE_FLIGHT_LOCK_TTL,
+    SINGLE_FLIGHT_RESULT_TTL,
+)
+from core.metrics import count
+from core.progress import report
+
+POLL_SECONDS = 0.02
+
+_MISSING = object()
+_inflight = {}  # "namespace::key" -> Future of the leader's result
+_inflight_lock = threading.Lock()
+
+
+class _Abandoned(Exception):
+    """The leading stream was closed before finishing; followers compute on their own."""
+
+
+# --------------------------------
+# Locks and Shared Results
+# --------------------------------
+@contextmanager
+def process_lock(key: str):
+    """
+    Hold `key` across worker processes while the block runs. The lock expires after
+    SINGLE_FLIGHT_LOCK_TTL if its holder dies; after SINGLE_FLIGHT_WAIT a waiter
+    gives up and runs the block anyway.
+    """
+    if not SINGLE_FLIGHT_SHARED:
+        yield
+        return
+    store = flight_store()
+    lock_key = f"lock::{key}"
+    acquired = store.add(lock_key, os.getpid(), expire=SINGLE_FLIGHT_LOCK_TTL)
+    if not acquired:
+        count("single_flight_total", stage=key.split("::", 1)[0], role="process_waiter")
+        deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            acquired = store.add(lock_key, os.getpid(), expire=SINGLE_FLIGHT_LOCK_TTL)
+    try:
+        yield
+    finally:
+        if acquired:
+            store.delete(lock_key)
+
+
+def _shared_result(key: str):
+    if not SINGLE_FLIGHT_SHARED:
+        return _MISSING
+    return flight_store().get(f"result::{key}", default=_MISSING)
+
+
+def _share_result(key: str, result) -> None:
+    if SINGLE_FLIGHT_SHARED:
+        flight_store().set(f"result::{key}", result, expire=SINGLE_FLIGHT_RESULT_TTL)
+
+
+def _join(key: str):
+    """Return (future, is_leader) for the in-process flight of `key`."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, False
+        future = _inflight[key] = Future()
+        return future, True
+
+
+def _leave(key: str) -> None:
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def _follow(namespace: str) -> None:
+    count("single_flight_total", stage=namespace, role="follower")
+    report("debug", f"⏳ Waiting for an identical {namespace} request already in progress.")
+
+
+# --------------------------------
+# Public API
+# --------------------------------
+def single_flight(namespace: str, key: str, fn, share: bool = False):
+    """
+    Return fn(), computed once for all concurrent callers with the same (namespace, key).
+
+    `fn` should re-check the stage's cache first, so callers in other processes that
+    waited on the lock pick up the leader's result. Stages without a cache pass
+    `share=True` to hand the result over through the result store instead.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return fn()
+    full_key = f"{namespace}::{key}"
+    future, leader = _join(full_key)
+    if not leader:
+        _follow(namespace)
+        try:
+            return future.result(timeout=SINGLE_FLIGHT_WAIT)
+        except FutureTimeout:
+            return fn()
+
+    count("single_flight_total", stage=namespace, role="leader")
+    try:
+        with process_lock(full_key):
+            result = _shared_result(full_key) if share else _MISSING
+            if result is _MISSING:
+                result = fn()
+                if share:
+                    _share_result(full_key, result)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _leave(full_key)
+
+
+def single_flight_iter(namespace: str, key: str, make_iter, share: bool = False):
+    """
+    Streaming variant of single_flight: the leader yields items as `make_iter()`
+    produces them; followers get the complete list at once when the leader finishes.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        yield from make_iter()
+        return
+    full_key = f"{namespace}::{key}"
+    future, leader = _join(full_key)
+    if not leader:
+        _follow(namespace)
+        try:
+            items = future.result(timeout=SINGLE_FLIGHT_WAIT)
+        except (FutureTimeout, _Abandoned):
+            yield from make_iter()
+            return
+        yield from items
+        return
+
+    count("single_flight_total", stage=namespace, role="leader")
+    items = []
+    try:
+        with process_lock(full_key):
+            shared = _shared_result(full_key) if share else _MISSING
+            if shared is not _MISSING:
+                items = list(shared)
+                yield from items
+            else:
+                for item in make_iter():
+                    items.append(item)
+                    yield item
+                if share:
+                    _share_result(full_key, items)
+    except GeneratorExit:
+        future.set_exception(_Abandoned())
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(items)
+    finally:
+        _leave(full_key)
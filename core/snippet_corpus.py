@@ -0,0 +1,182 @@
+"""
+core/snippet_corpus.py
+
+Persistent full-text corpus of every snippet fetched from SAFE_SOURCES (SQLite
+FTS5), kept long after the per-query search cache has expired.
+
+medical_search consults it before going live: when enough recent snippets from
+enough distinct sources already cover the question, the live search is skipped,
+so DuckDuckGo traffic shrinks to genuinely new topics over time.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+from core.config import (
+    CACHE_ROOT,
+    CORPUS_ENABLED,
+    CORPUS_MAX_AGE,
+    CORPUS_MIN_SNIPPETS,
+    CORPUS_MIN_SOURCES,
+    CORPUS_MIN_COVERAGE,
+    CORPUS_SHORT_QUESTION,
+    CORPUS_MAX_ROWS,
+)
+from core.lazy import lazy_singleton
+from core.similarity_index import STOPWORDS, content_words, essential_terms
+
+CORPUS_PATH = os.path.join(CACHE_ROOT, "snippet_corpus", "corpus.sqlite3")
+CANDIDATES = 50                  # FTS matches re-checked for coverage per lookup
+PRUNE_EVERY = 500                # inserts between size checks
+
+_WORD_RE = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    query TEXT NOT NULL,
+    snippet TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    UNIQUE (source, snippet)
+);
+CREATE INDEX IF NOT EXISTS snippets_fetched_at ON snippets (fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(
+    snippet, content='snippets', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS snippets_ai AFTER INSERT ON snippets BEGIN
+    INSERT INTO snippets_fts (rowid, snippet) VALUES (new.id, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS snippets_ad AFTER DELETE ON snippets BEGIN
+    INSERT INTO snippets_fts (snippets_fts, rowid, snippet) VALUES ('delete', old.id, old.snippet);
+END;
+"""
+
+
+def match_expression(question: str) -> str:
+    """FTS5 query matching any content word of the question (each quoted, so no operators leak in)."""
+    # Unstemmed: the porter tokenizer stems both sides itself
+    terms = sorted(set(_WORD_RE.findall(question.lower())) - STOPWORDS)
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+def coverage(question_words: frozenset, snippet: str) -> float:
+    """Share of the question's content words that appear in `snippet`."""
+    if not question_words:
+        return 0.0
+    return len(question_words & frozenset(content_words(snippet))) / len(question_words)
+
+
+def covers(question_words: frozenset, snippet: str) -> bool:
+    """True if `snippet` is specific enough to stand in for a live search on the question."""
+    snippet_words = frozenset(content_words(snippet))
+    if not essential_terms(question_words) <= snippet_words:
+        return False
+    needed = 1.0 if len(question_words) <= CORPUS_SHORT_QUESTION else CORPUS_MIN_COVERAGE
+    return coverage(question_words, snippet) >= needed
+
+
+class SnippetCorpus:
+    """Thread-safe SQLite FTS5 store of (source, query, snippet, fetched_at)."""
+
+    def __init__(self, path: str = CORPUS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, source: str, query: str, snippet: str, fetched_at: float = None) -> None:
+        """Store a snippet, or refresh its fetch time if this source returned it before."""
+        if not snippet:
+            return
+        fetched_at = fetched_at or time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO snippets (source, query, snippet, fetched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (source, snippet) DO UPDATE SET fetched_at = excluded.fetched_at, query = excluded.query",
+                (source, query, snippet, fetched_at),
+            )
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        # Caller holds the lock. Keeps the newest CORPUS_MAX_ROWS snippets.
+        self._conn.execute(
+            "DELETE FROM snippets WHERE id IN ("
+            "SELECT id FROM snippets ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+            (CORPUS_MAX_ROWS,),
+        )
+
+    def search(self, question: str, sources=None, max_age: float = CORPUS_MAX_AGE,
+               limit: int = CANDIDATES) -> List[Tuple[str, str, float, float]]:
+        """
+        Return (source, snippet, fetched_at, coverage) for recent snippets matching the
+        question, best match first. Only snippets from `sources` (if given) are returned.
+        """
+        expression = match_expression(question)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.source, s.snippet, s.fetched_at FROM snippets_fts "
+                "JOIN snippets s ON s.id = snippets_fts.rowid "
+                "WHERE snippets_fts MATCH ? AND s.fetched_at >= ? "
+                "ORDER BY bm25(snippets_fts) LIMIT ?",
+                (expression, time.time() - max_age, limit),
+            ).fetchall()
+        words = frozenset(content_words(question))
+        allowed = set(sources) if sources else None
+        return [
+            (source, snippet, fetched_at, coverage(words, snippet))
+            for source, snippet, fetched_at in rows
+            if allowed is None or source in allowed
+        ]
+
+    def lookup(self, question: str, sources=None) -> dict:
+        """
+        {source: snippets} when at least CORPUS_MIN_SNIPPETS recent snippets from
+        CORPUS_MIN_SOURCES distinct sources each cover the question (see covers());
+        otherwise {} (the caller should search live).
+        """
+        words = frozenset(content_words(question))
+        relevant = [
+            (source, snippet) for source, snippet, _, _ in self.search(question, sources)
+            if covers(words, snippet)
+        ]
+        found = {}
+        for source, snippet in relevant:
+            found.setdefault(source, []).append(snippet)
+        if len(relevant) < CORPUS_MIN_SNIPPETS or len(found) < CORPUS_MIN_SOURCES:
+            return {}
+        return {source: " … ".join(snippets) for source, snippets in found.items()}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM snippets").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM snippets")
+
+
+@lazy_singleton
+def get_snippet_corpus():
+    """The process-wide corpus, or None when disabled or SQLite lacks FTS5."""
+    if not CORPUS_ENABLED:
+        return None
+    try:
+        return SnippetCorpus()
+    except sqlite3.Error as e:
+        logger.warning(f"Snippet corpus unavailable, searching live only: {e}")
+        return None
@@ -0,0 +1,146 @@
+"""
+core/stage_graph.py
+
+Small dependency-aware scheduler for the stages of one answer.
+
+Each stage is a function of the results of the stages it runs `after`. Stages
+run on the calling thread by default, in dependency order, when `result()`
+asks for them; `background` stages start on an executor as soon as their own
+dependencies are done, so they overlap with whatever the caller is doing.
+That is how independent or speculative work (e.g. searching the raw query
+while it is being translated) overlaps with the critical path.
+
+Background stages don't report progress directly: their events are held back
+and replayed on the calling thread when their result is used, so UI listeners
+tied to the caller's thread keep working and discarded speculation stays quiet.
+A cancelled stage never starts, or sees `cancelled(name)` set and may stop early.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import CancelledError, Future
+
+from core.progress import progress_listener, report
+
+
+class _Stage:
+    def __init__(self, name: str, fn, after, background: bool):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.background = background
+        self.future = Future()
+        self.cancelled = threading.Event()
+        self.events = []  # (level, message, data) held back from a background stage
+
+
+class StageGraph:
+    """A set of named stages, run at most once each. Not reusable across answers."""
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._context = None
+
+    def add(self, name: str, fn, after=(), background: bool = False) -> None:
+        """Add stage `name` computing fn(*results of `after`)."""
+        for dep in after:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+            if background and not self._stages[dep].background:
+                raise ValueError(f"Background stage '{name}' can't wait for caller stage '{dep}'")
+        self._stages[name] = _Stage(name, fn, after, background)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def start(self) -> "StageGraph":
+        """Start every background stage whose dependencies are met (the rest follow as they finish)."""
+        self._context = contextvars.copy_context()
+        for stage in self._stages.values():
+            if stage.background:
+                self._when_ready(stage)
+        return self
+
+    # --- Background stages ---
+    def _when_ready(self, stage: _Stage) -> None:
+        deps = [self._stages[dep].future for dep in stage.after]
+        if not deps:
+            self._submit(stage)
+            return
+        remaining = [len(deps)]
+
+        def on_dep_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._submit(stage)
+
+        for dep in deps:
+            dep.add_done_callback(on_dep_done)
+
+    def _submit(self, stage: _Stage) -> None:
+        context = self._context.copy()  # a Context can't be entered by two threads at once
+
+        def collect(level, message, data):
+            stage.events.append((level, message, data))
+
+        def run():
+            with progress_listener(collect):
+                self._run(stage)
+
+        self._executor.submit(context.run, run)
+
+    # --- Running ---
+    def _run(self, stage: _Stage) -> None:
+        if not stage.future.set_running_or_notify_cancel():
+            return
+        try:
+            args = [self._stages[dep].future.result() for dep in stage.after]
+            if stage.cancelled.is_set():
+                raise CancelledError(stage.name)
+            result = stage.fn(*args)
+        except BaseException as e:
+            stage.future.set_exception(e)
+        else:
+            stage.future.set_result(result)
+
+    def result(self, name: str, timeout=None):
+        """
+        Result of stage `name`. Caller stages (and their caller-stage dependencies) run
+        here on first request; background stages are waited for and their progress replayed.
+        """
+        stage = self._stages[name]
+        if not stage.background:
+            for dep in stage.after:
+                self.result(dep, timeout)
+            if not stage.future.done():
+                self._run(stage)
+            return stage.future.result()
+
+        if self._context is None:
+            raise RuntimeError("StageGraph.start() must be called before waiting on background stages")
+        result = stage.future.result(timeout)
+        events, stage.events = stage.events, []
+        for level, message, data in events:
+            report(level, message, **data)
+        return result
+
+    def done(self, name: str) -> bool:
+        return self._stages[name].future.done()
+
+    def cancelled(self, name: str) -> threading.Event:
+        """Event a long-running stage can poll to stop early once it has been cancelled."""
+        return self._stages[name].cancelled
+
+    def cancel(self, name: str) -> None:
+        """Cancel `name` and everything that depends on it; running stages are asked to stop."""
+        stage = self._stages[name]
+        stage.cancelled.set()
+        stage.future.cancel()
+        stage.events = []
+        for other in self._stages.values():
+            if name in other.after and not other.cancelled.is_set():
+                self.cancel(other.name)
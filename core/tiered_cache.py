@@ -0,0 +1,144 @@
+"""
+core/tiered_cache.py
+
+Two-tier cache: a bounded in-process LRU/TTL tier in front of a DiskCache store.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import HOT_CACHE_MAX_BYTES, HOT_CACHE_MAX_ITEMS, HOT_CACHE_TTL
+from core.metrics import count
+
+_MISSING = object()
+
+
+def _sizeof(value) -> int:
+    """Approximate in-memory footprint by serialised size."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return HOT_CACHE_MAX_BYTES  # unpicklable values never stay hot
+
+
+class TieredCache:
+    """
+    Read-through / write-through wrapper around a `dc.Cache`.
+    The disk store may be passed as a factory so SQLite is only opened on first use.
+
+    Hits in the hot tier never touch SQLite; a miss costs exactly one disk read.
+    Hot entries live for at most HOT_CACHE_TTL seconds (and never beyond the disk
+    entry's own expiry), which bounds staleness when another process writes or
+    clears the shared disk tier.
+    """
+
+    def __init__(
+        self,
+        disk,
+        max_bytes: int = HOT_CACHE_MAX_BYTES,
+        max_items: int = HOT_CACHE_MAX_ITEMS,
+        ttl: float = HOT_CACHE_TTL,
+        name: str = "cache",
+    ):
+        self._disk = disk  # a dc.Cache, or a zero-argument callable that opens one lazily
+        self.name = name   # label for the hit/miss counters
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.ttl = ttl
+        self._hot = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def disk(self):
+        return self._disk() if callable(self._disk) else self._disk
+
+    # --- Hot tier ---
+    def _hot_get(self, key):
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is None:
+                return _MISSING
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._hot[key]
+                self._bytes -= size
+                return _MISSING
+            self._hot.move_to_end(key)
+            return value
+
+    def _hot_put(self, key, value, disk_expire_time=None):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            self._hot_pop(key)
+            return
+        expires_at = time.monotonic() + self.ttl
+        if disk_expire_time is not None:
+            expires_at = min(expires_at, time.monotonic() + disk_expire_time - time.time())
+
+        with self._lock:
+            old = self._hot.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._hot[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._hot and (self._bytes > self.max_bytes or len(self._hot) > self.max_items):
+                _, (_, evicted, _) = self._hot.popitem(last=False)
+                self._bytes -= evicted
+
+    def _hot_pop(self, key):
+        with self._lock:
+            old = self._hot.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    # --- Cache API ---
+    def get(self, key, default=None):
+        value = self._hot_get(key)
+        if value is not _MISSING:
+            count("cache_requests_total", cache=self.name, result="hot_hit")
+            return value
+        value, expire_time = self.disk.get(key, default=_MISSING, expire_time=True)
+        if value is _MISSING:
+            count("cache_requests_total", cache=self.name, result="miss")
+            return default
+        count("cache_requests_total", cache=self.name, result="disk_hit")
+        self._hot_put(key, value, expire_time)
+        return value
+
+    def set(self, key, value, expire=None, **kwargs):
+        result = self.disk.set(key, value, expire=expire, **kwargs)
+        self._hot_put(key, value, None if expire is None else time.time() + expire)
+        return result
+
+    def delete(self, key, **kwargs):
+        self._hot_pop(key)
+        return self.disk.delete(key, **kwargs)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._hot.clear()
+            self._bytes = 0
+        return self.disk.clear(**kwargs)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self._hot_pop(key)
+        del self.disk[key]
+
+    def __getattr__(self, name):
+        # Everything else (transact, iterkeys, volume, ...) goes straight to disk
+        return getattr(self.disk, name)
@@ -0,0 +1,28 @@
+"""
+core/token_usage.py
+
+LangChain callback that feeds real Gemini token usage into the rate limiter.
+Kept apart from core/rate_limiter.py so the limiter doesn't pull in LangChain.
+"""
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.rate_limiter import record_usage
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Records real prompt + completion tokens from every finished model call."""
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        total = 0
+        for generations in response.generations:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+                if usage:
+                    total += usage.get("total_tokens", 0)
+                else:
+                    total += max(len(gen.text) // 4, 1)  # model didn't report usage
+        record_usage(total)
+
+
+token_usage_callback = TokenUsageCallback()
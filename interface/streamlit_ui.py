@@ -1,31 +1,68 @@
-import os
+from functools import partial
+
 import streamlit as st
-import google.generativeai as genai
-from langchain.schema import AIMessage, HumanMessage
-from services.medical_agent import get_medical_answer  
-from interface.ui_helpers import show_loading_gif
-from core.cache_manager import cache  
+from services.medical_agent import get_medical_answer, stream_medical_answer
+from interface.ui_helpers import show_loading_gif, get_gemini_api_key, show_progress, show_debug_panel
+from core.cache_manager import clear_caches
+from core.config import HISTORY_TOKEN_BUDGET, SINGLE_PASS_MULTILINGUAL
 from core.memory_manager import init_memory
-from core.config import get_gemini_api_key
+from core.metrics import trace_request
+from core.progress import progress_listener
+from utils.formatting import format_sources
+
+def stream_answer(user_query: str, history, gif_placeholder, single_pass: bool = SINGLE_PASS_MULTILINGUAL,
+                  history_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """Render sources and answer tokens progressively; returns the full answer."""
+    sources_box = st.expander("📚 Sources", expanded=False)
+    parts = []
+
+    def on_source(src, snippet):
+        sources_box.markdown(format_sources({src: snippet}), unsafe_allow_html=True)
+
+    def render():
+        for chunk in stream_medical_answer(user_query, history, on_source=on_source, single_pass=single_pass,
+                                           history_budget=history_budget):
+            if not parts:
+                gif_placeholder.empty()  # first token: drop the loading animation
+            parts.append(chunk)
+            yield chunk.replace("\n", "  \n")
+
+    try:
+        st.write_stream(render())
+    except Exception as e:
+        st.error(f"⚠️ stream_medical_answer failed: {e}")
+    gif_placeholder.empty()
+    return "".join(parts).strip()
+
 
 def show_ui():
     # Sidebar
     with st.sidebar:
         st.header("⚙️ Settings")
-        k_value = st.number_input("K value", min_value=1, max_value=10, value=3)
-        gemini_api_key = get_gemini_api_key()
+        history_budget = st.number_input(
+            "History budget (tokens)",
+            min_value=200,
+            max_value=8000,
+            value=HISTORY_TOKEN_BUDGET,
+            step=100,
+            help="Older turns beyond this are condensed into a running summary.",
+        )
+        streaming = st.toggle("⚡ Stream answers", value=True)
+        single_pass = st.toggle(
+            "🌍 Answer directly in my language",
+            value=SINGLE_PASS_MULTILINGUAL,
+            help="Skip the back-translation step: faster and cheaper for non-English questions.",
+        )
+        debug_mode = st.toggle(
+            "🔎 Debug panel",
+            value=False,
+            help="Show per-stage timings, cache hit rates and debug messages.",
+        )
+        get_gemini_api_key()  # also configures Gemini for this process
         if st.button("🧹 Clear Cache"):
-            cache.clear()
+            clear_caches()
             st.success("✅ Cache cleared!")
 
-    # Configure Gemini
-    os.environ["GOOGLE_API_KEY"] = gemini_api_key
-    genai.configure(api_key=gemini_api_key)
-
-    # Initialize chat memory
-    memory = init_memory(k=k_value)
-    memory = st.session_state.memory
-
     # Form (wrapped inside function = safe!)
     with st.form("query_form", clear_on_submit=True):
         user_query = st.text_input("💬 Ask your medical question:")
@@ -33,25 +70,34 @@ def show_ui():
         submit = st.form_submit_button("Submit")
 
     if submit and user_query:
+        # Chat memory is created on the first question, keeping the first render light
+        memory = init_memory(budget=history_budget)
         gif_placeholder = show_loading_gif()
-        with st.spinner("🧠 Processing your question..."):
-            try:
-                answer = get_medical_answer(user_query)
-            except Exception as e:
+        history = memory.context()
+        with progress_listener(partial(show_progress, debug=debug_mode)), trace_request("answer") as trace:
+            if streaming:
+                answer = stream_answer(user_query, history, gif_placeholder, single_pass, history_budget)
+            else:
+                with st.spinner("🧠 Processing your question..."):
+                    try:
+                        answer = get_medical_answer(user_query, history, single_pass, history_budget)
+                    except Exception as e:
+                        gif_placeholder.empty()
+                        st.error(f"⚠️ get_medical_answer failed: {e}")
+                        return
                 gif_placeholder.empty()
-                st.error(f"⚠️ get_medical_answer failed: {e}")
-                return
-        gif_placeholder.empty()
-        st.markdown(answer.replace("\n", "  \n"), unsafe_allow_html=True)
-        memory.chat_memory.add_message(HumanMessage(content=user_query))
-        memory.chat_memory.add_message(AIMessage(content=answer))
-
-    if st.session_state.memory and hasattr(st.session_state.memory, "chat_memory"):
+                st.markdown(answer.replace("\n", "  \n"), unsafe_allow_html=True)
+        memory.add_turn(user_query, answer)  # may start a background summary of older turns
+        if debug_mode:
+            show_debug_panel(trace)
+
+    if st.session_state.get("memory") and hasattr(st.session_state.memory, "messages"):
         with st.expander("🩺 View Chat History", expanded=False):
             history_md = ""
-            for msg in st.session_state.memory.chat_memory.messages[-10:]:
+            for msg in st.session_state.memory.messages[-10:]:
                 if msg.__class__.__name__ == "HumanMessage":
                     history_md += f"**You:** {msg.content}  \n"
                 else:
-                    history_md += f"**DocBot:**  \n{msg.content.replace(chr(10), '  \n')}  \n\n"
+                    content = msg.content.replace("\n", "  \n")
+                    history_md += f"**DocBot:**  \n{content}  \n\n"
             st.markdown(history_md, unsafe_allow_html=True)
@@ -6,6 +6,103 @@ Handles the loading animation and any other future UI helpers (alerts, banners,
 
 import streamlit as st
 
+from core.config import configure_gemini
+from core.llm import forget_api_key
+from core.cache_manager import clear_caches
+from core import metrics
+
+
+def get_gemini_api_key() -> str:
+    """Fetch Google Gemini API key either from Streamlit Secrets or text input."""
+    with st.sidebar:
+        use_secrets = st.toggle("Use Streamlit Secrets for API Key", value=True)
+        if use_secrets:
+            try:
+                api_key = st.secrets["GOOGLE_API_KEY"]
+            except Exception:
+                st.error("Missing GOOGLE_API_KEY in Streamlit secrets.")
+                st.stop()
+        else:
+            api_key = st.text_input("Gemini API Key", type="password")
+            if not api_key:
+                st.warning("Please enter your Gemini API key!", icon="⚠")
+                st.stop()
+    previous = st.session_state.get("gemini_api_key")
+    if previous and previous != api_key:
+        forget_api_key(previous)  # the old key's clients would otherwise linger until evicted
+    st.session_state["gemini_api_key"] = api_key
+    configure_gemini(api_key)
+    return api_key
+
+
+def clear_all_caches():
+    """Utility to clear all caches from the sidebar."""
+    if st.sidebar.button("🧹 Clear All Caches"):
+        clear_caches()
+        st.success("✅ All caches cleared successfully!")
+
+
+def show_progress(level: str, message: str, data: dict, debug: bool = False) -> None:
+    """Render a pipeline progress event (see core.progress) in the page."""
+    if level == "debug":
+        if debug:
+            st.info(message)
+    elif level == "success":
+        st.success(message)
+    elif level == "warning":
+        st.warning(message)
+    elif level == "error":
+        st.error(message)
+    else:
+        st.caption(message)
+
+
+def show_debug_panel(trace=None) -> None:
+    """Per-request trace, stage latency histograms and cache hit rates (see core.metrics)."""
+    with st.expander("🔎 Debug panel", expanded=True):
+        if trace is not None:
+            st.markdown(f"**This request** — {trace.duration:.2f}s total")
+            st.dataframe(
+                [
+                    {
+                        "stage": span["stage"],
+                        "labels": ", ".join(f"{k}={v}" for k, v in span["labels"].items()),
+                        "start (ms)": round(span["start"] * 1000),
+                        "duration (ms)": round(span["duration"] * 1000),
+                        "error": span["error"] or "",
+                    }
+                    for span in trace.to_dict()["spans"]
+                ],
+                width="stretch",
+            )
+
+        data = metrics.snapshot(traces=False)
+        st.markdown("**Stage latency (all requests in this process)**")
+        st.dataframe(
+            [
+                {
+                    "stage": h["stage"],
+                    "labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                    "count": h["count"],
+                    "mean (ms)": round(h["mean"] * 1000),
+                    "p50 (ms)": round(h["p50"] * 1000),
+                    "p95 (ms)": round(h["p95"] * 1000),
+                }
+                for h in data["histograms"]
+            ],
+            width="stretch",
+        )
+
+        st.markdown("**Cache hit rate**")
+        st.dataframe(
+            [{"cache": name, **rates} for name, rates in metrics.cache_hit_rates().items()],
+            width="stretch",
+        )
+
+        col1, col2 = st.columns(2)
+        col1.download_button("⬇️ Metrics (JSON)", metrics.to_json(indent=2), "metrics.json", "application/json")
+        col2.download_button("⬇️ Metrics (Prometheus)", metrics.to_prometheus(), "metrics.prom", "text/plain")
+
 
 def show_loading_gif() -> "st.delta_generator.DeltaGenerator":
     """
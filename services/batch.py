@@ -0,0 +1,192 @@
+"""
+services/batch.py
+
+Batch query mode: answers a file of questions (FAQ generation, regression checks)
+stage by stage instead of calling get_medical_answer in a loop.
+
+Queries are deduplicated with normalize_query_key and answered in waves of
+BATCH_WAVE_SIZE. Each wave waits for headroom under BATCH_RATE_SHARE of the shared
+token budget, so a large file doesn't starve live users. Within a wave every LLM
+stage runs as one LangChain .batch() with bounded concurrency, and search-routed
+questions are searched `concurrency` at a time, each fanning out on the shared
+search pool. Results are written as JSONL, one line per input query.
+
+Run with:
+    GOOGLE_API_KEY=... python -m services.batch questions.txt -o answers.jsonl --concurrency 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.cache_manager import normalize_query_key
+from core.config import (
+    BATCH_CONCURRENCY,
+    BATCH_RATE_SHARE,
+    BATCH_WAVE_SIZE,
+    SINGLE_PASS_MULTILINGUAL,
+    configure_gemini,
+)
+from core.metrics import timed, to_json
+from core.rate_limiter import EXPECTED_OUTPUT_TOKENS, estimate_tokens, wait_for_headroom
+from services.medical_agent import (
+    medical_request,
+    compose_direct_answer,
+    compose_summary_answer,
+    mark_translated,
+    mark_localised,
+    is_english_language,
+    single_pass_language,
+)
+from services.router import route
+from services.search_engine import medical_search
+from services.summariser import summarise_many
+from services.translator import detect_and_translate_many, translate_back_many
+
+logger = logging.getLogger(__name__)
+
+
+def read_queries(path: str) -> list:
+    """Read one query per line; JSONL lines with a "query" field are accepted too."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["query"]
+            queries.append(line)
+    return queries
+
+
+def answer_batch(queries, concurrency: int = BATCH_CONCURRENCY, single_pass: bool = SINGLE_PASS_MULTILINGUAL,
+                 wave_size: int = BATCH_WAVE_SIZE) -> list:
+    """
+    Answer `queries`, returning one result dict per input (duplicates share work).
+    With `single_pass`, non-English answers are generated in their language and skip stage 4.
+    """
+    # Deduplicate on the normalized key, keeping the first spelling we saw
+    unique = {}
+    for query in queries:
+        unique.setdefault(normalize_query_key(query), query)
+    keys = list(unique)
+    logger.info(f"Batch: {len(queries)} queries, {len(keys)} unique.")
+
+    by_key = {}
+    for first in range(0, len(keys), wave_size):
+        wave = keys[first:first + wave_size]
+        originals = [unique[k] for k in wave]
+        # Usage is only recorded once calls return, so admit the wave on its estimate
+        # (a rough allowance for translation, generation and back-translation)
+        wait_for_headroom(
+            sum(4 * estimate_tokens(q) + EXPECTED_OUTPUT_TOKENS for q in originals),
+            BATCH_RATE_SHARE, who="Batch",
+        )
+        by_key.update(zip(wave, answer_wave(originals, concurrency, single_pass)))
+    return [{"query": query, **by_key[normalize_query_key(query)]} for query in queries]
+
+
+def answer_wave(originals, concurrency: int, single_pass: bool) -> list:
+    """Answer distinct questions stage by stage, returning one result dict per question."""
+    # Stage 1: language detection / translation
+    lang_infos = detect_and_translate_many(originals, concurrency)
+    translated = [info["translation"] for info in lang_infos]
+    answer_langs = [single_pass_language(info["language"], single_pass) for info in lang_infos]
+    routes = [route(q) for q in translated]
+
+    # Stage 2: search (each fanning out on the shared search pool), deduplicated again after translation
+    search_idx = [i for i, r in enumerate(routes) if r == "search"]
+    search_queries = {normalize_query_key(translated[i]): translated[i] for i in search_idx}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-search") as pool:
+        found = dict(zip(search_queries, pool.map(medical_search, search_queries.values())))
+    sources = {i: found[normalize_query_key(translated[i])] for i in search_idx}
+
+    # Stage 3: summarisation and direct generation, each as a single batched call
+    summaries = summarise_many(
+        [(sources[i], translated[i], answer_langs[i]) for i in search_idx], concurrency
+    )
+    direct_idx = [i for i, r in enumerate(routes) if r != "search"]
+    generations = [None] * len(originals)
+    with timed("generate", mode="batch"):
+        for localised in (False, True):
+            group = [i for i in direct_idx if bool(answer_langs[i]) == localised]
+            if not group:
+                continue
+            requests = [medical_request(translated[i], [], answer_langs[i]) for i in group]
+            replies = requests[0][0].batch(
+                [inputs for _, inputs in requests],
+                config={"max_concurrency": concurrency},
+                return_exceptions=True,
+            )
+            for i, reply in zip(group, replies):
+                generations[i] = reply
+
+    answers = [None] * len(originals)
+    for i, summary in zip(search_idx, summaries):
+        question = originals[i] if answer_langs[i] else translated[i]
+        answers[i] = compose_summary_answer(question, summary, sources[i], answer_langs[i])
+    for i in direct_idx:
+        generation = generations[i]
+        if isinstance(generation, Exception):
+            answers[i] = f"⚠️ Failed to generate an answer: {generation}"
+        else:
+            answers[i] = compose_direct_answer(originals[i], generation, answer_langs[i])
+
+    # Stage 4: back-translation for non-English questions not answered in a single pass
+    for i, lang in enumerate(answer_langs):
+        if lang:
+            answers[i] = mark_localised(answers[i], lang_infos[i]["language"])
+    foreign_idx = [
+        i for i, info in enumerate(lang_infos)
+        if not is_english_language(info["language"]) and not answer_langs[i]
+    ]
+    translated_back = translate_back_many(
+        [(answers[i], lang_infos[i]["language"]) for i in foreign_idx], concurrency
+    )
+    for i, text in zip(foreign_idx, translated_back):
+        answers[i] = mark_translated(text, lang_infos[i]["language"])
+
+    return [
+        {"language": info["language"], "route": decision, "answer": text.strip()}
+        for info, decision, text in zip(lang_infos, routes, answers)
+    ]
+
+
+def write_jsonl(results, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer a file of medical questions in batch.")
+    parser.add_argument("queries", help="Text file with one query per line (or JSONL with a 'query' field).")
+    parser.add_argument("-o", "--output", default="answers.jsonl")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--metrics", help="Also write per-stage timings and cache counters (JSON) here.")
+    parser.add_argument(
+        "--single-pass", action=argparse.BooleanOptionalAction, default=SINGLE_PASS_MULTILINGUAL,
+        help="Answer non-English questions directly in their language instead of back-translating.",
+    )
+    args = parser.parse_args()
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        configure_gemini(api_key)
+
+    start = time.perf_counter()
+    queries = read_queries(args.queries)
+    results = answer_batch(queries, args.concurrency, args.single_pass)
+    write_jsonl(results, args.output)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(to_json(indent=2))
+    logger.info(f"Answered {len(results)} queries in {time.perf_counter() - start:.1f}s → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
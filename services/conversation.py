@@ -0,0 +1,224 @@
+"""
+services/conversation.py
+
+Token-budgeted conversation history with a rolling summary.
+
+Each question is sent with at most HISTORY_TOKEN_BUDGET estimated tokens of
+history: a short summary of older turns followed by the newest messages that
+fit. Turns that fall out of the window are folded into the summary by a
+background task after the answer has been delivered, so the per-turn prompt
+cost stays flat however long the conversation runs.
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_WORDS, HISTORY_COMPACT_TO
+from core.lazy import lazy_singleton
+from core.metrics import timed
+from core.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# Compaction never runs on the request path
+compaction_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-compact")
+
+
+# --------------------------------
+# Prompt Definition
+# --------------------------------
+HISTORY_SUMMARY_TEMPLATE = """
+Update the running summary of a conversation between a user and DocBot, a medical assistant.
+
+Keep anything later questions may refer back to: the user's situation, age, conditions,
+medications and preferences, and the main points DocBot already explained. Drop greetings,
+formatting, sources and disclaimers. Write plain text, at most {max_words} words.
+
+**Current summary:**
+{summary}
+
+**New messages:**
+{messages}
+
+**Updated summary:**
+"""
+
+
+@lazy_singleton
+def get_history_summary_runnable():
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
+
+    return (
+        ChatPromptTemplate.from_template(HISTORY_SUMMARY_TEMPLATE)
+        | get_chat_model()
+        | StrOutputParser()
+    )
+
+
+# --------------------------------
+# Budgeting Helpers
+# --------------------------------
+def _role(message) -> str:
+    return getattr(message, "type", None) or message.get("role", "")
+
+
+def _content(message) -> str:
+    if hasattr(message, "content"):
+        return str(message.content)
+    return str(message.get("content", ""))
+
+
+def message_tokens(message) -> int:
+    return estimate_tokens(_content(message))
+
+
+def _shortened(message, tokens: int):
+    """Copy of `message` cut to about `tokens` tokens (keeps the start, where answers put their overview)."""
+    text = _content(message)[:max(tokens, 1) * 4].rsplit(" ", 1)[0] + " …"
+    return message.__class__(content=text) if hasattr(message, "content") else {**message, "content": text}
+
+
+def fit_history(history, budget: int = HISTORY_TOKEN_BUDGET) -> list:
+    """
+    The part of `history` to send: a leading summary message is always kept, then the
+    newest messages that fit in `budget` estimated tokens. If even the newest message
+    is too long, a shortened copy of it is used.
+    """
+    history = list(history or [])
+    pinned = history[:1] if history and _role(history[0]) == "system" else []
+    remaining = budget - sum(message_tokens(m) for m in pinned)
+
+    recent = []
+    for message in reversed(history[len(pinned):]):
+        tokens = message_tokens(message)
+        if tokens > remaining:
+            if not recent and remaining > 0:
+                recent.append(_shortened(message, remaining))
+            break
+        recent.append(message)
+        remaining -= tokens
+    return pinned + recent[::-1]
+
+
+def render_history(history) -> str:
+    """Compact prompt text for a history: one `Speaker: text` line per message."""
+    lines = []
+    for message in history or []:
+        role = _role(message)
+        if role == "system":
+            lines.append(_content(message))
+        else:
+            speaker = "User" if role in ("human", "user") else "DocBot"
+            lines.append(f"{speaker}: {_content(message)}")
+    return "\n".join(lines)
+
+
+# --------------------------------
+# Conversation State
+# --------------------------------
+class ConversationHistory:
+    """
+    Full transcript plus a rolling summary of the messages that no longer fit.
+
+    `messages` is the whole conversation (for display); `context()` is what gets sent
+    to the model. Safe to read while a compaction is running in the background.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET):
+        self.budget = budget
+        self.messages = []
+        self.summary = ""
+        self.summarised = 0      # messages[:summarised] are represented by `summary`
+        self._generation = 0     # bumped by clear() so a late compaction result is discarded
+        self._lock = threading.Lock()
+        self._compaction = None  # Future of the running compaction, if any
+
+    def add_message(self, message) -> None:
+        with self._lock:
+            self.messages.append(message)
+        self._maybe_compact()
+
+    def add_turn(self, question: str, answer: str) -> None:
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        with self._lock:
+            self.messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+        self._maybe_compact()
+
+    def context(self) -> list:
+        """Summary message (if any) followed by the newest messages that fit the budget."""
+        from langchain_core.messages import SystemMessage
+
+        with self._lock:
+            summary, recent = self.summary, self.messages[self.summarised:]
+        pinned = [SystemMessage(content=SUMMARY_PREFIX + summary)] if summary else []
+        return fit_history(pinned + recent, self.budget)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.messages, self.summary, self.summarised = [], "", 0
+            self._generation += 1
+
+    # --- Compaction ---
+    def _compaction_cut(self):
+        """Index up to which messages should be summarised, or None if everything still fits."""
+        recent_budget = self.budget - estimate_tokens(SUMMARY_PREFIX + self.summary)
+        recent = self.messages[self.summarised:]
+        if sum(message_tokens(m) for m in recent) <= recent_budget:
+            return None
+        # Fold enough that the recent window drops to HISTORY_COMPACT_TO of its budget,
+        # so compaction runs every few turns rather than on every one
+        keep = 0
+        used = sum(message_tokens(m) for m in recent[-2:])  # the last exchange always stays verbatim
+        for message in reversed(recent[:-2]):
+            used += message_tokens(message)
+            if used > recent_budget * HISTORY_COMPACT_TO:
+                break
+            keep += 1
+        cut = len(self.messages) - 2 - keep
+        return cut if cut > self.summarised else None
+
+    def _maybe_compact(self) -> None:
+        with self._lock:
+            if self._compaction is not None and not self._compaction.done():
+                return
+            cut = self._compaction_cut()
+            if cut is None:
+                return
+            start, summary = self.summarised, self.summary
+            folded = self.messages[start:cut]
+            # In the caller's context, so the summary is written with the session's API key
+            self._compaction = compaction_executor.submit(
+                contextvars.copy_context().run,
+                self._compact, self._generation, start, cut, summary, folded,
+            )
+
+    def _compact(self, generation: int, start: int, cut: int, summary: str, folded: list) -> None:
+        try:
+            with timed("history_compaction"):
+                updated = get_history_summary_runnable().invoke({
+                    "summary": summary or "(none yet)",
+                    "messages": render_history(folded),
+                    "max_words": HISTORY_SUMMARY_WORDS,
+                }).strip()
+        except Exception as e:
+            # Leave the messages unsummarised; the next turn tries again
+            logger.warning(f"History compaction failed: {e}")
+            return
+        with self._lock:
+            if self._generation != generation:
+                return
+            self.summary, self.summarised = updated, cut
+        logger.info(f"Compacted {cut - start} messages into the conversation summary.")
+
+    def wait(self, timeout=None) -> None:
+        """Block until a running compaction finishes (for scripts and shutdown)."""
+        future = self._compaction
+        if future is not None:
+            future.result(timeout)
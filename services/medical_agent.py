@@ -3,25 +3,54 @@ services/medical_agent.py
 
 Main medical response generation logic — orchestrates translation,
 routing, summarisation, and model responses.
+
+This module is UI-free: progress goes through core.progress.report() and the
+conversation history is passed in by the caller (Streamlit, a worker or the
+async service in services/service.py).
 """
 
-import streamlit as st
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import StrOutputParser, AIMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
-from core.rate_limiter import is_rate_limited
-from services.translator import detect_and_translate, translate_back_to_original_language
-from services.router import router_chain
-from core.memory_manager import init_memory
-from utils.formatting import clean_response_text
+from core.cache_manager import hashed_key, normalize_query_key
+from core.config import (
+    HISTORY_TOKEN_BUDGET,
+    LANG_DETECT_THRESHOLD,
+    LOG_RAW_QUERIES,
+    PIPELINE_MAX_CONCURRENCY,
+    SINGLE_PASS_MULTILINGUAL,
+    SPECULATIVE_SEARCH,
+    SPECULATE_MIN_CONFIDENCE,
+)
+from core.lazy import lazy_singleton
+from core.metrics import count, timed, timed_iter
+from core.progress import report
+from core.rate_limiter import estimate_tokens, is_rate_limited
+from core.single_flight import single_flight, single_flight_iter
+from core.stage_graph import StageGraph
+from services.conversation import fit_history, render_history
+from services.translator import (
+    ANSWER_LANGUAGE_INSTRUCTION,
+    detect_and_translate,
+    translate_back_to_original_language,
+    stream_back_translation,
+)
+from services.router import get_router_chain, route, should_search, summary_header, summary_footer
+from services.search_engine import SAFE_SOURCES, iter_medical_search
+from services.summariser import stream_medical_summary
+from utils.formatting import clean_response_text, StreamingCleaner
+from utils.language_detect import is_confidently_english, looks_english
 
+logger = logging.getLogger(__name__)
 
 
 # --------------------------------
 # Prompt Definition
 # --------------------------------
-medical_prompt = ChatPromptTemplate.from_template("""
+MEDICAL_TEMPLATE = """
 You are **DocBot**, a multilingual, evidence-based medical assistant. 
 
 Your role is to provide **clear, structured, and informative explanations** for medical questions.
@@ -47,86 +76,377 @@ Use the user’s context to maintain conversational flow.
 
 **User question and context:**
 {input}
-""")
+"""
+
+
+@lazy_singleton
+def get_medical_prompt():
+    from langchain.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_template(MEDICAL_TEMPLATE)
+
+
+# Runnable pipeline: prompt → Gemini model → plain text output (built on first use)
+@lazy_singleton
+def get_medical_runnable():
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
+
+    return (
+        get_medical_prompt()
+        | get_chat_model()
+        | StrOutputParser()
+    )
+
+
+@lazy_singleton
+def get_localised_medical_runnable():
+    """Reason in English but answer in {answer_language} (single-pass multilingual mode)."""
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
 
+    return (
+        ChatPromptTemplate.from_template(MEDICAL_TEMPLATE + ANSWER_LANGUAGE_INSTRUCTION)
+        | get_chat_model()
+        | StrOutputParser()
+    )
 
-# Runnable pipeline: prompt → Gemini model → plain text output
-medical_runnable = (
-    medical_prompt
-    | ChatGoogleGenerativeAI(model="models/gemini-2.0-flash", temperature=0.0)
-    | StrOutputParser()
+
+def medical_request(question: str, history, answer_language=None):
+    """Return (runnable, inputs) for an English answer, or one written in `answer_language`."""
+    inputs = {"history": render_history(history), "input": question}
+    if not answer_language:
+        return get_medical_runnable(), inputs
+    return get_localised_medical_runnable(), {**inputs, "answer_language": answer_language}
+
+
+def generation_key(question: str, history, answer_language=None) -> str:
+    """Identical question, history and answer language give an identical generation."""
+    return hashed_key(answer_language or "", render_history(history), question)
+
+
+def direct_answer_header(query: str) -> str:
+    return f"""**Question:** {query}    
+
+**Answer:**  
+"""
+
+
+DIRECT_ANSWER_FOOTER = """  
+
+---
+
+⚠️ *This information is for educational purposes only and should not replace professional medical advice.*"""
+
+
+def direct_answer_footer(answer_language=None) -> str:
+    # A localised answer ends with the model's own disclaimer, written in answer_language
+    return "" if answer_language else DIRECT_ANSWER_FOOTER
+
+
+def compose_direct_answer(query: str, response: str, answer_language=None) -> str:
+    return clean_response_text(
+        direct_answer_header(query) + response + direct_answer_footer(answer_language),
+        disclaimer=not answer_language,
+    )
+
+
+def compose_summary_answer(question: str, summary: str, sources: dict, answer_language=None) -> str:
+    return clean_response_text(
+        summary_header(question, answer_language) + summary + summary_footer(sources, answer_language),
+        disclaimer=not answer_language,
+    )
+
+
+def mark_translated(translated: str, user_lang: str) -> str:
+    return f"*Translated from English to {user_lang}*\n\n{translated}"
+
+
+def mark_localised(answer: str, user_lang: str) -> str:
+    return f"*Answered in {user_lang}*\n\n{answer}"
+
+
+def is_english_language(lang: str) -> bool:
+    return lang.strip().lower().replace("-", "").startswith("en")
+
+
+def single_pass_language(user_lang: str, single_pass: bool = SINGLE_PASS_MULTILINGUAL):
+    """
+    Language to generate the answer in directly, or None to answer in English
+    (and back-translate afterwards if the user wrote in another language).
+    """
+    if not single_pass or is_english_language(user_lang) or user_lang.strip().lower() in ("", "unknown"):
+        return None
+    return user_lang
+
+
+# --------------------------------
+# Stage Scheduling
+# --------------------------------
+# Background stages of the answer graph (speculative work); the critical path runs on the caller's thread
+stage_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_MAX_CONCURRENCY,
+    thread_name_prefix="pipeline-stage",
 )
 
 
+def speculative_search(query: str, cancelled) -> dict:
+    """
+    Search the untranslated query, stopping early once `cancelled` is set (None if not
+    search-routed). Not counted as a route decision: the real route still follows.
+    """
+    if not should_search(query):
+        return None
+    sources = {}
+    for src, snippet in iter_medical_search(query):
+        if cancelled.is_set():
+            return None
+        sources[src] = snippet
+    return sources
+
+
+def plan_answer(query: str, history, history_budget: int = HISTORY_TOKEN_BUDGET) -> StageGraph:
+    """
+    Start the stage graph for one answer: language detection and fitting the history
+    to `history_budget` tokens run on the caller's thread when asked for; if the query
+    probably is English but still needs the translator, its search starts right away
+    in the background.
+    """
+    graph = StageGraph(stage_executor)
+    graph.add("translate", lambda: detect_and_translate(query))
+    graph.add("history", lambda: fit_history(history, history_budget))
+    if (
+        SPECULATIVE_SEARCH
+        and looks_english(query, SPECULATE_MIN_CONFIDENCE)
+        and not is_confidently_english(query, LANG_DETECT_THRESHOLD)
+    ):
+        graph.add(
+            "speculative_search",
+            lambda: speculative_search(query, graph.cancelled("speculative_search")),
+            background=True,
+        )
+    return graph.start()
+
+
+def settle_speculation(graph: StageGraph, query: str, translated_query: str) -> None:
+    """
+    Keep the speculative search if translation left the question unchanged (its results
+    are now in the search cache, or in flight for the real search to join); otherwise cancel it.
+    """
+    if "speculative_search" not in graph:
+        return
+    if normalize_query_key(translated_query) != normalize_query_key(query):
+        graph.cancel("speculative_search")
+        count("speculation_total", stage="search", result="discarded")
+        return
+    count("speculation_total", stage="search", result="used")
+    try:
+        graph.result("speculative_search")  # also replays its progress messages
+    except Exception as e:
+        report("debug", f"Speculative search failed, searching again: {e}")
+
+
 # --------------------------------
 # Main Medical Answer Function
 # --------------------------------
-def get_medical_answer(query: str) -> str:
-    """Generate multilingual, evidence-based medical response."""
-    # Optional debugging toggle
-    debug_mode = st.sidebar.checkbox("Show debug info", value=False)
-    if debug_mode:
-        st.info(f"🧩 Processing query: {query[:120]}")
+def compose_answer(query: str, translated_query: str, history, answer_language=None) -> str:
+    """
+    Route, search/summarise or generate, and return the cleaned answer (English unless
+    `answer_language`). `history` should already be fitted with fit_history().
+    """
+    context = {"input": translated_query, "query": query, "history": history, "answer_language": answer_language}
+
+    # Step 3: Route intelligently (decide search vs no-search)
+    with timed("router_chain"):
+        routed_input = get_router_chain().invoke(context)
+    report("debug", "✅ Translation and routing completed successfully!")
+
+    # Step 4: If routed to summarised sources
+    if isinstance(routed_input, dict) and routed_input.get("summarised"):
+        return clean_response_text(routed_input.get("input", ""), disclaimer=not answer_language)
+
+    # Step 5: Otherwise, generate direct model response
+    question, history = routed_input.get("input", ""), routed_input.get("history", [])
+    runnable, inputs = medical_request(question, history, answer_language)
+    with timed("generate"):
+        # Direct answers aren't cached, so waiters in other processes get the leader's result
+        response = single_flight(
+            "generate", generation_key(question, history, answer_language),
+            lambda: runnable.invoke(inputs), share=True,
+        )
+    # Clean up duplicates and repeated labels
+    return compose_direct_answer(query, response, answer_language)
+
+
+def log_query(query: str) -> None:
+    """
+    Log each question at INFO whatever progress listener is installed, so the cache
+    warmer can mine it from the app log: as its normalized cache key, or as typed
+    (real spellings) only when LOG_RAW_QUERIES is on.
+    """
+    logged = " ".join(query.split()) if LOG_RAW_QUERIES else normalize_query_key(query)
+    logger.info(f"Processing query: {logged}")
+    report("debug", f"🧩 Answering: {query[:120]}")
+
+
+def get_medical_answer(query: str, history=None, single_pass: bool = SINGLE_PASS_MULTILINGUAL,
+                       history_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Generate multilingual, evidence-based medical response.
+    With `single_pass`, non-English answers are written directly in the user's language
+    instead of being generated in English and translated back. At most `history_budget`
+    estimated tokens of `history` are sent.
+    """
+    log_query(query)
 
     final_response = None
-    tokens_this_request = max(len(query) // 4, 1)
+    tokens_this_request = estimate_tokens(query)
     if is_rate_limited(tokens_this_request):
         return "⚠️ Rate limit exceeded. Please wait a bit."
 
     try:
-        # Step 1: Detect language and translate if needed
-        lang_info = detect_and_translate(query)
+        # Step 1: Detect language and translate if needed (a likely-English query is searched meanwhile)
+        graph = plan_answer(query, history, history_budget)
+        lang_info = graph.result("translate")
         user_lang = lang_info["language"]
         translated_query = lang_info["translation"]
+        settle_speculation(graph, query, translated_query)
 
-        # Step 2: Initialise short-term memory
-        memory = init_memory()
-        context = {"input": translated_query, "history": memory.chat_memory.messages}
+        # Step 2: Attach conversation history, bounded by history_budget
+        history = graph.result("history")
 
-        # Step 3: Route intelligently (decide search vs no-search)
-        routed_input = router_chain.invoke(context)
-        if debug_mode:
-            st.success("✅ Translation and routing completed successfully!")
+        answer_language = single_pass_language(user_lang, single_pass)
+        if answer_language:
+            try:
+                answer = compose_answer(query, translated_query, history, answer_language)
+                final_response = mark_localised(answer, user_lang)
+                report("success", f"🌍 Answered directly in {user_lang}.")
+            except Exception as e:
+                report("warning", f"⚠️ Single-pass answer failed, falling back to back-translation: {e}")
 
-        # Step 4: If routed to summarised sources
-        if isinstance(routed_input, dict) and (
-            "Verified medical information" in routed_input.get("input", "") or
-            "Sources referenced" in routed_input.get("input", "")
-        ):
-            final_response = clean_response_text(routed_input.get("input", ""))
+        if final_response is None:
+            final_response = compose_answer(query, translated_query, history)
 
-        # Step 5: Otherwise, generate direct model response
-        else:
-            english_response = medical_runnable.invoke({
-                "history": routed_input.get("history", []),
-                "input": routed_input.get("input", "")
-            })
-            # Clean up duplicates and repeated labels
-            final_response = f"""**Question:** {query}    
-
-**Answer:**  
-{english_response}  
-
----
-
-⚠️ *This information is for educational purposes only and should not replace professional medical advice.*"""
-            final_response = clean_response_text(final_response)
-
-        # Step 6: Translate back only if original language is not English
-        normalized_lang = user_lang.strip().lower().replace("-", "")
-        is_english = normalized_lang.startswith("en")
-        
-        if not is_english:
-            st.success(f"🌍 Translation completed ({user_lang} → English → {user_lang}).")
-            translated_back = translate_back_to_original_language(final_response, user_lang)
-            final_response = f"*Translated from English to {user_lang}*\n\n{translated_back}"
- 
+            # Step 6: Translate back only if original language is not English
+            if not is_english_language(user_lang):
+                report("success", f"🌍 Translation completed ({user_lang} → English → {user_lang}).")
+                translated_back = translate_back_to_original_language(final_response, user_lang)
+                final_response = mark_translated(translated_back, user_lang)
 
     except Exception as e:
-        st.error(f"⚠️ Error generating answer: {e}")
+        report("error", f"⚠️ Error generating answer: {e}")
         final_response = f"⚠️ Failed to generate an answer: {e}"
 
     if not final_response:
         final_response = "⚠️ No answer generated."
 
     return final_response.strip()
+
+
+# --------------------------------
+# Streaming Medical Answer Function
+# --------------------------------
+def clean_stream(pieces, answer_language=None):
+    """
+    Run StreamingCleaner over a stream of raw text pieces, yielding cleaned text.
+    Answers in `answer_language` keep the model's own disclaimer instead of gaining the English one.
+    """
+    cleaner = StreamingCleaner(disclaimer=not answer_language)
+    for piece in pieces:
+        cleaned = cleaner.feed(piece)
+        if cleaned:
+            yield cleaned
+    yield cleaner.finish()
+
+
+def answer_pieces(query: str, translated_query: str, history, on_source=None, answer_language=None):
+    """Route, then stream the raw pieces of either the source summary or the direct answer."""
+    if route(translated_query) == "search":
+        sources = {}
+        for src, snippet in iter_medical_search(translated_query):
+            sources[src] = snippet
+            if on_source:
+                on_source(src, snippet)
+        sources = {src: sources[src] for src in SAFE_SOURCES if src in sources}
+        return chain(
+            [summary_header(query if answer_language else translated_query, answer_language)],
+            stream_medical_summary(sources, translated_query, answer_language),
+            [summary_footer(sources, answer_language)],
+        )
+
+    runnable, inputs = medical_request(translated_query, history, answer_language)
+    pieces = single_flight_iter(
+        "generate_stream", generation_key(translated_query, history, answer_language),
+        lambda: runnable.stream(inputs), share=True,
+    )
+    return chain(
+        [direct_answer_header(query)],
+        timed_iter("generate", pieces, mode="stream"),
+        [direct_answer_footer(answer_language)],
+    )
+
+
+def stream_medical_answer(query: str, history=None, on_source=None, single_pass: bool = SINGLE_PASS_MULTILINGUAL,
+                          history_budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Streaming variant of get_medical_answer: yields cleaned Markdown as tokens arrive.
+    `on_source(source, snippet)` is called for each search source as soon as it is available.
+    """
+    log_query(query)
+    tokens_this_request = estimate_tokens(query)
+    if is_rate_limited(tokens_this_request):
+        yield "⚠️ Rate limit exceeded. Please wait a bit."
+        return
+
+    try:
+        # Step 1: Detect language and translate if needed (a likely-English query is searched meanwhile)
+        graph = plan_answer(query, history, history_budget)
+        lang_info = graph.result("translate")
+        user_lang = lang_info["language"]
+        translated_query = lang_info["translation"]
+        settle_speculation(graph, query, translated_query)
+
+        # Step 2: Attach conversation history, bounded by history_budget
+        history = graph.result("history")
+        answer_language = single_pass_language(user_lang, single_pass)
+
+        # Step 3: Route, then stream either the source summary or the direct answer
+        pieces = answer_pieces(query, translated_query, history, on_source, answer_language)
+
+        # Step 4: English and single-pass answers stream straight through;
+        # other languages stream the back-translation
+        if is_english_language(user_lang):
+            yield from clean_stream(pieces)
+        elif answer_language:
+            yield f"*Answered in {user_lang}*\n\n"
+            yield from clean_stream(pieces, answer_language)
+        else:
+            english_response = "".join(clean_stream(pieces))
+            yield f"*Translated from English to {user_lang}*\n\n"
+            yield from stream_back_translation(english_response, user_lang)
+
+    except Exception as e:
+        yield f"⚠️ Failed to generate an answer: {e}"
+
+
+# --------------------------------
+# Async Entry Point
+# --------------------------------
+# The pipeline is blocking I/O (Gemini, DuckDuckGo, DiskCache), so async callers
+# run it on a dedicated pool sized to the number of answers we compute at once.
+pipeline_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_MAX_CONCURRENCY,
+    thread_name_prefix="medical-pipeline",
+)
+
+
+async def aget_medical_answer(query: str, history=None, single_pass: bool = SINGLE_PASS_MULTILINGUAL,
+                              history_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """Async wrapper around get_medical_answer for event-loop based services."""
+    loop = asyncio.get_running_loop()
+    # Copy the caller's context so progress listeners installed around the await still apply
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        pipeline_executor, lambda: ctx.run(get_medical_answer, query, history, single_pass, history_budget)
+    )
@@ -5,37 +5,70 @@ Routing logic: decides whether a user query should trigger
 a search-based summarisation or direct LLM response.
 """
 
+import logging
 import re
-from langchain_core.runnables import RunnableLambda, RunnableBranch
+from core.config import ROUTER_CLASSIFIER_ENABLED, ROUTER_THRESHOLD
+from core.lazy import lazy_singleton
+from core.metrics import count
 from services.summariser import summarise_medical_sources
 from services.search_engine import medical_search
 from utils.formatting import format_sources
 
+logger = logging.getLogger(__name__)
+
+# Keyword fallback, used when the classifier is disabled or its weights can't be loaded
+_SEARCH_KEYWORDS_RE = re.compile(
+    r"\b("
+    r"treat|treatment|"
+    r"manage|management|"
+    r"control|controlled|"
+    r"symptom|symptoms|"
+    r"drug|drugs|medicine|medication|"
+    r"cause|causes|"
+    r"prevent|prevention|"
+    r"diagnosis|diagnose|"
+    r"test|tests|"
+    r"therapy|therapies|"
+    r"dose|dosing|"
+    r"prescribe|prescribed|prescribing"
+    r")\b"
+)
+
+
+def keyword_should_search(input_text: str) -> bool:
+    return bool(_SEARCH_KEYWORDS_RE.search(input_text.lower()))
+
+
+@lazy_singleton
+def get_route_classifier():
+    """Load the bundled routing classifier, or None to fall back to keywords."""
+    if not ROUTER_CLASSIFIER_ENABLED:
+        return None
+    from utils.route_classifier import load
+
+    try:
+        classifier = load()
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Routing classifier unavailable, using keyword routing: {e}")
+        return None
+    if ROUTER_THRESHOLD is not None:
+        classifier.threshold = ROUTER_THRESHOLD
+    return classifier
+
 
 def should_search(input_text: str) -> bool:
     """Determine if the question requires external medical search."""
-    expanded_pattern = (
-        r"\b("
-        r"treat|treatment|"
-        r"manage|management|"
-        r"control|controlled|"
-        r"symptom|symptoms|"
-        r"drug|drugs|medicine|medication|"
-        r"cause|causes|"
-        r"prevent|prevention|"
-        r"diagnosis|diagnose|"
-        r"test|tests|"
-        r"therapy|therapies|"
-        r"dose|dosing|"
-        r"prescribe|prescribed|prescribing"
-        r")\b"
-    )
-    return bool(re.search(expanded_pattern, input_text.lower()))
+    classifier = get_route_classifier()
+    if classifier is None:
+        return keyword_should_search(input_text)
+    return classifier.needs_search(input_text)
 
 
 def route(input_text: str) -> str:
     """Return 'search' or 'no_search' depending on query type."""
-    return "search" if should_search(input_text) else "no_search"
+    decision = "search" if should_search(input_text) else "no_search"
+    count("route_decisions_total", route=decision)
+    return decision
 
 
 def enrich_with_question_and_history(prev, original):
@@ -52,7 +85,9 @@ def summarise_with_sources(data):
     #    "sources": data["sources"],
     #    "question": data["question"]
     # })
-    summary = summarise_medical_sources(data["sources"], data["question"])
+    summary = summarise_medical_sources(
+        data["sources"], data["question"], data["original"].get("answer_language")
+    )
     return {
         "summary": summary,
         "sources": data["sources"],
@@ -60,32 +95,65 @@ def summarise_with_sources(data):
     }
 
 
-def enrich_final_summary(data):
-    original = data["original"]
-    return {
-        "input": f"""**Question:** {original['input']}  
+def summary_header(question: str, answer_language=None) -> str:
+    if answer_language:
+        # The summary is written in answer_language: no fixed English label before it
+        return f"""**Question:** {question}  
+
+"""
+    return f"""**Question:** {question}  
 
 **Verified medical information (summarised from sources):**  
-{data['summary']}  
+"""
+
+
+def summary_footer(sources: dict, answer_language=None) -> str:
+    if answer_language:
+        return f"""  
+
+---
+
+📚  
+{format_sources(sources)}""" if sources else ""
+    return f"""  
 
 ---
 
 📚 **Sources referenced:**  
-{format_sources(data['sources'])}""",
+{format_sources(sources)}"""
+
+
+def enrich_final_summary(data):
+    original = data["original"]
+    answer_language = original.get("answer_language")
+    # A localised answer repeats the question as the user asked it, not its English translation
+    question = original.get("query", original["input"]) if answer_language else original["input"]
+    return {
+        "input": (
+            summary_header(question, answer_language)
+            + data["summary"]
+            + summary_footer(data["sources"], answer_language)
+        ),
         "history": original.get("history", []),
+        "summarised": True,
     }
 
 
-search_branch = (
-    RunnableLambda(lambda x: {"original": x, "results": medical_search(x["input"])} )
-    | RunnableLambda(lambda d: enrich_with_question_and_history(d["results"], d["original"]))
-    | RunnableLambda(lambda d: summarise_with_sources(d))
-    | RunnableLambda(lambda d: enrich_final_summary(d))
-)
+@lazy_singleton
+def get_router_chain():
+    """Build the search / no-search RunnableBranch on first use."""
+    from langchain_core.runnables import RunnableLambda, RunnableBranch
 
-no_search_branch = RunnableLambda(lambda x: {"input": x["input"], "history": x.get("history", [])})
+    search_branch = (
+        RunnableLambda(lambda x: {"original": x, "results": medical_search(x["input"])} )
+        | RunnableLambda(lambda d: enrich_with_question_and_history(d["results"], d["original"]))
+        | RunnableLambda(lambda d: summarise_with_sources(d))
+        | RunnableLambda(lambda d: enrich_final_summary(d))
+    )
 
-router_chain = RunnableBranch(
-    (lambda x: route(x["input"]) == "search", search_branch),
-    no_search_branch
-)
+    no_search_branch = RunnableLambda(lambda x: {"input": x["input"], "history": x.get("history", [])})
+
+    return RunnableBranch(
+        (lambda x: route(x["input"]) == "search", search_branch),
+        no_search_branch
+    )
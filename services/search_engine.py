@@ -4,16 +4,41 @@ services/search_engine.py
 Performs cached searches on verified medical websites using DuckDuckGo.
 """
 
-import streamlit as st
+import time
+import threading
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from langchain.tools import StructuredTool
-from langchain_community.tools import DuckDuckGoSearchRun
-from core.cache_manager import cache, cache_result, get_cached_result, normalize_query_key
+from core.cache_manager import cache, failure_cache, index_query_key, normalize_query_key, query_index
+from core.circuit_breaker import CircuitOpenError, get_breaker
+from core.lazy import lazy_singleton
+from core.metrics import count, record, timed
+from core.progress import report
+from core.single_flight import single_flight_iter
+from core.snippet_corpus import get_snippet_corpus
+from core.config import (
+    SIMILARITY_ENABLED,
+    SOURCE_FRESH_TTL,
+    SOURCE_STALE_TTL,
+    NEGATIVE_CACHE_TTL,
+    SEARCH_PARALLEL,
+    SEARCH_MAX_WORKERS,
+    SEARCH_SOURCE_TIMEOUT,
+    SEARCH_DEADLINE,
+    SEARCH_HEDGE_AFTER,
+)
 
 # --------------------------------
 # Configuration
 # --------------------------------
-search_engine = DuckDuckGoSearchRun()
+@lazy_singleton
+def get_search_engine():
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    return DuckDuckGoSearchRun()
+
+
 MAX_SNIPPET_LEN = 500  # can raise to 800 if truncation cuts too early
 
 SAFE_SOURCES = [
@@ -24,6 +49,17 @@ SAFE_SOURCES = [
     "clevelandclinic.org",
 ]
 
+# Every fan-out shares one bounded pool. A source's clock starts when its call starts
+# running, so waiting in the queue of a busy pool is never held against the source.
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="medical-search")
+
+# Background stale-while-revalidate refreshes run outside the request path
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="medical-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
 
 # --------------------------------
 # Helper
@@ -35,49 +71,392 @@ def truncate_snippet(snippet: str) -> str:
         snippet = snippet[:MAX_SNIPPET_LEN].rsplit(" ", 1)[0] + "..."
     return snippet
 
+
+def search_source(src: str, query: str) -> str:
+    """Run a single site-restricted DuckDuckGo query."""
+    return get_search_engine().run(f"site:{src} {query}")
+
+
+def guarded_search(src: str, query: str, record: bool = True) -> str:
+    """
+    Run search_source if the source's circuit breaker lets it through, feeding it the
+    outcome and latency. With `record=False` the caller reports the outcome instead
+    (fan_out_search reports once per source, however many attempts it made).
+    """
+    breaker = get_breaker(src)
+    if not breaker.allow():  # taken here, so a planned call that never runs holds no probe
+        raise CircuitOpenError(f"{src} is temporarily unavailable")
+    if not record:
+        return search_source(src, query)
+    start = time.monotonic()
+    try:
+        res = search_source(src, query)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success(time.monotonic() - start)
+    return res
+
+
+FAILURE_PREFIX = "Search failed ("
+
+
+def failure_message(error) -> str:
+    return f"{FAILURE_PREFIX}{error})"
+
+
+def is_failure_message(snippet) -> bool:
+    return isinstance(snippet, str) and snippet.startswith(FAILURE_PREFIX)
+
+
+# --------------------------------
+# Fan-out
+# --------------------------------
+def sequential_search(query: str, sources=None):
+    """Query each source in turn, yielding (source, result, error)."""
+    for src in sources or SAFE_SOURCES:
+        start = time.monotonic()
+        try:
+            res = guarded_search(src, query)
+        except Exception as e:
+            record("search_source", time.monotonic() - start, type(e).__name__, source=src)
+            yield src, None, e
+        else:
+            record("search_source", time.monotonic() - start, source=src)
+            yield src, res, None
+
+
+class SearchTimeout(TimeoutError):
+    """
+    A source that gave no answer in time. `charge` is False when it wasn't the source's
+    fault (the fan-out deadline cut it short before its own timeout), so neither its
+    breaker nor the negative cache should hold it against the source.
+    """
+
+    def __init__(self, message: str, charge: bool = True):
+        super().__init__(message)
+        self.charge = charge
+
+
+def record_outcome(src: str, error, latency: float) -> None:
+    """Feed the outcome of one logical call to `src` to its breaker."""
+    if error is None:
+        get_breaker(src).record_success(latency)
+    elif isinstance(error, CircuitOpenError):
+        return  # never ran
+    elif isinstance(error, SearchTimeout) and not error.charge:
+        return  # cut short by the fan-out deadline: not the source's fault
+    else:
+        get_breaker(src).record_failure()
+
+
+def fan_out_search(query: str, sources=None):
+    """
+    Query all sources concurrently, yielding (source, result, error) as each one finishes.
+
+    Each source gets SEARCH_SOURCE_TIMEOUT seconds from the moment its first attempt
+    starts running, and the whole fan-out SEARCH_DEADLINE; a source still running after
+    SEARCH_HEDGE_AFTER seconds is re-issued once and the first attempt to finish wins.
+    Sources that run out of time are reported with a SearchTimeout as soon as they do,
+    so callers get whatever finished in time. Each source's breaker hears one outcome
+    per fan-out: attempts that lose the race or finish after it gave up are ignored.
+    """
+    sources = list(sources or SAFE_SOURCES)
+    start = time.monotonic()
+    deadline = start + SEARCH_DEADLINE
+    started = {}  # source -> when its first attempt began running
+
+    def attempt(src: str) -> str:
+        started.setdefault(src, time.monotonic())
+        return guarded_search(src, query, record=False)
+
+    pending = {search_executor.submit(attempt, src): src for src in sources}
+    hedged = set()
+
+    def source_cutoff(src: str) -> float:
+        return min(started[src] + SEARCH_SOURCE_TIMEOUT, deadline) if src in started else deadline
+
+    try:
+        while pending:
+            now = time.monotonic()
+            running = set(pending.values())
+
+            for src in sorted(running):
+                cutoff = source_cutoff(src)
+                if now < cutoff:
+                    continue
+                for future in [f for f, s in pending.items() if s == src]:
+                    future.cancel()
+                    del pending[future]
+                own_fault = src in started and started[src] + SEARCH_SOURCE_TIMEOUT <= deadline
+                error = SearchTimeout(f"no response within {cutoff - start:.1f}s", charge=own_fault)
+                record_outcome(src, error, now - started.get(src, now))
+                record("search_source", now - start, "TimeoutError", source=src)
+                yield src, None, error
+            running = set(pending.values())
+
+            if SEARCH_HEDGE_AFTER > 0:
+                for src in running - hedged:
+                    if src in started and now - started[src] >= SEARCH_HEDGE_AFTER:
+                        pending[search_executor.submit(attempt, src)] = src
+                        hedged.add(src)
+            if not pending:
+                break
+
+            wakes = [source_cutoff(src) for src in running]
+            wakes += [started[src] + SEARCH_HEDGE_AFTER for src in running - hedged
+                      if src in started and SEARCH_HEDGE_AFTER > 0]
+            # Not-yet-started sources get their clock soon; re-check shortly rather than sleep to the deadline
+            if any(src not in started for src in running):
+                wakes.append(now + 0.05)
+            done, _ = wait(pending, timeout=max(min(wakes) - now, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                src = pending.pop(future)
+                error = future.exception()
+                if error is not None and src in pending.values():
+                    continue  # a hedged attempt is still running, give it the chance to succeed
+                for twin in [f for f, s in pending.items() if s == src]:
+                    twin.cancel()
+                    del pending[twin]
+                finished = time.monotonic()
+                record_outcome(src, error, finished - started.get(src, finished))
+                # Timed from the fan-out start, i.e. what the caller actually waited for
+                record("search_source", finished - start, error and type(error).__name__, source=src)
+                yield src, (None if error else future.result()), error
+    finally:
+        # Also reached when the consumer stops early (e.g. cancelled speculation);
+        # attempts already running finish on the pool and are ignored
+        for future in pending:
+            future.cancel()
+
+
+# --------------------------------
+# Per-source Cache
+# --------------------------------
+def source_cache_key(src: str, query_key: str) -> str:
+    return f"{src}::{query_key}"
+
+
+def failure_cache_key(src: str, query_key: str) -> str:
+    # Kept apart from successes so a failure never shadows a stale-but-good snippet
+    return f"failed::{src}::{query_key}"
+
+
+def cache_source_result(src: str, query_key: str, snippet: str) -> dict:
+    """Cache one source's snippet; it is served fresh for SOURCE_FRESH_TTL, then stale."""
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "fetched_at": time.time(),
+        "results": snippet,
+    }
+    cache.set(source_cache_key(src, query_key), entry, expire=SOURCE_STALE_TTL)
+    return entry
+
+
+def cache_source_failure(src: str, query_key: str, error) -> None:
+    """Remember a failed lookup briefly so we don't hammer a failing source."""
+    failure_cache.set(failure_cache_key(src, query_key), str(error), expire=NEGATIVE_CACHE_TTL)
+
+
+# --------------------------------
+# Local Snippet Corpus
+# --------------------------------
+def add_to_corpus(src: str, query: str, snippet: str, fetched_at: float) -> None:
+    corpus = get_snippet_corpus()
+    if corpus is None or not snippet:
+        return
+    try:
+        corpus.add(src, query, snippet, fetched_at)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not add {src} snippet to the corpus: {e}")
+
+
+def find_local_sources(query: str, sources) -> dict:
+    """{source: snippets} from the local corpus when it covers the question well enough, else {}."""
+    corpus = get_snippet_corpus()
+    if corpus is None:
+        return {}
+    try:
+        with timed("corpus_lookup"):
+            found = corpus.lookup(query, sources)
+    except sqlite3.Error as e:
+        logger.warning(f"Snippet corpus lookup failed: {e}")
+        return {}
+    count("corpus_lookups_total", result="hit" if found else "miss")
+    return found
+
+
+def get_source_entries(query_key: str, sources=None) -> dict:
+    """Return {source: cache entry} for every source cached under query_key."""
+    entries = {}
+    for src in sources or SAFE_SOURCES:
+        entry = cache.get(source_cache_key(src, query_key))
+        if entry is not None:
+            entries[src] = entry
+    return entries
+
+
+def find_cached_sources(query_key: str):
+    """Return (matched_key, entries), falling back to the closest cached paraphrase."""
+    entries = get_source_entries(query_key)
+    if entries or not SIMILARITY_ENABLED:
+        return query_key, entries
+    for score, candidate in query_index.similar(query_key):
+        entries = get_source_entries(candidate)
+        if entries:
+            logger.info(f"≈ '{query_key}' matched cached '{candidate}' (similarity {score:.2f}).")
+            return candidate, entries
+    return query_key, {}
+
+
+def fetch_sources(query: str, query_key: str, sources):
+    """Live-search the given sources, caching each outcome; yields (source, snippet, error)."""
+    search = fan_out_search if SEARCH_PARALLEL else sequential_search
+    for src, res, error in search(query, sources):
+        if error is not None:
+            if isinstance(error, SearchTimeout) and not error.charge:
+                yield src, None, error  # cut short by the fan-out deadline: not the source's fault
+                continue
+            if isinstance(error, CircuitOpenError):
+                yield src, None, error  # the breaker already keeps it out; nothing to cache
+                continue
+            cache_source_failure(src, query_key, error)
+            yield src, None, error
+            continue
+        snippet = truncate_snippet(res) if res else ""
+        entry = cache_source_result(src, query_key, snippet)
+        add_to_corpus(src, query, snippet, entry["fetched_at"])
+        yield src, snippet, None
+    index_query_key(query_key)
+
+
+def _refresh_in_background(query: str, query_key: str, sources) -> None:
+    """Revalidate stale sources once per (query, source) without blocking the caller."""
+    with _refreshing_lock:
+        todo = [
+            src for src in sources
+            if (src, query_key) not in _refreshing and get_breaker(src).available()
+        ]
+        _refreshing.update((src, query_key) for src in todo)
+    if not todo:
+        return
+
+    def refresh():
+        try:
+            for src, _, error in fetch_sources(query, query_key, todo):
+                if error is not None:
+                    logger.warning(f"Background refresh of {src} failed: {error}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.difference_update((src, query_key) for src in todo)
+
+    refresh_executor.submit(refresh)
+
+
 # --------------------------------
 # Core Search
 # --------------------------------
-def medical_search(query: str):
-    """Cached, source-restricted search for evidence-based medical information."""
+def iter_medical_search(query: str):
+    """
+    Yield (source, snippet) pairs as they become available: cached sources first,
+    then live results in completion order. Failed sources yield their error message.
+    """
+    with timed("medical_search"):
+        yield from _iter_medical_search(query)
+
+
+def _iter_medical_search(query: str):
     query_key = normalize_query_key(query)
 
-    # Check cache first
-    cached = get_cached_result(cache, query_key)
-    if cached:
-        return cached
+    # Check per-source cache first; stale entries are served now and refreshed later
+    matched_key, entries = find_cached_sources(query_key)
+    if entries:
+        report("info", f"🔁 Using cached results for '{matched_key}' ({len(entries)}/{len(SAFE_SOURCES)} sources).")
 
-    # Indicate live search
-    st.caption(f"🌐 Searching verified sources for: **{query}**")
+    now = time.time()
+    stale = []
+    for src, entry in entries.items():
+        if entry["results"]:
+            yield src, entry["results"]
+        if now - entry["fetched_at"] > SOURCE_FRESH_TTL:
+            stale.append(src)
+    if stale:
+        refresh_query = query if matched_key == query_key else matched_key
+        _refresh_in_background(refresh_query, matched_key, stale)
 
-    results = {}
+    missing = []
     for src in SAFE_SOURCES:
-        try:
-            st.caption(f"🔎 Searching {src} ...")
-            res = search_engine.run(f"site:{src} {query}")
-            if res:
-                results[src] = truncate_snippet(res)
-                st.success(f"✅ Results found from {src}")
-            else:
-                st.warning(f"⚠️ No content returned from {src}")
-        except Exception as e:
-            results[src] = f"Search failed ({e})"
-            st.error(f"❌ Error searching {src}: {e}")
+        if src in entries:
+            continue
+        recent_error = failure_cache.get(failure_cache_key(src, query_key))
+        if recent_error is not None:
+            yield src, failure_message(recent_error)
+        elif not get_breaker(src).available():
+            report("info", f"⏸️ Skipping {src} (temporarily unavailable)")
+        else:
+            missing.append(src)
+
+    if missing:
+        # Concurrent identical searches (any session or worker process) share one fan-out
+        yield from single_flight_iter("search", query_key, lambda: _search_missing(query, query_key, missing))
+
+
+def _search_missing(query: str, query_key: str, missing):
+    """Fill the uncached sources from the local corpus or a live search, yielding (source, snippet)."""
+    # Another process may have searched these while we waited
+    entries = get_source_entries(query_key, missing)
+    for src, entry in entries.items():
+        if entry["results"]:
+            yield src, entry["results"]
+    missing = [src for src in missing if src not in entries]
+    if not missing:
+        return
 
-    # Save to cache
-    cache_result(cache, query_key, results)
+    local = find_local_sources(query, missing)
+    if local:
+        report("info", f"📚 Using stored passages from {len(local)} sources for: **{query}**")
+        yield from local.items()
+        return
+
+    # Indicate live search
+    report("info", f"🌐 Searching verified sources for: **{query}**")
+
+    for src, snippet, error in fetch_sources(query, query_key, missing):
+        if isinstance(error, CircuitOpenError):
+            report("info", f"⏸️ Skipping {src} (temporarily unavailable)")
+        elif error is not None:
+            report("error", f"❌ Error searching {src}: {error}")
+            yield src, failure_message(error)
+        elif snippet:
+            report("success", f"✅ Results found from {src}")
+            yield src, snippet
+        else:
+            report("warning", f"⚠️ No content returned from {src}")
+
+
+def medical_search(query: str):
+    """Cached, source-restricted search for evidence-based medical information."""
+    results = dict(iter_medical_search(query))
+
+    # Keep the configured source order regardless of completion order
+    results = {src: results[src] for src in SAFE_SOURCES if src in results}
 
     if not results:
-        st.warning(f"⚠️ No results found for '{query}'")
+        report("warning", f"⚠️ No results found for '{query}'")
 
     return results
-    
+
 
 # --------------------------------
 # Tool registration
 # --------------------------------
-medical_search_tool = StructuredTool.from_function(
-    func=medical_search,
-    name="MedicalSearch",
-    description="Searches reliable medical websites for evidence-based information."
-)
+@lazy_singleton
+def get_medical_search_tool():
+    from langchain.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=medical_search,
+        name="MedicalSearch",
+        description="Searches reliable medical websites for evidence-based information."
+    )
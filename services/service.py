@@ -0,0 +1,120 @@
+"""
+services/service.py
+
+Headless async service: serves many queries concurrently from one process,
+without Streamlit or its rerun model. Speaks newline-delimited JSON over TCP:
+
+    -> {"id": 1, "query": "...", "history": [{"role": "user", "content": "..."}], "single_pass": false}
+    <- {"id": 1, "answer": "...", "events": [{"level": "...", "message": "..."}], "elapsed": 1.23,
+        "trace": {"id": "...", "duration": 1.23, "spans": [{"stage": "translate", "start": 0.0, "duration": 0.2, ...}]}}
+
+Aggregated metrics are served on the same connection:
+
+    -> {"id": 2, "metrics": "json"}          (or "prometheus" for the text exposition format)
+    <- {"id": 2, "metrics": {...}}
+
+Run with:
+    GOOGLE_API_KEY=... python -m services.service --host 127.0.0.1 --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from langchain.schema import AIMessage, HumanMessage
+
+from core.config import SERVICE_HOST, SERVICE_PORT, SINGLE_PASS_MULTILINGUAL, configure_gemini
+from core.metrics import snapshot, to_prometheus, trace_request
+from core.progress import progress_listener
+from services.medical_agent import aget_medical_answer
+
+logger = logging.getLogger(__name__)
+
+
+def to_messages(history) -> list:
+    """Convert [{"role": ..., "content": ...}] into LangChain chat messages."""
+    if not isinstance(history or [], list):
+        raise ValueError("history must be a list")
+    messages = []
+    for item in history or []:
+        if not isinstance(item, dict):
+            raise ValueError("history items must be objects")
+        cls = HumanMessage if item.get("role") in ("user", "human") else AIMessage
+        messages.append(cls(content=item.get("content", "")))
+    return messages
+
+
+async def answer(query: str, history=None, single_pass: bool = SINGLE_PASS_MULTILINGUAL) -> dict:
+    """Answer one query, collecting its progress events instead of rendering them."""
+    events = []
+
+    def collect(level, message, data):
+        events.append({"level": level, "message": message})
+
+    start = time.perf_counter()
+    with progress_listener(collect), trace_request("answer") as trace:
+        text = await aget_medical_answer(query, to_messages(history), single_pass)
+    return {
+        "answer": text,
+        "events": events,
+        "elapsed": round(time.perf_counter() - start, 3),
+        "trace": trace.to_dict(),
+    }
+
+
+def metrics_response(fmt: str) -> dict:
+    return {"metrics": to_prometheus() if fmt == "prometheus" else snapshot()}
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Serve newline-delimited JSON requests until the client disconnects."""
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                if "metrics" in request:
+                    response = metrics_response(request["metrics"])
+                else:
+                    if not isinstance(request["query"], str):
+                        raise ValueError("query must be a string")
+                    response = await answer(
+                        request["query"],
+                        request.get("history"),
+                        request.get("single_pass", SINGLE_PASS_MULTILINGUAL),
+                    )
+            except (ValueError, KeyError) as e:
+                request, response = {}, {"error": f"Bad request: {e}"}
+            if "id" in request:
+                response["id"] = request["id"]
+            writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> None:
+    server = await asyncio.start_server(handle_connection, host, port)
+    logger.info(f"Medical answer service listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless What's up Doc? answer service.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        configure_gemini(api_key)
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
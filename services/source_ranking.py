@@ -0,0 +1,130 @@
+"""
+services/source_ranking.py
+
+Local relevance ranking of search snippets before summarisation.
+
+Snippets are split into sentence-sized passages and scored against the question
+with BM25. Near-duplicate passages (common when several sites syndicate the same
+text) are dropped, and the best passages are packed into SOURCE_TOKEN_BUDGET.
+Failed sources never reach the prompt.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+
+from core.config import SOURCE_TOKEN_BUDGET, SOURCE_DUPLICATE_THRESHOLD
+from core.rate_limiter import estimate_tokens
+from core.similarity_index import content_words, jaccard
+from services.search_engine import is_failure_message
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+PASSAGE_MIN_WORDS = 20           # short sentences are merged with the next one
+SHINGLE_SIZE = 3
+NO_SOURCES_TEXT = "(No source text was retrieved for this question.)"
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\s*\.\.\.\s*")
+
+
+# --------------------------------
+# Passages
+# --------------------------------
+def split_passages(snippet: str) -> List[str]:
+    """Split a snippet into passages of at least PASSAGE_MIN_WORDS words (the last may be shorter)."""
+    passages, current = [], []
+    for sentence in _SENTENCE_RE.split(snippet):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        current.append(sentence)
+        if sum(len(s.split()) for s in current) >= PASSAGE_MIN_WORDS:
+            passages.append(" ".join(current))
+            current = []
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def _shingles(words: List[str]) -> frozenset:
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def bm25_scores(query_terms: List[str], docs: List[List[str]]) -> List[float]:
+    """Okapi BM25 score of each tokenised doc, with IDF taken over `docs` themselves."""
+    if not docs:
+        return []
+    avgdl = sum(len(d) for d in docs) / len(docs) or 1.0
+    df = Counter(term for d in docs for term in set(d))
+    idf = {
+        term: math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+        for term in set(query_terms)
+    }
+    scores = []
+    for doc in docs:
+        tf = Counter(doc)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avgdl)
+        scores.append(sum(
+            idf[term] * tf[term] * (BM25_K1 + 1) / (tf[term] + norm)
+            for term in idf if tf[term]
+        ))
+    return scores
+
+
+# --------------------------------
+# Ranking and Packing
+# --------------------------------
+def rank_passages(sources: dict, question: str) -> List[Tuple[float, int, str, str]]:
+    """
+    Return (score, position, source, passage) for every passage of the usable sources,
+    best first. Passages that share no term with the question are left out unless
+    nothing matches at all, in which case everything is kept in source order.
+    """
+    passages = []
+    for src, snippet in sources.items():
+        if not snippet or is_failure_message(snippet):
+            continue
+        for passage in split_passages(str(snippet)):
+            passages.append((len(passages), src, passage))
+
+    words = [content_words(passage) for _, _, passage in passages]
+    scores = bm25_scores(content_words(question), words)
+    ranked = [(score, pos, src, passage) for score, (pos, src, passage) in zip(scores, passages)]
+    if any(score > 0 for score in scores):
+        ranked = [item for item in ranked if item[0] > 0]
+    return sorted(ranked, key=lambda item: (-item[0], item[1]))
+
+
+def pack_sources(sources: dict, question: str, budget: int = SOURCE_TOKEN_BUDGET) -> dict:
+    """
+    Keep the most relevant, non-duplicate passages that fit in `budget` estimated tokens.
+
+    Returns {source: passages joined in their original order}, in the original source
+    order. The best passage is always kept, even if it alone exceeds the budget.
+    """
+    kept, kept_shingles, used = [], [], 0
+    for score, pos, src, passage in rank_passages(sources, question):
+        shingles = _shingles(content_words(passage))
+        if any(jaccard(shingles, other) >= SOURCE_DUPLICATE_THRESHOLD for other in kept_shingles):
+            continue
+        tokens = estimate_tokens(passage)
+        if kept and used + tokens > budget:
+            continue  # a shorter, lower-ranked passage may still fit
+        kept.append((pos, src, passage))
+        kept_shingles.append(shingles)
+        used += tokens
+
+    packed = {}
+    for _, src, passage in sorted(kept):
+        packed[src] = f"{packed[src]} … {passage}" if src in packed else passage
+    return {src: packed[src] for src in sources if src in packed}
+
+
+def render_sources(sources: dict) -> str:
+    """Prompt text for packed sources: one `[source] passages` line each."""
+    if not sources:
+        return NO_SOURCES_TEXT
+    return "\n".join(f"[{src}] {text}" for src, text in sources.items())
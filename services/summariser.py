@@ -5,16 +5,22 @@ Summarises multi-source medical search results into clear, concise Markdown,
 with built-in cleanup for disclaimers and formatting.
 """
 
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from utils.formatting import clean_response_text
+from core.cache_manager import summary_cache, cache_result, get_cached_result, hashed_key, normalize_query_key
+from core.config import SIMILARITY_ENABLED, SOURCE_RANKING_ENABLED
+from core.lazy import lazy_singleton
+from core.metrics import count, timed, timed_iter
+from core.rate_limiter import estimate_tokens
+from core.single_flight import single_flight, single_flight_iter
+from services.search_engine import is_failure_message
+from services.source_ranking import pack_sources, render_sources
+from services.translator import ANSWER_LANGUAGE_INSTRUCTION
 
 
 # --------------------------------
 # Prompt Definition
 # --------------------------------
-summarise_prompt = ChatPromptTemplate.from_template("""
+SUMMARISE_TEMPLATE = """
 You are a **medical summarisation assistant**.
 
 Your goal is to produce a concise, evidence-based summary of verified medical search results.
@@ -36,33 +42,228 @@ Your goal is to produce a concise, evidence-based summary of verified medical se
 {question}
 
 Format your entire answer in Markdown.
-""")
+"""
+
+
+@lazy_singleton
+def get_summarise_prompt():
+    from langchain.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_template(SUMMARISE_TEMPLATE)
 
 
 # --------------------------------
-# Runnable Chain
+# Runnable Chains (built on first use)
 # --------------------------------
-summarise_runnable = (
-    summarise_prompt
-    | ChatGoogleGenerativeAI(model="models/gemini-2.0-flash", temperature=0.0)
-    | StrOutputParser()
-)
+@lazy_singleton
+def get_summarise_runnable():
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
+
+    return (
+        get_summarise_prompt()
+        | get_chat_model()
+        | StrOutputParser()
+    )
+
+
+@lazy_singleton
+def get_localised_summarise_runnable():
+    """Summarise English sources but answer in {answer_language} (single-pass multilingual mode)."""
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
+
+    return (
+        ChatPromptTemplate.from_template(SUMMARISE_TEMPLATE + ANSWER_LANGUAGE_INSTRUCTION)
+        | get_chat_model()
+        | StrOutputParser()
+    )
+
+
+@timed("rank_sources")
+def prepare_sources(sources, question: str):
+    """
+    Turn {source: snippet} into prompt text: failed sources are dropped and, with
+    SOURCE_RANKING_ENABLED, only the most relevant distinct passages within the
+    token budget are kept.
+    """
+    if not isinstance(sources, dict):
+        return sources
+    if not SOURCE_RANKING_ENABLED:
+        return {src: text for src, text in sources.items() if not is_failure_message(text)}
+
+    packed = pack_sources(sources, question)
+    count("summary_source_tokens_total", sum(estimate_tokens(str(t)) for t in sources.values()), kind="raw")
+    count("summary_source_tokens_total", sum(estimate_tokens(t) for t in packed.values()), kind="packed")
+    return render_sources(packed)
+
+
+def summary_request(sources, question: str, answer_language=None):
+    """Return (runnable, inputs) for an English summary, or one written in `answer_language`."""
+    inputs = {"sources": prepare_sources(sources, question), "question": question}
+    if not answer_language:
+        return get_summarise_runnable(), inputs
+    return get_localised_summarise_runnable(), {**inputs, "answer_language": answer_language}
+
+
+def summary_cache_key(question: str, answer_language=None) -> str:
+    key = normalize_query_key(question)
+    return f"{answer_language.lower()}::{key}" if answer_language else key
+
+
+def summary_flight_key(question: str, answer_language=None, sources=None) -> str:
+    # Callers holding different snippets for the same question don't share a summary
+    return f"{summary_cache_key(question, answer_language)}::{sources_fingerprint(sources)}"
+
+
+def sources_fingerprint(sources):
+    """
+    Content hash of the usable snippets in `sources`, or None when none of them
+    would reach the prompt (every source failed or returned nothing).
+    """
+    if not isinstance(sources, dict):
+        return hashed_key(sources) if sources and not is_failure_message(sources) else None
+    usable = sorted(
+        (src, str(text)) for src, text in sources.items()
+        if text and not is_failure_message(str(text))
+    )
+    if not usable:
+        return None
+    return hashed_key(*(part for pair in usable for part in pair))
+
+
+def get_cached_summary(question: str, answer_language=None, sources=None):
+    """
+    Cached summary for `question`, provided it was built from the same source
+    snippets as `sources`; a refreshed or recovered source invalidates it.
+    """
+    # Localised summaries are exact-match only, so a paraphrase never crosses languages
+    cached = get_cached_result(
+        summary_cache,
+        summary_cache_key(question, answer_language),
+        similar=SIMILARITY_ENABLED and not answer_language,
+    )
+    if not isinstance(cached, dict):
+        return None
+    if cached["sources"] != sources_fingerprint(sources):
+        count("summary_stale_total")
+        return None
+    return cached["summary"]
+
+
+def cache_summary(question: str, summary: str, answer_language=None, sources=None) -> bool:
+    """Cache `summary` against the snippets it was built from; not cached if there were none."""
+    fingerprint = sources_fingerprint(sources)
+    if fingerprint is None:
+        count("summary_uncached_total", reason="no_sources")
+        return False
+    cache_result(
+        summary_cache,
+        summary_cache_key(question, answer_language),
+        {"summary": summary, "sources": fingerprint},
+        index=not answer_language,
+    )
+    return True
 
 
 # --------------------------------
 # Helper Function
 # --------------------------------
-def summarise_medical_sources(sources: str, question: str) -> str:
+@timed("summarise")
+def summarise_medical_sources(sources: str, question: str, answer_language=None) -> str:
     """
     Generate a cleaned, evidence-based medical summary.
     Ensures consistent formatting and single disclaimer.
+    Summaries are cached per question (and answer language), including close paraphrases,
+    and reused only while the sources they were built from are unchanged.
     """
+    cached = get_cached_summary(question, answer_language, sources)
+    if cached:
+        return cached
+    return single_flight(
+        "summarise",
+        summary_flight_key(question, answer_language, sources),
+        lambda: _summarise(sources, question, answer_language),
+    )
+
+
+def _summarise(sources, question: str, answer_language=None) -> str:
+    cached = get_cached_summary(question, answer_language, sources)
+    if cached:  # written by another process while we waited
+        return cached
+
     try:
-        raw_summary = summarise_runnable.invoke({
-            "sources": sources,
-            "question": question
-        })
-        cleaned = clean_response_text(raw_summary)
+        runnable, inputs = summary_request(sources, question, answer_language)
+        cleaned = clean_response_text(runnable.invoke(inputs), disclaimer=not answer_language)
+        cache_summary(question, cleaned, answer_language, sources)
         return cleaned
     except Exception as e:
         return f"⚠️ Failed to summarise sources: {e}"
+
+
+def stream_medical_summary(sources, question: str, answer_language=None):
+    """
+    Streaming variant of summarise_medical_sources: yields raw summary chunks as
+    Gemini produces them and caches the cleaned summary once complete.
+    """
+    cached = get_cached_summary(question, answer_language, sources)
+    if cached:
+        yield cached
+        return
+    yield from single_flight_iter(
+        "summarise_stream",
+        summary_flight_key(question, answer_language, sources),
+        lambda: _stream_summary(sources, question, answer_language),
+    )
+
+
+def _stream_summary(sources, question: str, answer_language=None):
+    cached = get_cached_summary(question, answer_language, sources)
+    if cached:  # written by another process while we waited
+        yield cached
+        return
+
+    parts = []
+    try:
+        runnable, inputs = summary_request(sources, question, answer_language)
+        for chunk in timed_iter("summarise", runnable.stream(inputs), mode="stream"):
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        yield f"⚠️ Failed to summarise sources: {e}"
+        return
+    summary = clean_response_text("".join(parts), disclaimer=not answer_language)
+    cache_summary(question, summary, answer_language, sources)
+
+
+@timed("summarise", mode="batch")
+def summarise_many(items, max_concurrency: int) -> list:
+    """
+    summarise_medical_sources for many (sources, question[, answer_language]) items,
+    sending cache misses to Gemini in one .batch() per prompt.
+    """
+    items = [tuple(item) + (None,) * (3 - len(item)) for item in items]
+    results = [None] * len(items)
+    misses = {False: [], True: []}  # keyed on "localised"
+    for i, (sources, question, answer_language) in enumerate(items):
+        results[i] = get_cached_summary(question, answer_language, sources)
+        if not results[i]:
+            misses[bool(answer_language)].append(i)
+
+    for group in misses.values():
+        if not group:
+            continue
+        requests = [summary_request(*items[i]) for i in group]
+        replies = requests[0][0].batch(
+            [inputs for _, inputs in requests],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        for i, reply in zip(group, replies):
+            if isinstance(reply, Exception):
+                results[i] = f"⚠️ Failed to summarise sources: {reply}"
+                continue
+            results[i] = clean_response_text(reply, disclaimer=not items[i][2])
+            cache_summary(items[i][1], results[i], items[i][2], items[i][0])
+    return results
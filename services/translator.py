@@ -5,87 +5,357 @@ Handles automatic language detection, translation to/from English,
 and translation caching for multilingual support.
 """
 
+import contextvars
 import re
 import json
-import streamlit as st
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
+from concurrent.futures import ThreadPoolExecutor
 
-from core.cache_manager import translation_cache, back_translation_cache
-from core.config import CACHE_TTL
+from core.cache_manager import translation_cache, back_translation_cache, hashed_key
+from core.config import (
+    CACHE_TTL,
+    LANG_DETECT_THRESHOLD,
+    BACK_TRANSLATE_SECTIONS,
+    BACK_TRANSLATE_PARALLELISM,
+)
+from core.lazy import lazy_singleton
+from core.metrics import count, timed, timed_iter
+from core.progress import report
+from core.single_flight import single_flight, single_flight_iter
+from utils.formatting import split_markdown_sections
+from utils.language_detect import is_confidently_english
 
+# Sections of one answer are back-translated concurrently
+section_executor = ThreadPoolExecutor(
+    max_workers=BACK_TRANSLATE_PARALLELISM,
+    thread_name_prefix="back-translate",
+)
 
-def detect_and_translate(query: str) -> dict:
-    """Detect language and translate non-English input to English."""
-    query_key = query.strip().lower()
-    if query_key in translation_cache:
-        return translation_cache[query_key]
-
-    translator_prompt = ChatPromptTemplate.from_template("""
-    You are a translation assistant.
-    Detect the language of this text and, if it's not English, translate it into English.
-    Return strictly JSON with keys "language" and "translation".
-    Text: {text}
-    """)
-
-    translator_chain = (
-        translator_prompt
-        | ChatGoogleGenerativeAI(model="models/gemini-2.0-flash", temperature=0)
+
+# --------------------------------
+# Prompts & Chains (built once, on first use)
+# --------------------------------
+TRANSLATOR_TEMPLATE = """
+You are a translation assistant.
+Detect the language of this text and, if it's not English, translate it into English.
+Return strictly JSON with keys "language" and "translation".
+Text: {text}
+"""
+
+TRANSLATOR_BACK_TEMPLATE = """
+You are a translation assistant.
+Translate the following English text into the language specified below.
+Preserve meaning, tone, and Markdown formatting.
+
+Target language: {target_lang}
+Text to translate:
+{text}
+"""
+
+# Appended to the answer/summary prompts in single-pass multilingual mode
+ANSWER_LANGUAGE_INSTRUCTION = """
+**Answer language:**
+Reason over the English question and sources above, but write your entire answer
+(headings, bullet points and the disclaimer) in {answer_language}.
+Put the disclaimer on its own final line, starting with "⚠️".
+Keep source names, drug names and units exactly as they appear in the sources.
+"""
+
+
+def _build_translation_chain(template: str):
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import StrOutputParser
+    from core.llm import get_chat_model
+
+    return (
+        ChatPromptTemplate.from_template(template)
+        | get_chat_model()
         | StrOutputParser()
     )
 
+
+@lazy_singleton
+def get_translator_chain():
+    return _build_translation_chain(TRANSLATOR_TEMPLATE)
+
+
+@lazy_singleton
+def get_translator_back_chain():
+    return _build_translation_chain(TRANSLATOR_BACK_TEMPLATE)
+
+
+def translation_cache_key(query: str) -> str:
+    return hashed_key(query.strip().lower())
+
+
+def back_translation_cache_key(text: str, target_lang: str) -> str:
+    return hashed_key(target_lang.lower(), text.strip())
+
+
+def parse_translation(result: str, query: str) -> dict:
+    """Parse the translator's JSON reply, falling back to the untranslated query."""
     lang, translation = "unknown", query  # fallback
+    match = re.search(r"\{.*?\}", result.strip(), re.DOTALL)
+    if match:
+        raw_json = match.group(0)
+        clean_json = raw_json.replace("'", '"').replace("\n", " ").strip()
+        parsed = json.loads(clean_json)
+        lang = parsed.get("language", "unknown").strip()
+        translation = parsed.get("translation", query).strip()
+    return {"language": lang, "translation": translation}
+
+
+@timed("translate")
+def detect_and_translate(query: str) -> dict:
+    """Detect language and translate non-English input to English."""
+    # Fast path: confidently English text needs neither the cache nor the model
+    if is_confidently_english(query, LANG_DETECT_THRESHOLD):
+        return {"language": "English", "translation": query}
+
+    query_key = translation_cache_key(query)
+    cached = translation_cache.get(query_key)
+    if cached is not None:
+        return cached
+    # Concurrent identical questions share one model call
+    return single_flight("translate", query_key, lambda: _translate(query, query_key))
+
+
+def _translate(query: str, query_key: str) -> dict:
+    cached = translation_cache.get(query_key)
+    if cached is not None:  # written by another process while we waited
+        return cached
+
+    data = {"language": "unknown", "translation": query}  # fallback
     try:
-        result = translator_chain.invoke({"text": query}).strip()
-        match = re.search(r"\{.*?\}", result, re.DOTALL)
-        if match:
-            raw_json = match.group(0)
-            clean_json = raw_json.replace("'", '"').replace("\n", " ").strip()
-            parsed = json.loads(clean_json)
-            lang = parsed.get("language", "unknown").strip()
-            translation = parsed.get("translation", query).strip()
+        data = parse_translation(get_translator_chain().invoke({"text": query}), query)
     except Exception as e:
-        st.warning(f"⚠️ Translation step failed: {e}")
+        report("warning", f"⚠️ Translation step failed: {e}")
 
-    data = {"language": lang, "translation": translation}
-    translation_cache[query_key] = data
-    translation_cache.expire(query_key, CACHE_TTL)
+    translation_cache.set(query_key, data, expire=CACHE_TTL)
     return data
 
 
+@timed("back_translate")
 def translate_back_to_original_language(text: str, target_lang: str) -> str:
     """Translate English text back to user’s original language."""
     if target_lang.lower() == "en":
         return text
 
-    cache_key = f"{target_lang.lower()}::{text.strip()}"
-    if cache_key in back_translation_cache:
-        return back_translation_cache[cache_key]
-
-    translator_back_prompt = ChatPromptTemplate.from_template("""
-    You are a translation assistant.
-    Translate the following English text into the language specified below.
-    Preserve meaning, tone, and Markdown formatting.
-
-    Target language: {target_lang}
-    Text to translate:
-    {text}
-    """)
-    translator_back_chain = (
-        translator_back_prompt
-        | ChatGoogleGenerativeAI(model="models/gemini-2.0-flash", temperature=0)
-        | StrOutputParser()
-    )
+    cache_key = back_translation_cache_key(text, target_lang)
+    cached = back_translation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    return single_flight("back_translate", cache_key, lambda: _translate_back(text, target_lang, cache_key))
+
+
+def _translate_back(text: str, target_lang: str, cache_key: str) -> str:
+    cached = back_translation_cache.get(cache_key)
+    if cached is not None:  # written by another process while we waited
+        return cached
+    return back_translate_sections(text, target_lang)
+
+
+def back_translate_sections(text: str, target_lang: str) -> str:
+    """Translate `text` section by section (cached sections are reused) and cache the whole result."""
+    pieces, complete = [], True
+    for piece, ok in translated_sections(text, target_lang):
+        pieces.append(piece)
+        complete = complete and ok
+    translated = "".join(pieces).strip()
+    if complete:  # otherwise the failed sections are retried next time
+        back_translation_cache.set(back_translation_cache_key(text, target_lang), translated, expire=CACHE_TTL)
+    return translated
+
+
+# --------------------------------
+# Section-level Back-translation
+# --------------------------------
+def split_for_translation(text: str) -> list:
+    """(segment, translatable) pairs; the whole text is one segment unless BACK_TRANSLATE_SECTIONS."""
+    if not BACK_TRANSLATE_SECTIONS:
+        return [(text, bool(text.strip()))]
+    return split_markdown_sections(text)
+
+
+def _keep_padding(original: str, translated: str) -> str:
+    """Put the segment's surrounding whitespace (blank lines before a heading etc.) back."""
+    stripped = original.strip()
+    if not stripped:
+        return original
+    start = original.index(stripped)
+    return original[:start] + translated.strip() + original[start + len(stripped):]
+
+
+def _translate_segment(segment: str, target_lang: str) -> str:
+    translated = get_translator_back_chain().invoke({"target_lang": target_lang, "text": segment.strip()}).strip()
+    back_translation_cache.set(back_translation_cache_key(segment, target_lang), translated, expire=CACHE_TTL)
+    return translated
+
+
+def translated_sections(text: str, target_lang: str):
+    """
+    Yield (piece, ok) for each section of `text` in order; the pieces join into the
+    translation. Cached sections (headings, labels and the disclaimer recur in almost
+    every answer) cost a lookup; the rest are translated concurrently, so the wait is
+    roughly that of the longest section. A failed section comes back in English (ok=False).
+    """
+    segments = split_for_translation(text)
+    futures = {}  # cache key -> Future, so a repeated segment is translated once
+    translations = {}
+    for segment, translatable in segments:
+        if not translatable:
+            continue
+        key = back_translation_cache_key(segment, target_lang)
+        if key in translations or key in futures:
+            continue
+        cached = back_translation_cache.get(key)
+        if cached is not None:
+            translations[key] = cached
+            count("back_translation_segments_total", result="hit")
+        else:
+            context = contextvars.copy_context()
+            futures[key] = section_executor.submit(context.run, _translate_segment, segment, target_lang)
+            count("back_translation_segments_total", result="miss")
 
     try:
-        translated = translator_back_chain.invoke({
-            "target_lang": target_lang,
-            "text": text
-        }).strip()
-        back_translation_cache[cache_key] = translated
-        back_translation_cache.expire(cache_key, CACHE_TTL)
-        return translated
-    except Exception as e:
-        st.warning(f"⚠️ Back-translation failed: {e}")
-        return text
+        for i, (segment, translatable) in enumerate(segments):
+            sep = "\n" if i else ""
+            if not translatable:
+                yield sep + segment, True
+                continue
+            key = back_translation_cache_key(segment, target_lang)
+            if key not in translations:
+                try:
+                    translations[key] = futures[key].result()
+                except Exception as e:
+                    report("warning", f"⚠️ Back-translation of a section failed: {e}")
+                    translations[key] = None
+            translated = translations[key]
+            yield sep + (segment if translated is None else _keep_padding(segment, translated)), translated is not None
+    finally:
+        for future in futures.values():
+            future.cancel()  # the caller stopped reading
+
+
+# --------------------------------
+# Batched Variants
+# --------------------------------
+@timed("translate", mode="batch")
+def detect_and_translate_many(queries, max_concurrency: int) -> list:
+    """detect_and_translate for many queries, sending cache misses to Gemini in one .batch()."""
+    results = [None] * len(queries)
+    misses = []
+    for i, query in enumerate(queries):
+        if is_confidently_english(query, LANG_DETECT_THRESHOLD):
+            results[i] = {"language": "English", "translation": query}
+        else:
+            results[i] = translation_cache.get(translation_cache_key(query))
+            if results[i] is None:
+                misses.append(i)
+
+    replies = get_translator_chain().batch(
+        [{"text": queries[i]} for i in misses],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    for i, reply in zip(misses, replies):
+        data = {"language": "unknown", "translation": queries[i]}
+        try:
+            if isinstance(reply, Exception):
+                raise reply
+            data = parse_translation(reply, queries[i])
+        except Exception as e:
+            report("warning", f"⚠️ Translation step failed: {e}")
+        translation_cache.set(translation_cache_key(queries[i]), data, expire=CACHE_TTL)
+        results[i] = data
+    return results
+
+
+@timed("back_translate", mode="batch")
+def translate_back_many(items, max_concurrency: int) -> list:
+    """
+    translate_back_to_original_language for many (text, target_lang) pairs. The uncached
+    sections of all texts go to Gemini in one .batch(), each distinct section only once.
+    """
+    results = [None] * len(items)
+    misses = []
+    for i, (text, target_lang) in enumerate(items):
+        if target_lang.lower() == "en":
+            results[i] = text
+        else:
+            results[i] = back_translation_cache.get(back_translation_cache_key(text, target_lang))
+            if results[i] is None:
+                misses.append(i)
+
+    # Distinct uncached sections across every text that missed
+    sections = {i: split_for_translation(items[i][0]) for i in misses}
+    translations, todo = {}, {}
+    for i in misses:
+        target_lang = items[i][1]
+        for segment, translatable in sections[i]:
+            key = back_translation_cache_key(segment, target_lang)
+            if not translatable or key in translations or key in todo:
+                continue
+            cached = back_translation_cache.get(key)
+            if cached is not None:
+                translations[key] = cached
+            else:
+                todo[key] = (segment.strip(), target_lang)
+    count("back_translation_segments_total", len(translations), result="hit")
+    count("back_translation_segments_total", len(todo), result="miss")
+
+    replies = get_translator_back_chain().batch(
+        [{"target_lang": target_lang, "text": segment} for segment, target_lang in todo.values()],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    for key, reply in zip(todo, replies):
+        if isinstance(reply, Exception):
+            report("warning", f"⚠️ Back-translation failed: {reply}")
+            continue
+        translations[key] = reply.strip()
+        back_translation_cache.set(key, translations[key], expire=CACHE_TTL)
+
+    for i in misses:
+        text, target_lang = items[i]
+        pieces, complete = [], True
+        for segment, translatable in sections[i]:
+            translated = translations.get(back_translation_cache_key(segment, target_lang)) if translatable else None
+            if translatable and translated is None:
+                complete = False
+            pieces.append(segment if translated is None else _keep_padding(segment, translated))
+        results[i] = "\n".join(pieces).strip()
+        if complete:
+            back_translation_cache.set(back_translation_cache_key(text, target_lang), results[i], expire=CACHE_TTL)
+    return results
+
+
+def stream_back_translation(text: str, target_lang: str):
+    """Streaming variant of translate_back_to_original_language."""
+    if target_lang.lower() == "en":
+        yield text
+        return
+
+    cache_key = back_translation_cache_key(text, target_lang)
+    cached = back_translation_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    yield from single_flight_iter(
+        "back_translate_stream", cache_key, lambda: _stream_back_translation(text, target_lang, cache_key)
+    )
+
+
+def _stream_back_translation(text: str, target_lang: str, cache_key: str):
+    cached = back_translation_cache.get(cache_key)
+    if cached is not None:  # written by another process while we waited
+        yield cached
+        return
+
+    # Sections are yielded in order as soon as each one (and all before it) is ready
+    pieces, complete = [], True
+    for piece, ok in timed_iter("back_translate", translated_sections(text, target_lang), mode="stream"):
+        pieces.append(piece)
+        complete = complete and ok
+        yield piece
+    if complete:
+        back_translation_cache.set(cache_key, "".join(pieces).strip(), expire=CACHE_TTL)
@@ -0,0 +1,303 @@
+"""
+services/warmer.py
+
+Offline cache warmer: precomputes answers to the most frequent questions so
+peak-hour traffic is served from cache.
+
+Queries come from a file and/or are mined from the existing caches and the app
+logs (most frequent first). For each one the warmer fills the per-source search
+cache, the summary (the cached final answer for search-routed questions) and
+its translations into WARM_LANGUAGES. Entries that are still valid for longer
+than WARM_AHEAD are left alone, so a run only spends tokens on what is missing
+or about to expire. Model calls wait for headroom under WARM_RATE_SHARE of the
+shared token budget, leaving the rest to live users.
+
+Questions routed to a direct answer only get their translation warmed: direct
+answers depend on the conversation and are not cached.
+
+Run once (e.g. from cron) or on its own schedule:
+    GOOGLE_API_KEY=... python -m services.warmer popular.txt --from-cache --log app.log
+    GOOGLE_API_KEY=... python -m services.warmer --from-cache --every 21600
+"""
+
+import argparse
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from core.cache_manager import cache, summary_cache, back_translation_cache, normalize_query_key
+from core.circuit_breaker import get_breaker
+from core.config import (
+    SINGLE_PASS_MULTILINGUAL,
+    SOURCE_FRESH_TTL,
+    WARM_LANGUAGES,
+    WARM_TOP_QUERIES,
+    WARM_CONCURRENCY,
+    WARM_AHEAD,
+    WARM_INTERVAL,
+    WARM_RATE_SHARE,
+    configure_gemini,
+)
+from core.metrics import count, timed, to_json
+from core.rate_limiter import EXPECTED_OUTPUT_TOKENS, estimate_tokens, wait_for_headroom
+from core.single_flight import single_flight
+from services.batch import read_queries
+from services.medical_agent import compose_answer, is_english_language
+from services.router import route
+from services.search_engine import SAFE_SOURCES, fetch_sources, get_source_entries, medical_search
+from services.summariser import cache_summary, get_cached_summary, sources_fingerprint, summary_cache_key, summary_flight_key, summary_request
+from services.translator import back_translate_sections, back_translation_cache_key, detect_and_translate
+from utils.formatting import clean_response_text
+
+logger = logging.getLogger(__name__)
+
+# Log lines that carry a user question (or its normalized cache key)
+_LOG_QUERY_RES = [
+    re.compile(r"Processing query: (.+)$"),
+    re.compile(r"Searching verified sources for: \*\*(.+?)\*\*"),
+    re.compile(r"Using cached results for '(.+?)'"),
+    re.compile(r"Cached new result for key '(.+?)'"),
+]
+
+
+# --------------------------------
+# Query Mining
+# --------------------------------
+def _strip_language(key: str) -> str:
+    # Localised summaries are keyed "<language>::<question>"
+    return key.rsplit("::", 1)[-1]
+
+
+def mine_cache_keys() -> Counter:
+    """Questions behind the cached summaries and search results (one vote per cache entry)."""
+    found = Counter()
+    for key in summary_cache.disk.iterkeys():
+        found[_strip_language(key)] += 1
+    for key in cache.disk.iterkeys():
+        if key.startswith("failed::"):
+            continue
+        src, _, query_key = key.partition("::")
+        if src in SAFE_SOURCES and query_key:
+            found[query_key] += 1
+    return found
+
+
+def mine_logs(paths) -> Counter:
+    """Question frequencies from app logs (one vote per logged request or cache event)."""
+    found = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                for pattern in _LOG_QUERY_RES:
+                    match = pattern.search(line)
+                    if match:
+                        found[_strip_language(match.group(1).strip())] += 1
+                        break
+    return found
+
+
+def collect_queries(queries=(), from_cache: bool = False, logs=(), top: int = WARM_TOP_QUERIES) -> list:
+    """
+    Explicit `queries` first (in order), then the `top` most frequent mined ones.
+    Duplicates are merged on normalize_query_key. A mined question is warmed in its most
+    common logged spelling, since translated answers are cached per exact answer text
+    (which quotes the question); the app logs questions as typed only with LOG_RAW_QUERIES.
+    """
+    mined = Counter()
+    if from_cache:
+        mined.update(mine_cache_keys())
+    if logs:
+        mined.update(mine_logs(logs))
+
+    totals, spellings = Counter(), {}
+    for raw, n in mined.items():
+        key = normalize_query_key(raw)
+        totals[key] += n
+        spellings.setdefault(key, Counter())[raw] += n
+
+    unique = {}
+    for query in queries:
+        unique.setdefault(normalize_query_key(query), query)
+    for key, _ in totals.most_common(top):
+        variants = spellings[key]
+        unique.setdefault(key, max(variants, key=lambda raw: (raw != key, variants[raw])))
+    unique.pop("", None)
+    return list(unique.values())
+
+
+# --------------------------------
+# Expiry and Rate Budget
+# --------------------------------
+def expires_within(cache_obj, key: str, ahead: float) -> bool:
+    """True if `key` is missing or its entry expires within `ahead` seconds."""
+    value, expire_time = cache_obj.disk.get(key, expire_time=True)
+    if value is None:
+        return True
+    return expire_time is not None and expire_time - time.time() <= ahead
+
+
+def due_sources(query_key: str, ahead: float) -> list:
+    """Sources with no cached snippet for query_key, or whose snippet goes stale within `ahead`."""
+    entries = get_source_entries(query_key)
+    stale_before = time.time() + ahead - SOURCE_FRESH_TTL
+    return [
+        src for src in SAFE_SOURCES
+        if (src not in entries or entries[src]["fetched_at"] <= stale_before)
+        and get_breaker(src).available()
+    ]
+
+
+def wait_for_budget(tokens: int, share: float = WARM_RATE_SHARE) -> None:
+    """Block until `tokens` more fit in the warmer's share of the shared token window."""
+    wait_for_headroom(tokens, share, who="Warmer")
+
+
+# --------------------------------
+# Warming
+# --------------------------------
+def refresh_summary(sources: dict, question: str, answer_language=None) -> str:
+    """Regenerate and cache the summary, replacing the current entry only once the new one is ready."""
+    runnable, inputs = summary_request(sources, question, answer_language)
+    wait_for_budget(estimate_tokens(inputs["sources"] + question) + EXPECTED_OUTPUT_TOKENS)
+    summary = clean_response_text(runnable.invoke(inputs), disclaimer=not answer_language)
+    cache_summary(question, summary, answer_language, sources)
+    return summary
+
+
+def refresh_back_translation(text: str, target_lang: str) -> str:
+    wait_for_budget(2 * estimate_tokens(text))
+    return back_translate_sections(text, target_lang)
+
+
+def warm_query(query: str, languages=WARM_LANGUAGES, ahead: float = WARM_AHEAD,
+               single_pass: bool = SINGLE_PASS_MULTILINGUAL) -> dict:
+    """
+    Make sure every cacheable stage for `query` stays valid for at least `ahead` seconds.
+    Returns {stage: "fresh" | "warmed" | "skipped"} for reporting.
+    """
+    status = {}
+
+    # Stage 1: the question's own translation (non-English queries only)
+    wait_for_budget(estimate_tokens(query) * 2)
+    info = detect_and_translate(query)
+    question, user_lang = info["translation"], info["language"]
+    languages = [lang for lang in languages if not is_english_language(lang)]
+    if not is_english_language(user_lang) and user_lang.lower() != "unknown" and user_lang not in languages:
+        languages.append(user_lang)
+
+    if route(question) != "search":
+        status["answer"] = "skipped"  # direct answers aren't cached
+        return status
+
+    # Stage 2: per-source search results, overwritten in place so readers never see a miss
+    query_key = normalize_query_key(question)
+    due = due_sources(query_key, ahead)
+    if due:
+        for src, _, error in fetch_sources(question, query_key, due):
+            if error is not None:
+                logger.warning(f"Warming {src} for '{question}' failed: {error}")
+    status["search"] = "warmed" if due else "fresh"
+    sources = medical_search(question)
+    if sources_fingerprint(sources) is None:
+        status["summary"] = "skipped"  # no usable source yet; a summary of nothing isn't cached
+        return status
+
+    # Stage 3: summaries (the cached final answer), in English and, in single-pass mode, per language
+    for answer_language in [None] + (languages if single_pass else []):
+        key = summary_cache_key(question, answer_language)
+        stage = f"summary:{answer_language or 'English'}"
+        current = get_cached_summary(question, answer_language, sources)
+        if current and not expires_within(summary_cache, key, ahead):
+            status[stage] = "fresh"
+            continue
+        # Shares the live pipeline's flight, so users missing the cache meanwhile wait for this call
+        flight_key = summary_flight_key(question, answer_language, sources)
+        single_flight("summarise", flight_key, lambda: refresh_summary(sources, question, answer_language))
+        status[stage] = "warmed"
+
+    # Stage 4: back-translations of the final English answer
+    if not single_pass and languages:
+        answer = compose_answer(question, question, [])
+        for lang in languages:
+            key = back_translation_cache_key(answer, lang)
+            stage = f"translation:{lang}"
+            if not expires_within(back_translation_cache, key, ahead):
+                status[stage] = "fresh"
+                continue
+            single_flight("back_translate", key, lambda: refresh_back_translation(answer, lang))
+            status[stage] = "warmed"
+    return status
+
+
+def _warm_one(query: str, languages, ahead: float, single_pass: bool) -> dict:
+    try:
+        with timed("warm_query"):
+            status = warm_query(query, languages, ahead, single_pass)
+    except Exception as e:
+        logger.warning(f"Warming '{query}' failed: {e}")
+        count("warm_total", stage="query", result="failed")
+        return {"query": "failed"}
+    for stage, result in status.items():
+        count("warm_total", stage=stage.split(":", 1)[0], result=result)
+    return status
+
+
+def warm(queries, languages=WARM_LANGUAGES, ahead: float = WARM_AHEAD,
+         concurrency: int = WARM_CONCURRENCY, single_pass: bool = SINGLE_PASS_MULTILINGUAL) -> dict:
+    """Warm `queries` with bounded concurrency; returns {query: stage status}."""
+    languages = list(languages)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="warmer") as pool:
+        statuses = pool.map(lambda q: _warm_one(q, languages, ahead, single_pass), queries)
+        results = dict(zip(queries, statuses))
+
+    tally = Counter(result for status in results.values() for result in status.values())
+    logger.info(
+        f"Warmed {len(results)} queries: {tally['warmed']} entries refreshed, "
+        f"{tally['fresh']} already fresh, {tally['skipped']} skipped, {tally['failed']} failed."
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute cached answers for popular questions.")
+    parser.add_argument("queries", nargs="?", help="Text file with one query per line (or JSONL with a 'query' field).")
+    parser.add_argument("--from-cache", action="store_true", help="Also warm questions found in the existing caches.")
+    parser.add_argument("--log", action="append", default=[], help="Mine questions from this app log (repeatable).")
+    parser.add_argument("--top", type=int, default=WARM_TOP_QUERIES, help="Most frequent mined questions to keep.")
+    parser.add_argument("--languages", default=",".join(WARM_LANGUAGES), help="Comma-separated answer languages.")
+    parser.add_argument("--concurrency", type=int, default=WARM_CONCURRENCY)
+    parser.add_argument("--ahead", type=float, default=WARM_AHEAD, help="Refresh entries expiring within this many seconds.")
+    parser.add_argument("--every", type=float, help="Keep running, warming every this many seconds (e.g. %d)." % WARM_INTERVAL)
+    parser.add_argument("--metrics", help="Write per-stage timings and warm counters (JSON) here after each run.")
+    parser.add_argument(
+        "--single-pass", action=argparse.BooleanOptionalAction, default=SINGLE_PASS_MULTILINGUAL,
+        help="Warm answers written directly in each language instead of back-translations.",
+    )
+    args = parser.parse_args()
+    if not (args.queries or args.from_cache or args.log):
+        parser.error("give a query file, --from-cache or --log")
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        configure_gemini(api_key)
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+
+    while True:
+        start = time.perf_counter()
+        explicit = read_queries(args.queries) if args.queries else []
+        queries = collect_queries(explicit, args.from_cache, args.log, args.top)
+        warm(queries, languages, args.ahead, args.concurrency, args.single_pass)
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(to_json(indent=2))
+        logger.info(f"Warm run took {time.perf_counter() - start:.1f}s.")
+        if not args.every:
+            break
+        time.sleep(max(args.every - (time.perf_counter() - start), 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+tests/conftest.py
+
+Shared fixtures. Caches are opened in a throwaway directory, so importing the
+services never touches a real cache.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault("DOCBOT_CACHE_DIR", tempfile.mkdtemp(prefix="docbot-tests-"))
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_breakers():
+    """Start from closed circuit breakers and leave none behind."""
+    from core import circuit_breaker
+
+    circuit_breaker._breakers.clear()
+    yield
+    circuit_breaker._breakers.clear()
@@ -0,0 +1,157 @@
+"""
+tests/test_circuit_breaker.py
+
+Behaviour of the per-source circuit breakers and of the search paths that plan
+calls through them.
+"""
+
+import time
+
+import pytest
+
+from core.circuit_breaker import CLOSED, OPEN, HALF_OPEN, CircuitBreaker, CircuitOpenError, get_breaker
+
+
+def tripped(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("src", **{"min_calls": 2, "reset_timeout": 0, **kwargs})
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+pytestmark = pytest.mark.usefixtures("fresh_breakers")
+
+
+# --------------------------------
+# Opening
+# --------------------------------
+def test_stays_closed_below_min_calls():
+    breaker = CircuitBreaker("src", min_calls=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_at_failure_rate():
+    breaker = CircuitBreaker("src", min_calls=4, failure_rate=0.5, reset_timeout=60)
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_slow_success_counts_as_failure():
+    breaker = CircuitBreaker("src", min_calls=2, slow_call_seconds=1.0, reset_timeout=60)
+    breaker.record_success(latency=2.0)
+    breaker.record_success(latency=2.0)
+    assert breaker.state == OPEN
+
+
+# --------------------------------
+# Half-open Probe
+# --------------------------------
+def test_half_open_lets_one_probe_through():
+    breaker = tripped()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.available()
+
+
+def test_available_does_not_take_the_probe():
+    breaker = tripped()
+    assert breaker.available()
+    assert breaker.available()
+    assert breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = tripped()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_probe_failure_reopens():
+    breaker = tripped(reset_timeout=60)
+    breaker._opened_at -= 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_expires():
+    breaker = tripped(probe_timeout=0.05)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.1)
+    assert breaker.allow()
+
+
+# --------------------------------
+# Search Integration
+# --------------------------------
+class _Engine:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, query: str) -> str:
+        self.calls.append(query)
+        return f"{query}: snippet"
+
+
+@pytest.fixture
+def search_engine(monkeypatch):
+    from services import search_engine
+
+    engine = _Engine()
+    search_engine.get_search_engine.override(engine)
+    yield search_engine, engine
+    search_engine.get_search_engine.reset()
+
+
+def test_guarded_search_refuses_while_probing(search_engine):
+    search, engine = search_engine
+    breaker = get_breaker("nih.gov")
+    breaker.reset_timeout = 0
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.allow()  # someone else's probe is out
+    with pytest.raises(CircuitOpenError):
+        search.guarded_search("nih.gov", "flu")
+    assert engine.calls == []
+
+
+def test_probe_taken_by_the_call_closes_breaker(search_engine):
+    search, engine = search_engine
+    breaker = get_breaker("nih.gov")
+    breaker.reset_timeout = 0
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    search.guarded_search("nih.gov", "flu")
+    assert breaker.state == CLOSED
+    assert engine.calls == ["site:nih.gov flu"]
+
+
+def test_search_served_locally_leaves_probe_free(search_engine, monkeypatch):
+    search, engine = search_engine
+    for src in search.SAFE_SOURCES:
+        breaker = get_breaker(src)
+        breaker.reset_timeout = 0
+        for _ in range(breaker.min_calls):
+            breaker.record_failure()
+    monkeypatch.setattr(search, "find_local_sources", lambda query, sources: {s: "stored passage" for s in sources})
+
+    results = search.medical_search("probe leak check question")
+
+    assert set(results) == set(search.SAFE_SOURCES)
+    assert engine.calls == []
+    for src in search.SAFE_SOURCES:
+        assert get_breaker(src).allow(), f"{src} was left holding a probe"
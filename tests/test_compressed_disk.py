@@ -0,0 +1,83 @@
+"""
+tests/test_compressed_disk.py
+
+Compressed cache values: round-trips through DiskCache (in the database and in
+files), entries written without compression, and lookups on hashed keys.
+"""
+
+import diskcache as dc
+import pytest
+
+from core.cache_manager import hashed_key
+from core.compressed_disk import CompressedDisk
+
+ANSWER = "## Causes\n\nAsthma is caused by inflamed airways. " * 2000  # ~100 KB, stored as a file
+
+VALUES = [
+    "short text",
+    ANSWER,
+    {"timestamp": "2026-01-01 00:00:00", "results": {"cdc.gov": "snippet", "nih.gov": None}},
+    ["a", 1, 2.5, None],
+    b"raw bytes",
+    42,
+]
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+    """Open caches on one directory, compressed at `compress_level` or (None) with the plain serialiser."""
+    opened = []
+
+    def open_(compress_level=6):
+        if compress_level is None:
+            cache = dc.Cache(str(tmp_path))
+        else:
+            cache = dc.Cache(str(tmp_path), disk=CompressedDisk, disk_compress_level=compress_level)
+        opened.append(cache)
+        return cache
+
+    yield open_
+    for cache in opened:
+        cache.close()
+
+
+@pytest.mark.parametrize("compress_level", [6, 0])
+@pytest.mark.parametrize("value", VALUES)
+def test_round_trip(open_cache, value, compress_level):
+    cache = open_cache(compress_level)
+    cache.set("key", value)
+    assert cache.get("key") == value
+    assert type(cache.get("key")) is type(value)
+
+
+def test_values_are_stored_compressed(tmp_path):
+    disk = CompressedDisk(str(tmp_path), min_file_size=2 ** 15)
+    text = ANSWER[:5000]  # small enough once compressed to be kept in the database row
+    _, mode, filename, stored = disk.store(text, False)
+    assert filename is None
+    assert len(stored) < len(text) / 10
+    assert disk.fetch(mode, filename, stored, False) == text
+
+
+def test_entries_written_without_compression_are_read_unchanged(open_cache):
+    plain = open_cache(None)
+    for i, value in enumerate(VALUES):
+        plain.set(i, value)
+    plain.close()
+    compressed = open_cache()
+    assert [compressed.get(i) for i in range(len(VALUES))] == VALUES
+
+
+def test_hashed_key_lookup(open_cache):
+    cache = open_cache()
+    key = hashed_key("Spanish", ANSWER)
+    cache.set(key, "respuesta")
+    assert len(key) == 32
+    assert hashed_key("Spanish", ANSWER) == key
+    assert cache.get(hashed_key("Spanish", ANSWER)) == "respuesta"
+    assert cache.get(hashed_key("French", ANSWER)) is None
+
+
+def test_hashed_key_separates_parts():
+    assert hashed_key("ab", "c") != hashed_key("a", "bc")
+    assert hashed_key("a", "") != hashed_key("a")
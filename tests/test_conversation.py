@@ -0,0 +1,138 @@
+"""
+tests/test_conversation.py
+
+Token-budgeted history: fitting to a caller's budget, and background compaction
+into the rolling summary.
+"""
+
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+
+from services import conversation
+from services.conversation import SUMMARY_PREFIX, ConversationHistory, fit_history, message_tokens
+
+
+def words(n: int, word: str = "word") -> str:
+    return " ".join([word] * n)
+
+
+def tokens(history) -> int:
+    return sum(message_tokens(m) for m in history)
+
+
+@pytest.fixture
+def summariser():
+    """Fake summary model recording the inputs it was asked to fold."""
+    calls, gate = [], threading.Event()
+    gate.set()
+
+    def summarise(inputs):
+        assert gate.wait(5)
+        calls.append(inputs)
+        return f"summary #{len(calls)}"
+
+    conversation.get_history_summary_runnable.override(RunnableLambda(summarise))
+    yield calls, gate
+    conversation.get_history_summary_runnable.reset()
+
+
+# --------------------------------
+# fit_history
+# --------------------------------
+HISTORY = [
+    HumanMessage(content=words(40)),
+    AIMessage(content=words(40)),
+    HumanMessage(content=words(40)),
+    AIMessage(content=words(40)),
+]
+PER_MESSAGE = message_tokens(HISTORY[0])
+
+
+@pytest.mark.parametrize("kept", [1, 2, 3, 4])
+@pytest.mark.parametrize("spare", [0, PER_MESSAGE - 1])
+def test_fits_newest_messages_to_custom_budget(kept, spare):
+    budget = kept * PER_MESSAGE + spare
+    fitted = fit_history(HISTORY, budget)
+    assert fitted == HISTORY[-kept:]
+    assert tokens(fitted) <= budget
+
+
+def test_summary_message_is_always_kept():
+    summary = SystemMessage(content=SUMMARY_PREFIX + "earlier talk")
+    fitted = fit_history([summary] + HISTORY, message_tokens(summary) + 2 * PER_MESSAGE)
+    assert fitted == [summary] + HISTORY[-2:]
+
+
+def test_too_long_newest_message_is_shortened():
+    [shortened] = fit_history(HISTORY, 20)
+    assert isinstance(shortened, AIMessage)
+    assert shortened.content.endswith(" …")
+    assert message_tokens(shortened) <= 21
+
+
+def test_dict_messages_and_empty_history():
+    history = [{"role": "user", "content": words(40)}, {"role": "assistant", "content": words(40)}]
+    assert fit_history(history, PER_MESSAGE + 1) == history[-1:]
+    assert fit_history(None, 100) == []
+    assert fit_history(HISTORY, 0) == []
+
+
+# --------------------------------
+# Compaction
+# --------------------------------
+def test_context_stays_within_budget_as_turns_are_compacted(summariser):
+    calls, _ = summariser
+    history = ConversationHistory(budget=200)
+    for _ in range(6):
+        history.add_turn(words(30), words(30))  # ~38 tokens each
+        history.wait(5)
+    assert calls, "older turns should have been folded into the summary"
+    assert history.summary == f"summary #{len(calls)}"
+    assert history.summarised > 0
+    assert len(history.messages) == 12  # the transcript itself is never trimmed
+
+    context = history.context()
+    assert context[0].content == SUMMARY_PREFIX + history.summary
+    assert context[-2:] == history.messages[-2:]
+    assert tokens(context) <= 200
+
+
+def test_no_compaction_while_everything_fits(summariser):
+    calls, _ = summariser
+    history = ConversationHistory(budget=1000)
+    history.add_turn("hi", "hello")
+    history.wait(5)
+    assert not calls
+    assert history.context() == history.messages
+
+
+def test_clear_discards_a_running_compaction(summariser):
+    calls, gate = summariser
+    gate.clear()
+    history = ConversationHistory(budget=100)
+    history.add_turn(words(40), words(40))
+    history.add_turn(words(40), words(40))
+    history.clear()
+    gate.set()
+    history.wait(5)
+    assert calls
+    assert (history.summary, history.summarised, history.messages) == ("", 0, [])
+
+
+def test_failed_compaction_keeps_messages_unsummarised():
+    def fail(inputs):
+        raise RuntimeError("model down")
+
+    conversation.get_history_summary_runnable.override(RunnableLambda(fail))
+    try:
+        history = ConversationHistory(budget=100)
+        history.add_turn(words(40), words(40))
+        history.add_turn(words(40), words(40))
+        history.wait(5)
+        assert (history.summary, history.summarised) == ("", 0)
+        assert tokens(history.context()) <= 100
+    finally:
+        conversation.get_history_summary_runnable.reset()
@@ -0,0 +1,93 @@
+"""
+tests/test_formatting.py
+
+Response cleanup: labels, disclaimers, and the streaming cleaner agreeing with
+the one-shot one.
+"""
+
+import pytest
+
+from utils import formatting
+from utils.formatting import DISCLAIMER_LINE, StreamingCleaner, clean_response_text
+
+
+def stream_clean(text: str, size: int, **kwargs) -> str:
+    cleaner = StreamingCleaner(**kwargs)
+    out = [cleaner.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return "".join(out) + cleaner.finish()
+
+
+LOCALISED = "**Question:** ¿Qué es el asma?\n\nEl asma es una enfermedad crónica de las vías respiratorias."
+
+
+def test_missing_disclaimer_is_added():
+    assert clean_response_text("Asthma is a chronic airway disease.").endswith(DISCLAIMER_LINE)
+
+
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_localised_answer_gets_no_english_disclaimer(size):
+    assert DISCLAIMER_LINE not in clean_response_text(LOCALISED, disclaimer=False)
+    assert stream_clean(LOCALISED, size, disclaimer=False) == clean_response_text(LOCALISED, disclaimer=False)
+
+
+def test_remembered_results_keep_their_mode():
+    without = clean_response_text(LOCALISED, disclaimer=False)
+    assert clean_response_text(without).endswith(DISCLAIMER_LINE)
+    assert clean_response_text(without, disclaimer=False) == without
+
+
+def test_models_own_disclaimer_is_kept():
+    text = LOCALISED + "\n\n⚠️ *Esta información es solo educativa.*"
+    assert clean_response_text(text) == clean_response_text(text, disclaimer=False)
+    assert DISCLAIMER_LINE not in clean_response_text(text)
+
+
+MESSY = """**Question:** What causes asthma?   
+
+**Answer:**  
+Asthma is caused by inflamed airways.
+
+
+**Answer:** Triggers include pollen.
+⚠️ *Consult a doctor.*
+
+⚠️ *Consult a doctor.*
+Disclaimer: not medical advice.
+   trailing spaces   
+
+
+"""
+
+SAMPLES = [
+    MESSY,
+    "",
+    "\n\n",
+    "One line, no newline",
+    "⚠️ only a disclaimer",
+    "Line\r\nwith CRLF\r\n",
+    "**question:** lower-case labels **ANSWER:** here",
+    LOCALISED,
+]
+
+
+@pytest.mark.parametrize("disclaimer", [True, False])
+@pytest.mark.parametrize("text", SAMPLES)
+def test_cleaning_is_idempotent(text, disclaimer):
+    once = clean_response_text(text, disclaimer=disclaimer)
+    formatting._known_clean.clear()  # really clean it again, not just look it up
+    assert clean_response_text(once, disclaimer=disclaimer) == once
+
+
+@pytest.mark.parametrize("disclaimer", [True, False])
+@pytest.mark.parametrize("size", [1, 2, 5, 13, 10_000])
+@pytest.mark.parametrize("text", SAMPLES)
+def test_streamed_output_equals_one_shot(text, size, disclaimer):
+    assert stream_clean(text, size, disclaimer=disclaimer) == clean_response_text(text, disclaimer=disclaimer)
+
+
+def test_duplicate_disclaimers_and_labels_are_removed():
+    cleaned = clean_response_text(MESSY)
+    assert cleaned.count("⚠️ *Consult a doctor.*") == 1
+    assert "**Answer:**" not in cleaned and "**Question:**" not in cleaned
+    assert DISCLAIMER_LINE not in cleaned  # the model's own disclaimer is kept instead
+    assert cleaned == cleaned.strip()
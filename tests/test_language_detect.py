@@ -0,0 +1,69 @@
+"""
+tests/test_language_detect.py
+
+Offline language identification on short questions: overall accuracy, and no
+foreign question ever confident enough to skip the translator as English.
+"""
+
+import pytest
+
+from core.config import LANG_DETECT_THRESHOLD
+from utils.language_detect import detect_language, is_confidently_english, looks_english
+
+SHORT_QUERIES = [
+    ("en", "diabetes symptoms"),
+    ("en", "headache"),
+    ("en", "fever in kids"),
+    ("en", "is it safe to take ibuprofen"),
+    ("en", "how to treat a sore throat"),
+    ("en", "chest pain after eating"),
+    ("en", "What are the side effects of statins?"),
+    ("en", "high blood pressure during pregnancy"),
+    ("es", "¿Qué causa el asma?"),
+    ("es", "dolor de cabeza"),
+    ("es", "síntomas de la diabetes"),
+    ("es", "¿Cuál es el tratamiento para la gripe?"),
+    ("es", "tengo dolor de estómago"),
+    ("fr", "Quels sont les symptômes du diabète ?"),
+    ("fr", "mal de tête"),
+    ("fr", "traitement de la grippe"),
+    ("fr", "Pourquoi ai-je mal au ventre ?"),
+    ("de", "Was sind die Ursachen von Kopfschmerzen?"),
+    ("de", "Kopfschmerzen Ursachen"),
+    ("de", "Behandlung von Bluthochdruck"),
+    ("de", "Ist das Medikament sicher für Kinder?"),
+    ("it", "Quali sono i sintomi del diabete?"),
+    ("it", "dolore alla testa"),
+    ("it", "cura per la febbre"),
+    ("pt", "Quais são os sintomas da gripe?"),
+    ("pt", "dor de cabeça"),
+    ("pt", "tratamento para pressão alta"),
+    ("nl", "Wat zijn de symptomen van griep?"),
+    ("nl", "behandeling van hoofdpijn"),
+    ("nl", "Hoe lang duurt een verkoudheid?"),
+    ("other", "Что вызывает астму?"),
+    ("other", "糖尿病の症状"),
+    ("other", "ما هي أعراض السكري؟"),
+]
+
+
+def test_short_query_accuracy():
+    correct = sum(detect_language(text)[0] == lang for lang, text in SHORT_QUERIES)
+    assert correct / len(SHORT_QUERIES) >= 0.9
+
+
+@pytest.mark.parametrize("lang, text", [(lang, text) for lang, text in SHORT_QUERIES if lang != "en"])
+def test_foreign_query_never_skips_the_translator(lang, text):
+    assert not is_confidently_english(text, LANG_DETECT_THRESHOLD)
+    assert not looks_english(text, 0.3)
+
+
+@pytest.mark.parametrize("text", ["", "123", "???"])
+def test_no_letters_is_unknown(text):
+    assert detect_language(text) == ("unknown", 0.0)
+
+
+def test_unmatched_ascii_still_looks_english():
+    assert detect_language("asthma")[0] == "unknown"
+    assert looks_english("asthma", 0.3)
+    assert not looks_english("астма", 0.3)
@@ -0,0 +1,103 @@
+"""
+tests/test_llm.py
+
+Client registry: each context's API key reaches the client its chains run on.
+"""
+
+import threading
+from typing import Optional
+
+import pytest
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from core import llm
+from core.config import configure_gemini
+
+
+class KeyEchoModel(SimpleChatModel):
+    """Stands in for the Gemini client and answers with the key it was built with."""
+
+    model: str = ""
+    temperature: float = 0.0
+    transport: str = ""
+    google_api_key: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "key-echo"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        return self.google_api_key or "default"
+
+
+@pytest.fixture
+def echo_clients():
+    llm._pooled_model_class.override(KeyEchoModel)
+    llm._clients.clear()
+    yield
+    llm._clients.clear()
+    llm._pooled_model_class.reset()
+
+
+def in_session(api_key: str, fn):
+    """Run fn() on a fresh thread (its own context), as Streamlit does per session."""
+    result = {}
+
+    def run():
+        configure_gemini(api_key)
+        result["value"] = fn()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    return result["value"]
+
+
+def test_chain_uses_each_sessions_key(echo_clients):
+    chain = ChatPromptTemplate.from_template("{q}") | llm.get_chat_model() | StrOutputParser()
+
+    assert in_session("key-a", lambda: chain.invoke({"q": "hi"})) == "key-a"
+    assert in_session("key-b", lambda: chain.invoke({"q": "hi"})) == "key-b"
+    assert in_session("key-b", lambda: "".join(chain.stream({"q": "hi"}))) == "key-b"
+    assert in_session("key-a", lambda: chain.batch([{"q": "1"}, {"q": "2"}])) == ["key-a", "key-a"]
+
+
+def test_one_client_per_key(echo_clients):
+    first = llm.client_for(api_key="key-a")
+    assert llm.client_for(api_key="key-a") is first
+    assert llm.client_for(api_key="key-b") is not first
+
+
+def test_registered_client_serves_every_key(echo_clients):
+    fake = KeyEchoModel(google_api_key="registered")
+    llm.register_chat_model(fake, "test-model", 0.5)
+    try:
+        assert llm.client_for("test-model", 0.5, "key-a") is fake
+        assert llm.client_for("test-model", 0.5, "key-b") is fake
+    finally:
+        llm._registered.clear()
+
+
+def test_registry_keeps_only_key_digests(echo_clients):
+    llm.client_for(api_key="secret-key")
+    assert all("secret-key" not in map(str, key) for key in llm._clients)
+
+
+def test_least_recently_used_client_is_dropped(echo_clients, monkeypatch):
+    monkeypatch.setattr(llm, "GEMINI_MAX_CLIENTS", 2)
+    first = llm.client_for(api_key="key-a")
+    llm.client_for(api_key="key-b")
+    assert llm.client_for(api_key="key-a") is first  # now the most recently used
+    llm.client_for(api_key="key-c")
+    assert len(llm._clients) == 2
+    assert llm.client_for(api_key="key-a") is first
+
+
+def test_forgotten_key_gets_a_new_client(echo_clients):
+    old = llm.client_for(api_key="key-a")
+    kept = llm.client_for(api_key="key-b")
+    llm.forget_api_key("key-a")
+    assert llm.client_for(api_key="key-b") is kept
+    assert llm.client_for(api_key="key-a") is not old
@@ -0,0 +1,123 @@
+"""
+tests/test_metrics.py
+
+Metrics export: Prometheus text exposition, the JSON snapshot, hit rates and
+request traces.
+"""
+
+import json
+import re
+
+import pytest
+
+from core import metrics
+from core.config import METRICS_LATENCY_BUCKETS
+from core.metrics import count, observe, record, reset_metrics, snapshot, timed, to_json, to_prometheus, trace_request
+
+# name{label="value",...} number  (or a # TYPE comment)
+_SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? -?[0-9.e+]+$')
+_TYPE_RE = re.compile(r"^# TYPE [a-zA-Z_:][a-zA-Z0-9_:]* (counter|histogram)$")
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def populate():
+    count("cache_requests_total", cache="search", result="hot_hit")
+    count("cache_requests_total", cache="search", result="miss", n=3)
+    count("cache_requests_total", cache="summary", result="disk_hit")
+    count("route_decisions_total", route="search")
+    observe("translate", 0.003)
+    observe("translate", 0.2)
+    observe("translate", 99.0)
+    observe("search_source", 0.7, source='we"ird\\site\n')
+
+
+def test_prometheus_lines_are_well_formed():
+    populate()
+    text = to_prometheus()
+    assert text.endswith("\n")
+    for line in text.rstrip("\n").split("\n"):
+        assert _SAMPLE_RE.match(line) or _TYPE_RE.match(line), line
+
+
+def test_prometheus_types_each_metric_once():
+    populate()
+    types = [line for line in to_prometheus().splitlines() if line.startswith("# TYPE")]
+    assert types == [
+        "# TYPE docbot_cache_requests_total counter",
+        "# TYPE docbot_route_decisions_total counter",
+        "# TYPE docbot_stage_seconds histogram",
+    ]
+
+
+def test_prometheus_counter_samples():
+    populate()
+    lines = to_prometheus().splitlines()
+    assert 'docbot_cache_requests_total{cache="search",result="miss"} 3' in lines
+    assert 'docbot_route_decisions_total{route="search"} 1' in lines
+
+
+def test_prometheus_histogram_is_cumulative():
+    populate()
+    lines = to_prometheus().splitlines()
+    buckets = [line for line in lines if line.startswith('docbot_stage_seconds_bucket{stage="translate"')]
+    assert len(buckets) == len(METRICS_LATENCY_BUCKETS) + 1
+    values = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert values == sorted(values)
+    assert buckets[-1] == 'docbot_stage_seconds_bucket{stage="translate",le="+Inf"} 3'
+    assert 'docbot_stage_seconds_bucket{stage="translate",le="0.005"} 1' in lines
+    assert 'docbot_stage_seconds_count{stage="translate"} 3' in lines
+    assert 'docbot_stage_seconds_sum{stage="translate"} 99.203000' in lines
+
+
+def test_prometheus_escapes_label_values():
+    populate()
+    assert 'source="we\\"ird\\\\site\\n"' in to_prometheus()
+
+
+def test_empty_registry_exports_nothing():
+    assert to_prometheus() == "\n"
+    assert snapshot(traces=False) == {"counters": [], "histograms": []}
+
+
+def test_json_snapshot():
+    populate()
+    data = json.loads(to_json())
+    assert {"name": "route_decisions_total", "labels": {"route": "search"}, "value": 1} in data["counters"]
+    [translate] = [h for h in data["histograms"] if h["stage"] == "translate"]
+    assert translate["count"] == 3
+    assert list(translate["buckets"]) == [*map(str, METRICS_LATENCY_BUCKETS), "+Inf"]
+    assert translate["buckets"]["+Inf"] == 1
+    assert 0 < translate["p50"] <= translate["p95"] <= METRICS_LATENCY_BUCKETS[-1]
+
+
+def test_cache_hit_rates():
+    populate()
+    assert metrics.cache_hit_rates() == {
+        "search": {"hits": 1, "misses": 3, "hit_rate": 0.25},
+        "summary": {"hits": 1, "misses": 0, "hit_rate": 1.0},
+    }
+
+
+def test_trace_collects_spans_and_errors():
+    with trace_request("answer", user="u1") as trace:
+        with timed("translate"):
+            pass
+        with pytest.raises(ValueError):
+            with timed("generate", mode="stream"):
+                raise ValueError("boom")
+        record("search_source", 0.5, "TimeoutError", source="cdc.gov")
+    data = trace.to_dict()
+    assert data["name"] == "answer" and data["attributes"] == {"user": "u1"}
+    assert {span["stage"] for span in data["spans"]} == {"translate", "generate", "search_source"}
+    assert [span["error"] for span in data["spans"] if span["error"]] in (
+        ["TimeoutError", "ValueError"], ["ValueError", "TimeoutError"]
+    )
+    assert snapshot()["traces"][-1]["id"] == data["id"]
+    lines = to_prometheus().splitlines()
+    assert 'docbot_stage_errors_total{error="ValueError",stage="generate"} 1' in lines
@@ -0,0 +1,54 @@
+"""
+tests/test_router.py
+
+Search routing: a labelled regression set for the bundled classifier, and one
+route decision counted per answer.
+"""
+
+import threading
+
+import pytest
+
+from core.metrics import reset_metrics, snapshot
+from services import medical_agent
+from services.router import get_route_classifier, route
+
+# Not in the training data verbatim, except the first two (reported misroutes)
+LABELLED = [
+    ("How do I control my asthma?", "search"),
+    ("What does a CBC blood test measure?", "search"),
+    ("How do I control my migraines?", "search"),
+    ("How can I control my cholesterol?", "search"),
+    ("What does a kidney function test measure?", "search"),
+    ("What does a blood sugar test measure?", "search"),
+    ("What are the side effects of ibuprofen?", "search"),
+    ("How do I control my spending?", "no_search"),
+    ("What is a control group in a clinical trial?", "no_search"),
+    ("What does a thermometer measure?", "no_search"),
+    ("What does a cardiologist do?", "no_search"),
+    ("Hello, how are you?", "no_search"),
+]
+
+
+def route_decisions() -> int:
+    return sum(c["value"] for c in snapshot(traces=False)["counters"] if c["name"] == "route_decisions_total")
+
+
+@pytest.mark.parametrize("query, expected", LABELLED)
+def test_labelled_questions_route_as_expected(query, expected):
+    assert get_route_classifier() is not None  # the bundled weights, not the keyword fallback
+    assert route(query) == expected
+
+
+def test_route_counts_one_decision():
+    reset_metrics()
+    route("What are the symptoms of asthma?")
+    assert route_decisions() == 1
+
+
+def test_speculative_search_is_not_a_route_decision(monkeypatch):
+    monkeypatch.setattr(medical_agent, "iter_medical_search", lambda query: iter([("cdc.gov", "snippet")]))
+    reset_metrics()
+    sources = medical_agent.speculative_search("What are the symptoms of asthma?", threading.Event())
+    assert sources == {"cdc.gov": "snippet"}
+    assert route_decisions() == 0
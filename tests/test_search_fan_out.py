@@ -0,0 +1,129 @@
+"""
+tests/test_search_fan_out.py
+
+Parallel source search: per-source timeouts, the overall deadline, hedged
+retries, the shared pool, and what each source's breaker gets told.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.circuit_breaker import get_breaker
+from services import search_engine
+from services.search_engine import SearchTimeout, fan_out_search
+
+pytestmark = pytest.mark.usefixtures("fresh_breakers")
+
+
+class ScriptedEngine:
+    """Fake search tool: each source either answers at once or hangs until released."""
+
+    def __init__(self, hang=(), hang_first=()):
+        self.hang = set(hang)
+        self.hang_first = set(hang_first)  # only the first attempt hangs
+        self.release = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, query: str) -> str:
+        src = query.split()[0].removeprefix("site:")
+        with self._lock:
+            self.calls.append(src)
+            first = self.calls.count(src) == 1
+        if src in self.hang or (first and src in self.hang_first):
+            self.release.wait(5)
+        return f"{src} snippet"
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engines = []
+
+    def install(**kwargs):
+        fake = ScriptedEngine(**kwargs)
+        engines.append(fake)
+        search_engine.get_search_engine.override(fake)
+        return fake
+
+    monkeypatch.setattr(search_engine, "SEARCH_SOURCE_TIMEOUT", 0.3)
+    monkeypatch.setattr(search_engine, "SEARCH_DEADLINE", 1.0)
+    monkeypatch.setattr(search_engine, "SEARCH_HEDGE_AFTER", 0)
+    yield install
+    for fake in engines:
+        fake.release.set()  # let hung attempts finish
+    search_engine.get_search_engine.reset()
+
+
+def run(sources, query="asthma"):
+    start = time.monotonic()
+    results = {src: (res, error) for src, res, error in fan_out_search(query, sources)}
+    return results, time.monotonic() - start
+
+
+def test_slow_source_times_out_alone(engine):
+    engine(hang={"cdc.gov"})
+    results, took = run(["nih.gov", "cdc.gov"])
+    assert results["nih.gov"] == ("nih.gov snippet", None)
+    error = results["cdc.gov"][1]
+    assert isinstance(error, SearchTimeout) and error.charge
+    assert 0.3 <= took < 0.6
+
+
+def test_deadline_cut_is_not_charged(engine, monkeypatch):
+    monkeypatch.setattr(search_engine, "SEARCH_DEADLINE", 0.2)
+    engine(hang={"cdc.gov"})
+    results, took = run(["cdc.gov"])
+    error = results["cdc.gov"][1]
+    assert isinstance(error, SearchTimeout) and not error.charge
+    assert took < 0.3
+    assert list(get_breaker("cdc.gov")._outcomes) == []
+
+
+def test_deadline_cut_is_not_negative_cached(engine, monkeypatch):
+    monkeypatch.setattr(search_engine, "SEARCH_DEADLINE", 0.2)
+    engine(hang={"cdc.gov"})
+    list(search_engine.fetch_sources("deadline q", "deadline q", ["cdc.gov"]))
+    assert search_engine.failure_cache.get(search_engine.failure_cache_key("cdc.gov", "deadline q")) is None
+
+
+def test_hedged_attempt_wins(engine, monkeypatch):
+    monkeypatch.setattr(search_engine, "SEARCH_HEDGE_AFTER", 0.1)
+    fake = engine(hang_first={"cdc.gov"})
+    results, took = run(["cdc.gov"])
+    assert results["cdc.gov"] == ("cdc.gov snippet", None)
+    assert took < 0.3  # before the source's own timeout
+    assert fake.calls == ["cdc.gov", "cdc.gov"]
+
+
+def test_one_breaker_outcome_per_source(engine, monkeypatch):
+    monkeypatch.setattr(search_engine, "SEARCH_HEDGE_AFTER", 0.1)
+    fake = engine(hang={"cdc.gov"})
+    results, _ = run(["cdc.gov", "nih.gov"])
+    assert isinstance(results["cdc.gov"][1], SearchTimeout)
+
+    fake.release.set()  # the abandoned and hedged attempts now finish late
+    time.sleep(0.1)
+    assert fake.calls.count("cdc.gov") == 2
+    assert list(get_breaker("cdc.gov")._outcomes) == [True]
+    assert list(get_breaker("nih.gov")._outcomes) == [False]
+
+
+def test_fetch_sources_records_timeout_once(engine):
+    engine(hang={"cdc.gov"})
+    list(search_engine.fetch_sources("hang q", "hang q", ["cdc.gov"]))
+    assert list(get_breaker("cdc.gov")._outcomes) == [True]
+
+
+def test_queued_sources_are_not_charged(engine, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(search_engine, "search_executor", pool)
+    monkeypatch.setattr(search_engine, "SEARCH_DEADLINE", 0.5)
+    engine(hang={"cdc.gov"})
+    results, _ = run(["cdc.gov", "nih.gov"])  # nih.gov waits behind the hung call
+    assert results["cdc.gov"][1].charge
+    assert isinstance(results["nih.gov"][1], SearchTimeout) and not results["nih.gov"][1].charge
+    assert list(get_breaker("nih.gov")._outcomes) == []
+    pool.shutdown(wait=False, cancel_futures=True)
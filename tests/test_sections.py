@@ -0,0 +1,119 @@
+"""
+tests/test_sections.py
+
+Section-level back-translation: Markdown splits into segments that join back to
+the original, and translated sections reassemble in order with their padding.
+"""
+
+import threading
+import uuid
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from services import translator
+from services.translator import translated_sections
+from utils.formatting import DISCLAIMER_LINE, split_markdown_sections
+
+ANSWER = f"""**Question:** What causes asthma?
+
+**Verified medical information (summarised from sources):**
+
+## Causes
+
+Asthma is caused by inflamed airways.
+Triggers include pollen and smoke.
+
+### Risk factors
+- Family history
+- Allergies
+
+---
+
+📚 **Sources referenced:**
+- **cdc.gov** — Asthma facts...
+
+---
+
+{DISCLAIMER_LINE}"""
+
+TEXTS = [
+    ANSWER,
+    "",
+    "\n",
+    "Plain text with no labels.",
+    "\n\n## Heading after blank lines\n\nBody\n\n\n",
+    "---\n---\n\n---",
+    "**Label:**\n**Another label:**\nBody right after.",
+    "Body first\n## Heading\n  indented body  \n\n12345\n",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_split_joins_back_to_original(text):
+    segments = split_markdown_sections(text)
+    assert "\n".join(segment for segment, _ in segments) == text
+
+
+def test_labels_are_segments_of_their_own():
+    segments = dict(split_markdown_sections(ANSWER))
+    for label in ("## Causes", "### Risk factors", "**Verified medical information (summarised from sources):**", DISCLAIMER_LINE):
+        assert segments[label] is True
+    assert segments["---"] is False
+    assert "Asthma is caused by inflamed airways.\nTriggers include pollen and smoke.\n" in segments
+
+
+def test_segments_without_letters_are_not_translated():
+    assert dict(split_markdown_sections("## Heading\n12345 / 678\n"))["12345 / 678\n"] is False
+
+
+@pytest.fixture
+def back_chain():
+    """Fake back-translator that marks each segment; `fail` makes matching segments raise."""
+    calls, fail = [], set()
+    lock = threading.Lock()
+
+    def translate(inputs):
+        with lock:
+            calls.append(inputs["text"])
+        if inputs["text"] in fail:
+            raise RuntimeError("model down")
+        return f"<{inputs['text']}>"
+
+    translator.get_translator_back_chain.override(RunnableLambda(translate))
+    yield calls, fail
+    translator.get_translator_back_chain.reset()
+
+
+def target_lang() -> str:
+    return f"Testish-{uuid.uuid4().hex}"  # section translations are cached per language
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_translated_sections_keep_order_and_padding(back_chain, text):
+    pieces = list(translated_sections(text, target_lang()))
+    assert all(ok for _, ok in pieces)
+    expected = "\n".join(
+        segment.replace(segment.strip(), f"<{segment.strip()}>", 1) if translatable else segment
+        for segment, translatable in split_markdown_sections(text)
+    )
+    assert "".join(piece for piece, _ in pieces) == expected
+
+
+def test_repeated_and_cached_sections_are_translated_once(back_chain):
+    calls, _ = back_chain
+    lang = target_lang()
+    text = "## Causes\nBody one.\n## Causes\nBody two."
+    first = "".join(piece for piece, _ in translated_sections(text, lang))
+    assert sorted(calls) == ["## Causes", "Body one.", "Body two."]
+    calls.clear()
+    assert "".join(piece for piece, _ in translated_sections(text, lang)) == first
+    assert not calls
+
+
+def test_failed_section_comes_back_in_english(back_chain):
+    _, fail = back_chain
+    fail.add("Body two.")
+    pieces = list(translated_sections("## Causes\nBody one.\n## Risks\nBody two.", target_lang()))
+    assert "".join(piece for piece, _ in pieces) == "<## Causes>\n<Body one.>\n<## Risks>\nBody two."
+    assert [ok for _, ok in pieces] == [True, True, True, False]
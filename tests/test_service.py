@@ -0,0 +1,73 @@
+"""
+tests/test_service.py
+
+Newline-delimited JSON protocol of the headless service: every line gets exactly
+one response line, and malformed requests get an error instead of closing the
+connection.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from services import service
+
+
+@pytest.fixture
+def fake_answers(monkeypatch):
+    async def fake_answer(query, history, single_pass):
+        return f"answer to {query} ({len(history)} earlier)"
+
+    monkeypatch.setattr(service, "aget_medical_answer", fake_answer)
+
+
+def exchange(*lines) -> list:
+    """Send `lines` on one connection and return the decoded response to each."""
+
+    async def run():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for line in lines:
+                writer.write(line.encode("utf-8") + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    return asyncio.run(run())
+
+
+def test_answers_and_echoes_id(fake_answers):
+    request = {"id": 7, "query": "What is asthma?", "history": [{"role": "user", "content": "hi"}]}
+    [response] = exchange(json.dumps(request))
+    assert response["id"] == 7
+    assert response["answer"] == "answer to What is asthma? (1 earlier)"
+    assert "trace" in response
+
+
+def test_metrics_request(fake_answers):
+    [response] = exchange(json.dumps({"id": 1, "metrics": "json"}))
+    assert response["id"] == 1
+    assert isinstance(response["metrics"], dict)
+
+
+@pytest.mark.parametrize("line", [
+    "not json",
+    "[]",
+    "5",
+    '"What is asthma?"',
+    "null",
+    '{"id": 3}',
+    '{"query": 5}',
+    '{"query": "hi", "history": "earlier"}',
+    '{"query": "hi", "history": [1, 2]}',
+])
+def test_bad_request_gets_an_error_and_connection_stays_open(fake_answers, line):
+    bad, good = exchange(line, json.dumps({"id": 2, "query": "hi"}))
+    assert bad["error"].startswith("Bad request")
+    assert good == {**good, "id": 2, "answer": "answer to hi (0 earlier)"}
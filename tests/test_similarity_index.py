@@ -0,0 +1,62 @@
+"""
+tests/test_similarity_index.py
+
+Paraphrase lookup: rewordings match, questions about a different condition don't.
+"""
+
+import diskcache as dc
+import pytest
+
+from core.cache_manager import normalize_query_key
+from core.config import SIMILARITY_THRESHOLD
+from core.similarity_index import SimilarityIndex, essential_terms, jaccard, query_tokens
+
+# Pairs that share nearly every word but ask about something else
+DIFFERENT = [
+    ("can pregnant women safely take ibuprofen for back pain in the third trimester",
+     "can pregnant women safely take ibuprofen for back pain in the first trimester"),
+    ("what is the recommended starting insulin dose per day for adults with type 2 diabetes",
+     "what is the recommended starting insulin dose per day for adults with type 1 diabetes"),
+    ("what are the common symptoms and treatment options for chronic hepatitis b infection in adults",
+     "what are the common symptoms and treatment options for chronic hepatitis c infection in adults"),
+    ("should people with diabetes not eat fruit before bed at night",
+     "should people with diabetes eat fruit before bed at night"),
+]
+
+REWORDED = [
+    ("what are the treatments for migraine headaches", "treatment for migraine headache"),
+    ("symptoms of type 2 diabetes in adults", "what are the symptoms of type 2 diabetes in adults"),
+    ("can pregnant women take ibuprofen in the third trimester",
+     "can a pregnant woman take ibuprofen during the third trimester"),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    store = dc.Cache(str(tmp_path))
+    yield SimilarityIndex(store)
+    store.close()
+
+
+@pytest.mark.parametrize("query, cached", DIFFERENT)
+def test_different_conditions_do_not_match(index, query, cached):
+    query, cached = normalize_query_key(query), normalize_query_key(cached)
+    # Word overlap alone would call these paraphrases
+    assert jaccard(query_tokens(query), query_tokens(cached)) >= SIMILARITY_THRESHOLD
+    index.add(cached)
+    assert index.similar(query) == []
+
+
+@pytest.mark.parametrize("query, cached", REWORDED)
+def test_rewordings_still_match(tmp_path, query, cached):
+    store = dc.Cache(str(tmp_path))
+    index = SimilarityIndex(store, threshold=0.6)
+    query, cached = normalize_query_key(query), normalize_query_key(cached)
+    index.add(cached)
+    assert [key for _, key in index.similar(query)] == [cached]
+    store.close()
+
+
+def test_essential_terms():
+    words = query_tokens("cant take ibuprofen in the third trimester of type 2 diabetes")
+    assert essential_terms(words) == {"cant", "third", "2"}
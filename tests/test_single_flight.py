@@ -0,0 +1,144 @@
+"""
+tests/test_single_flight.py
+
+Behaviour of request coalescing across threads (and, via the lock store, processes).
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.cache_manager import flight_store
+from core.single_flight import single_flight, single_flight_iter
+
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex  # the lock/result store outlives a single test
+
+
+def wait_for_leader(started: threading.Event):
+    assert started.wait(5)
+    time.sleep(0.05)  # let the followers join the flight
+
+
+def test_concurrent_callers_share_one_call(key):
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(single_flight, "test", key, compute) for _ in range(4)]
+        wait_for_leader(started)
+        release.set()
+        results = [f.result(5) for f in futures]
+
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+
+
+def test_sequential_calls_recompute(key):
+    calls = []
+    for _ in range(2):
+        single_flight("test", key, lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_different_keys_do_not_wait_for_each_other(key):
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    with ThreadPoolExecutor(1) as pool:
+        pending = pool.submit(single_flight, "test", key, slow)
+        assert started.wait(5)
+        assert single_flight("test", key + "-other", lambda: "fast") == "fast"
+        release.set()
+        assert pending.result(5) == "slow"
+
+
+def test_leader_error_reaches_followers(key):
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(single_flight, "test", key, failing) for _ in range(3)]
+        wait_for_leader(started)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(5)
+
+
+def test_shared_result_is_reused(key):
+    calls = []
+    first = single_flight("test", key, lambda: calls.append(1) or "shared", share=True)
+    second = single_flight("test", key, lambda: calls.append(1) or "recomputed", share=True)
+    assert first == second == "shared"
+    assert len(calls) == 1
+
+
+def test_waits_for_another_process_lock(key):
+    lock_key = f"lock::test::{key}"
+    assert flight_store().add(lock_key, -1, expire=60)  # held by "another process"
+    done = threading.Event()
+
+    with ThreadPoolExecutor(1) as pool:
+        pending = pool.submit(lambda: (single_flight("test", key, lambda: "mine"), done.set())[0])
+        time.sleep(0.1)
+        assert not done.is_set()
+        flight_store().delete(lock_key)
+        assert pending.result(5) == "mine"
+    assert flight_store().get(lock_key) is None
+
+
+# --------------------------------
+# Streaming
+# --------------------------------
+def test_stream_followers_get_the_full_list(key):
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def chunks():
+        calls.append(1)
+        yield "a"
+        started.set()
+        release.wait(5)
+        yield "b"
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(lambda: list(single_flight_iter("test", key, chunks))) for _ in range(3)]
+        wait_for_leader(started)
+        release.set()
+        results = [f.result(5) for f in futures]
+
+    assert results == [["a", "b"]] * 3
+    assert len(calls) == 1
+
+
+def test_abandoned_stream_lets_followers_compute(key):
+    def chunks():
+        yield "a"
+        yield "b"
+
+    leader = single_flight_iter("test", key, chunks)
+    assert next(leader) == "a"  # the leader now holds the flight
+
+    with ThreadPoolExecutor(1) as pool:
+        follower = pool.submit(lambda: list(single_flight_iter("test", key, chunks)))
+        time.sleep(0.05)
+        leader.close()
+        assert follower.result(5) == ["a", "b"]
@@ -0,0 +1,67 @@
+"""
+tests/test_snippet_corpus.py
+
+When stored snippets may stand in for a live search.
+"""
+
+import pytest
+
+from core.snippet_corpus import SnippetCorpus, covers
+from core.similarity_index import content_words
+
+SOURCES = ("nih.gov", "cdc.gov", "mayoclinic.org")
+
+
+def words(question: str) -> frozenset:
+    return frozenset(content_words(question))
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return SnippetCorpus(str(tmp_path / "corpus.sqlite3"))
+
+
+def fill(corpus, text: str) -> None:
+    for src in SOURCES:
+        corpus.add(src, "stored question", f"{src}: {text}")
+
+
+def test_numbers_must_match():
+    question = words("what is the treatment for type 2 diabetes")
+    assert not covers(question, "Treatment of type 1 diabetes relies on insulin.")
+    assert covers(question, "Treatment of type 2 diabetes starts with metformin.")
+
+
+def test_short_tokens_must_match():
+    question = words("symptoms of hepatitis b")
+    assert not covers(question, "Hepatitis C symptoms include fatigue and jaundice.")
+    assert covers(question, "Hepatitis B symptoms include fatigue and jaundice.")
+
+
+def test_short_questions_need_every_word():
+    question = words("migraine aura treatment")
+    assert not covers(question, "A migraine aura often precedes the headache.")
+    assert covers(question, "Treatment of migraine with aura avoids oestrogen.")
+
+
+def test_longer_questions_allow_partial_coverage():
+    question = words("what causes high blood pressure in older adults")
+    assert covers(question, "Stiff arteries are common causes of high blood pressure in older adults.")
+    assert covers(question, "Stiff arteries are common causes of high blood pressure in adults.")
+    assert not covers(question, "Blood pressure is measured in adults with a cuff.")
+
+
+def test_lookup_does_not_answer_a_different_condition(corpus):
+    fill(corpus, "Treatment of type 1 diabetes relies on insulin injections.")
+    assert corpus.lookup("what is the treatment for type 2 diabetes") == {}
+    fill(corpus, "Treatment of type 2 diabetes starts with lifestyle change and metformin.")
+    found = corpus.lookup("what is the treatment for type 2 diabetes")
+    assert set(found) == set(SOURCES)
+    assert all("type 2" in text and "type 1" not in text for text in found.values())
+
+
+def test_lookup_needs_enough_sources(corpus):
+    corpus.add("nih.gov", "q", "Asthma symptoms include wheezing.")
+    corpus.add("nih.gov", "q", "Asthma symptoms include coughing at night.")
+    corpus.add("nih.gov", "q", "Asthma symptoms include chest tightness.")
+    assert corpus.lookup("asthma symptoms") == {}
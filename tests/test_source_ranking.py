@@ -0,0 +1,79 @@
+"""
+tests/test_source_ranking.py
+
+BM25 ranking of search passages and packing them into the source token budget,
+including the edges of the budget.
+"""
+
+from core.rate_limiter import estimate_tokens
+from services.search_engine import failure_message
+from services.source_ranking import bm25_scores, pack_sources, rank_passages, render_sources, NO_SOURCES_TEXT
+
+QUESTION = "What causes asthma attacks?"
+
+# Each sentence is long enough to be a passage of its own
+ASTHMA = (
+    "Asthma attacks are often caused by allergens such as pollen, dust mites, mould and pet dander in the home. "
+    "Cold air, exercise and respiratory infections can also trigger asthma attacks in people with sensitive airways."
+)
+ANATOMY = (
+    "The lungs sit in the chest on either side of the heart and are protected by the ribs and the diaphragm below. "
+    "Air reaches them through the trachea, which divides into two main bronchi and then many smaller branches."
+)
+SMOKE = "Tobacco smoke and air pollution irritate the airways and are a common cause of asthma attacks in children and adults alike."
+COLDS = "Viral colds cause many asthma attacks."
+SOURCES = {"a.org": ASTHMA, "b.org": SMOKE, "c.org": COLDS}
+
+
+def test_bm25_prefers_matching_and_rarer_terms():
+    docs = [["asthma", "attack", "pollen"], ["lung", "chest", "rib"], ["asthma", "lung", "chest"]]
+    scores = bm25_scores(["asthma", "pollen"], docs)
+    assert scores[1] == 0
+    assert scores[0] > scores[2] > 0  # "pollen" is rarer than "asthma"
+    assert bm25_scores(["asthma"], []) == []
+
+
+def test_rank_drops_unrelated_and_failed_sources():
+    sources = {"a.org": ANATOMY, "b.org": ASTHMA, "c.org": failure_message("boom")}
+    ranked = rank_passages(sources, QUESTION)
+    assert ranked and {src for _, _, src, _ in ranked} == {"b.org"}
+    assert [score for score, *_ in ranked] == sorted((score for score, *_ in ranked), reverse=True)
+
+
+def test_rank_keeps_everything_in_order_when_nothing_matches():
+    ranked = rank_passages({"a.org": ANATOMY}, "xylophone")
+    assert [pos for _, pos, _, _ in ranked] == list(range(len(ranked)))
+    assert len(ranked) == 2
+
+
+def ranked_tokens() -> list:
+    """(source, estimated tokens) of each passage of SOURCES, best first."""
+    return [(src, estimate_tokens(passage)) for _, _, src, passage in rank_passages(SOURCES, QUESTION)]
+
+
+def test_budget_that_fits_exactly_keeps_every_passage():
+    budget = sum(tokens for _, tokens in ranked_tokens())
+    assert pack_sources(SOURCES, QUESTION, budget) == SOURCES
+
+
+def test_budget_one_short_drops_the_weakest_passage():
+    ranked = ranked_tokens()
+    budget = sum(tokens for _, tokens in ranked) - 1
+    weakest = ranked[-1][0]
+    assert pack_sources(SOURCES, QUESTION, budget) == {src: text for src, text in SOURCES.items() if src != weakest}
+
+
+def test_best_passage_is_kept_even_over_budget():
+    best = ranked_tokens()[0][0]
+    assert pack_sources(SOURCES, QUESTION, budget=0) == {best: SOURCES[best]}
+
+
+def test_syndicated_duplicate_is_packed_once():
+    packed = pack_sources({"a.org": SMOKE, "b.org": SMOKE, "c.org": ASTHMA}, QUESTION)
+    assert "a.org" in packed and "b.org" not in packed
+    assert list(packed) == [src for src in ("a.org", "b.org", "c.org") if src in packed]
+
+
+def test_render_sources():
+    assert render_sources({}) == NO_SOURCES_TEXT
+    assert render_sources({"a.org": "x", "b.org": "y"}) == "[a.org] x\n[b.org] y"
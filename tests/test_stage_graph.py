@@ -0,0 +1,150 @@
+"""
+tests/test_stage_graph.py
+
+Behaviour of the per-answer stage scheduler: ordering, background overlap,
+progress replay and cancellation.
+"""
+
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pytest
+
+from core.progress import progress_listener, report
+from core.stage_graph import StageGraph
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(4) as pool:
+        yield pool
+
+
+def test_caller_stages_run_once_in_dependency_order(executor):
+    ran = []
+    graph = StageGraph(executor)
+    graph.add("a", lambda: ran.append("a") or 1)
+    graph.add("b", lambda a: ran.append("b") or a + 1, after=["a"])
+    graph.add("c", lambda a, b: ran.append("c") or a + b, after=["a", "b"])
+    graph.start()
+    assert graph.result("c") == 3
+    assert graph.result("c") == 3
+    assert ran == ["a", "b", "c"]
+
+
+def test_caller_stages_run_on_the_calling_thread(executor):
+    graph = StageGraph(executor)
+    graph.add("where", threading.get_ident)
+    graph.start()
+    assert graph.result("where") == threading.get_ident()
+
+
+def test_unknown_or_caller_dependency_is_rejected(executor):
+    graph = StageGraph(executor)
+    graph.add("caller", lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add("x", lambda missing: 1, after=["missing"])
+    with pytest.raises(ValueError):
+        graph.add("bg", lambda caller: 1, after=["caller"], background=True)
+
+
+def test_background_stage_overlaps_with_the_caller(executor):
+    release = threading.Event()
+    graph = StageGraph(executor)
+    graph.add("slow", lambda: release.wait(5) and "searched", background=True)
+    graph.add("first", lambda: "translated")
+    graph.start()
+    assert graph.result("first") == "translated"
+    assert not graph.done("slow")
+    release.set()
+    assert graph.result("slow") == "searched"
+
+
+def test_background_chain_starts_when_dependencies_finish(executor):
+    graph = StageGraph(executor)
+    graph.add("a", lambda: 2, background=True)
+    graph.add("b", lambda a: a * 10, after=["a"], background=True)
+    graph.start()
+    assert graph.result("b", timeout=5) == 20
+
+
+def test_background_result_needs_start(executor):
+    graph = StageGraph(executor)
+    graph.add("bg", lambda: 1, background=True)
+    with pytest.raises(RuntimeError):
+        graph.result("bg")
+
+
+def test_errors_surface_from_result(executor):
+    def fail():
+        raise KeyError("boom")
+
+    graph = StageGraph(executor)
+    graph.add("bad", fail, background=True)
+    graph.add("after", lambda bad: bad, after=["bad"], background=True)
+    graph.start()
+    with pytest.raises(KeyError):
+        graph.result("bad", timeout=5)
+    with pytest.raises(KeyError):
+        graph.result("after", timeout=5)
+
+
+def test_background_progress_is_replayed_on_use(executor):
+    events = []
+    graph = StageGraph(executor)
+    graph.add("bg", lambda: report("info", "searching") or "done", background=True)
+    with progress_listener(lambda level, message, data: events.append(message)):
+        graph.start()
+        while not graph.done("bg"):
+            time.sleep(0.01)
+        assert events == []  # held back while nobody uses the result
+        assert graph.result("bg") == "done"
+    assert events == ["searching"]
+
+
+def test_cancelled_stage_stays_quiet(executor):
+    events = []
+    release = threading.Event()
+    graph = StageGraph(executor)
+    graph.add("bg", lambda: release.wait(5) and report("info", "speculating"), background=True)
+    with progress_listener(lambda level, message, data: events.append(message)):
+        graph.start()
+        graph.cancel("bg")
+        release.set()
+        executor.submit(lambda: None).result()
+    assert events == []
+
+
+def test_cancel_skips_the_stage_and_its_dependents(executor):
+    gate = threading.Event()
+    ran = []
+    graph = StageGraph(executor)
+    graph.add("gate", lambda: gate.wait(5), background=True)
+    graph.add("speculative", lambda _: ran.append("speculative"), after=["gate"], background=True)
+    graph.add("dependent", lambda _: ran.append("dependent"), after=["speculative"], background=True)
+    graph.start()
+    graph.cancel("speculative")
+    gate.set()
+    graph.result("gate", timeout=5)
+    executor.submit(lambda: None).result()
+    assert ran == []
+    assert graph.cancelled("dependent").is_set()
+    with pytest.raises(CancelledError):
+        graph.result("dependent", timeout=5)
+
+
+def test_running_stage_sees_cancellation(executor):
+    started, stopped = threading.Event(), threading.Event()
+    graph = StageGraph(executor)
+
+    def long_running():
+        started.set()
+        graph.cancelled("long").wait(5)
+        stopped.set()
+
+    graph.add("long", long_running, background=True)
+    graph.start()
+    assert started.wait(5)
+    graph.cancel("long")
+    assert stopped.wait(5)
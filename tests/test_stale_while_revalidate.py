@@ -0,0 +1,131 @@
+"""
+tests/test_stale_while_revalidate.py
+
+Per-source search cache: stale snippets are served at once and refreshed in the
+background, once per source, without ever being replaced by a failure.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from core.cache_manager import cache
+from core.circuit_breaker import get_breaker
+from core.config import SOURCE_FRESH_TTL
+from services import search_engine
+from services.search_engine import SAFE_SOURCES, medical_search, source_cache_key
+
+pytestmark = pytest.mark.usefixtures("fresh_breakers")
+
+
+class GatedEngine:
+    """Fake search tool whose calls block until `release` is set; sources in `fail` raise."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.release = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, query: str) -> str:
+        src = query.split()[0].removeprefix("site:")
+        with self._lock:
+            self.calls.append(src)
+        assert self.release.wait(5)
+        if src in self.fail:
+            raise RuntimeError(f"{src} is down")
+        return f"fresh {src}"
+
+
+@pytest.fixture
+def engine():
+    fake = GatedEngine()
+    search_engine.get_search_engine.override(fake)
+    yield fake
+    fake.release.set()
+    search_engine.get_search_engine.reset()
+
+
+@pytest.fixture
+def query():
+    return f"stale question {uuid.uuid4().hex}"  # the search cache outlives a single test
+
+
+def seed(query: str, age: float) -> None:
+    """Cache an `age`-second-old snippet from every source."""
+    for src in SAFE_SOURCES:
+        cache.set(source_cache_key(src, query), {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "fetched_at": time.time() - age,
+            "results": f"old {src}",
+        })
+
+
+def cached_snippets(query: str) -> dict:
+    return {src: cache.get(source_cache_key(src, query))["results"] for src in SAFE_SOURCES}
+
+
+def wait_for_refreshes(timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while search_engine._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not search_engine._refreshing
+
+
+def test_stale_entries_are_served_then_refreshed(engine, query):
+    seed(query, SOURCE_FRESH_TTL + 60)
+    start = time.monotonic()
+    assert medical_search(query) == {src: f"old {src}" for src in SAFE_SOURCES}
+    assert time.monotonic() - start < 1  # didn't wait for the (blocked) refresh
+
+    engine.release.set()
+    wait_for_refreshes()
+    assert sorted(engine.calls) == sorted(SAFE_SOURCES)
+    assert cached_snippets(query) == {src: f"fresh {src}" for src in SAFE_SOURCES}
+    assert cache.get(source_cache_key(SAFE_SOURCES[0], query))["fetched_at"] > time.time() - 60
+
+
+def test_fresh_entries_are_not_refreshed(engine, query):
+    seed(query, SOURCE_FRESH_TTL - 60)
+    assert medical_search(query) == {src: f"old {src}" for src in SAFE_SOURCES}
+    engine.release.set()
+    wait_for_refreshes()
+    assert engine.calls == []
+
+
+def test_concurrent_stale_reads_refresh_each_source_once(engine, query):
+    seed(query, SOURCE_FRESH_TTL + 60)
+    for _ in range(5):
+        assert medical_search(query) == {src: f"old {src}" for src in SAFE_SOURCES}
+    engine.release.set()
+    wait_for_refreshes()
+    assert sorted(engine.calls) == sorted(SAFE_SOURCES)
+
+
+def test_failed_refresh_keeps_the_stale_snippet(engine, query):
+    down = SAFE_SOURCES[0]
+    engine.fail.add(down)
+    seed(query, SOURCE_FRESH_TTL + 60)
+    medical_search(query)
+    engine.release.set()
+    wait_for_refreshes()
+    snippets = cached_snippets(query)
+    assert snippets[down] == f"old {down}"
+    assert all(snippets[src] == f"fresh {src}" for src in SAFE_SOURCES[1:])
+    assert medical_search(query)[down] == f"old {down}"  # the failure never shadows it
+
+
+def test_sources_behind_an_open_breaker_are_not_refreshed(engine, query):
+    tripped = SAFE_SOURCES[0]
+    breaker = get_breaker(tripped)
+    while breaker.available():
+        breaker.record_failure()
+    seed(query, SOURCE_FRESH_TTL + 60)
+    assert medical_search(query)[tripped] == f"old {tripped}"
+    engine.release.set()
+    wait_for_refreshes()
+    assert tripped not in engine.calls
+    assert sorted(engine.calls) == sorted(SAFE_SOURCES[1:])
@@ -0,0 +1,116 @@
+"""
+tests/test_tiered_cache.py
+
+Behaviour of the in-process hot tier in front of a DiskCache store.
+"""
+
+import time
+
+import diskcache as dc
+import pytest
+
+from core.tiered_cache import TieredCache
+
+
+class CountingDisk:
+    """A dc.Cache that counts reads, to tell hot hits from disk hits."""
+
+    def __init__(self, directory):
+        self.cache = dc.Cache(str(directory))
+        self.reads = 0
+
+    def get(self, key, default=None, expire_time=False):
+        self.reads += 1
+        return self.cache.get(key, default=default, expire_time=expire_time)
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+
+@pytest.fixture
+def disk(tmp_path):
+    disk = CountingDisk(tmp_path)
+    yield disk
+    disk.cache.close()
+
+
+def test_disk_hit_is_then_served_hot(disk):
+    disk.cache.set("k", "v")
+    cache = TieredCache(disk)
+    assert cache.get("k") == "v"
+    assert cache.get("k") == "v"
+    assert disk.reads == 1
+
+
+def test_write_through(disk):
+    cache = TieredCache(disk)
+    cache.set("k", {"a": 1})
+    assert disk.cache.get("k") == {"a": 1}
+    assert cache.get("k") == {"a": 1}
+    assert disk.reads == 0
+
+
+def test_miss_returns_default(disk):
+    cache = TieredCache(disk)
+    assert cache.get("missing") is None
+    assert cache.get("missing", "fallback") == "fallback"
+    assert "missing" not in cache
+    with pytest.raises(KeyError):
+        cache["missing"]
+
+
+def test_lazy_disk_factory(disk):
+    opened = []
+    cache = TieredCache(lambda: opened.append(1) or disk)
+    assert opened == []
+    cache.set("k", "v")
+    assert opened
+
+
+def test_evicts_least_recently_used(disk):
+    cache = TieredCache(disk, max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")      # "b" is now least recently used
+    cache.set("c", 3)
+    disk.reads = 0
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert disk.reads == 0
+    assert cache.get("b") == 2  # evicted from the hot tier, still on disk
+    assert disk.reads == 1
+
+
+def test_oversized_values_stay_on_disk_only(disk):
+    cache = TieredCache(disk, max_bytes=100)
+    cache.set("big", "x" * 1000)
+    assert cache.get("big") == "x" * 1000
+    assert cache.get("big") == "x" * 1000
+    assert disk.reads == 2
+    assert cache._bytes == 0
+
+
+def test_hot_ttl_bounds_staleness(disk):
+    cache = TieredCache(disk, ttl=0.05)
+    cache.set("k", "old")
+    disk.cache.set("k", "new")  # e.g. written by another process
+    assert cache.get("k") == "old"
+    time.sleep(0.1)
+    assert cache.get("k") == "new"
+
+
+def test_hot_entry_never_outlives_disk_expiry(disk):
+    cache = TieredCache(disk, ttl=60)
+    cache.set("k", "v", expire=0.05)
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+
+def test_delete_and_clear_drop_both_tiers(disk):
+    cache = TieredCache(disk)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is None and disk.cache.get("a") is None
+    cache.clear()
+    assert cache.get("b") is None and len(disk.cache) == 0
+    assert cache._bytes == 0
@@ -4,9 +4,10 @@ utils/formatting.py
 Utility functions to normalize, clean, and deduplicate model responses.
 Ensures consistent source formatting and prevents redundant disclaimers or labels
 """
-import textwrap
 import html
 import re
+import threading
+from collections import OrderedDict
 
 
 # --- Constants ---
@@ -14,8 +15,32 @@ DISCLAIMER_LINE = (
     "⚠️ *This information is for educational purposes only and should not replace professional medical advice.*"
 )
 
+_LABEL_RE = re.compile(r"\*\*(?:question|answer):\*\*", re.IGNORECASE)
+_DISCLAIMER_FOOTER = f"\n\n---\n\n{DISCLAIMER_LINE}"
+
+# (disclaimer, output) of clean_response_text calls, so cleaning an already clean answer is a dict lookup
+_KNOWN_CLEAN_MAX = 512
+_known_clean = OrderedDict()
+_known_clean_lock = threading.Lock()
+
+
+def _is_disclaimer(lower_line: str) -> bool:
+    return "⚠️" in lower_line or "disclaimer" in lower_line
+
 
 # --- Cleaning Helpers ---
+def shorten(text: str, width: int = 180, placeholder: str = "...") -> str:
+    """
+    Collapse whitespace and cut at the last word boundary that fits `width`
+    (a single-pass stand-in for textwrap.shorten, without hyphen splitting).
+    """
+    text = " ".join(text.split())
+    if len(text) <= width:
+        return text
+    cut = text.rfind(" ", 0, width - len(placeholder) + 1)
+    return (text[:cut] if cut > 0 else "") + placeholder
+
+
 def format_sources(sources: dict) -> str:
     """Nicely format a dictionary of {source: snippet} into Markdown."""
     if not sources:
@@ -25,17 +50,14 @@ def format_sources(sources: dict) -> str:
     for site, snippet in sources.items():
         if not isinstance(snippet, str):
             snippet = str(snippet)
-        clean_snippet = html.escape(snippet.replace("\n", " "))
-        shortened = textwrap.shorten(clean_snippet, width=180, placeholder="...")
+        shortened = shorten(html.escape(snippet), width=180, placeholder="...")
         lines.append(f"- **{site}** — {shortened}")
     return "\n\n".join(lines)
 
 
 def strip_question_answer(text: str) -> str:
     """Remove redundant 'Question:' and 'Answer:' labels from responses."""
-    text = re.sub(r"\*\*Question:\*\*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\*\*Answer:\*\*", "", text, flags=re.IGNORECASE)
-    return text.strip()
+    return _LABEL_RE.sub("", text).strip()
 
 
 def remove_duplicate_disclaimers(text: str) -> str:
@@ -44,7 +66,7 @@ def remove_duplicate_disclaimers(text: str) -> str:
     filtered = []
     for line in map(str.strip, text.splitlines()):
         lower_line = line.lower()
-        if any(k in lower_line for k in ["⚠️", "disclaimer"]) and lower_line in seen:
+        if _is_disclaimer(lower_line) and lower_line in seen:
             continue
         seen.add(lower_line)
         filtered.append(line)
@@ -55,18 +77,142 @@ def ensure_single_disclaimer(text: str) -> str:
     """Ensure exactly one disclaimer is present; add it if missing."""
     text = remove_duplicate_disclaimers(text)
     if "⚠️" not in text and "disclaimer" not in text.lower():
-        text += f"\n\n---\n\n{DISCLAIMER_LINE}"
+        text += _DISCLAIMER_FOOTER
     return text.strip()
 
 
-def clean_response_text(text: str) -> str:
+def _remember_clean(disclaimer: bool, text: str) -> None:
+    with _known_clean_lock:
+        _known_clean[(disclaimer, text)] = None
+        _known_clean.move_to_end((disclaimer, text))
+        while len(_known_clean) > _KNOWN_CLEAN_MAX:
+            _known_clean.popitem(last=False)
+
+
+def clean_response_text(text: str, disclaimer: bool = True) -> str:
     """
-    Full cleanup pipeline:
+    Full cleanup pipeline, in one pass over the lines:
     - Strip redundant question/answer markers
     - Remove duplicate disclaimers
-    - Ensure a single final disclaimer
+    - Ensure a single final disclaimer (unless `disclaimer` is False, e.g. for answers
+      written in another language, whose disclaimer comes from the model)
+
+    The result is a fixed point (cleaning it again changes nothing), and recent
+    results are remembered so re-cleaning them costs a single lookup.
     """
-    text = strip_question_answer(text)
-    text = remove_duplicate_disclaimers(text)
-    text = ensure_single_disclaimer(text)
-    return text.strip()
+    with _known_clean_lock:
+        if (disclaimer, text) in _known_clean:
+            _known_clean.move_to_end((disclaimer, text))
+            return text
+
+    seen = set()
+    filtered = []
+    has_disclaimer = False
+    for line in _LABEL_RE.sub("", text).splitlines():
+        line = line.strip()
+        lower_line = line.lower()
+        if _is_disclaimer(lower_line):
+            if lower_line in seen:
+                continue
+            has_disclaimer = True
+        seen.add(lower_line)
+        filtered.append(line)
+
+    cleaned = "\n".join(filtered).strip()
+    if disclaimer and not has_disclaimer:
+        cleaned = (cleaned + _DISCLAIMER_FOOTER).strip()
+    _remember_clean(disclaimer, cleaned)
+    return cleaned
+
+
+class StreamingCleaner:
+    """
+    Incremental version of clean_response_text for streamed output.
+
+    feed() takes raw chunks and returns cleaned text for every completed line;
+    finish() flushes the remainder and appends the disclaimer if none was seen
+    (and `disclaimer` is set). Joining all returned pieces gives the same result as
+    clean_response_text with the same `disclaimer`.
+    Each character is scanned a constant number of times however the stream is chunked.
+    """
+
+    def __init__(self, disclaimer: bool = True):
+        self._disclaimer = disclaimer
+        self._partial = []  # pieces of the current, not yet complete line
+        self._seen = set()
+        self._pending_blanks = 0
+        self._started = False
+        self._has_disclaimer = False
+
+    def feed(self, chunk: str) -> str:
+        if "\n" not in chunk:
+            if chunk:
+                self._partial.append(chunk)
+            return ""
+        lines = chunk.split("\n")
+        if self._partial:
+            lines[0] = "".join(self._partial) + lines[0]
+        tail = lines.pop()
+        self._partial = [tail] if tail else []
+        return "".join([self._emit(line) for line in lines])
+
+    def finish(self) -> str:
+        out = self._emit("".join(self._partial))
+        self._partial = []
+        if self._disclaimer and not self._has_disclaimer:
+            out += ("\n\n" if self._started else "") + f"---\n\n{DISCLAIMER_LINE}"
+        return out
+
+    def _emit(self, line: str) -> str:
+        line = _LABEL_RE.sub("", line).strip()
+        lower_line = line.lower()
+        if _is_disclaimer(lower_line):
+            if lower_line in self._seen:
+                return ""
+            self._has_disclaimer = True
+        self._seen.add(lower_line)
+
+        if not line:
+            # Hold blank lines back so trailing whitespace is never emitted
+            if self._started:
+                self._pending_blanks += 1
+            return ""
+
+        prefix = "\n" * (1 + self._pending_blanks) if self._started else ""
+        self._started = True
+        self._pending_blanks = 0
+        return prefix + line
+
+
+# --- Sectioning ---
+# Lines translated on their own because they recur across answers: headings,
+# whole-line bold labels (optionally after an emoji) and the disclaimer
+_LABEL_LINE_RE = re.compile(r"^\s*(?:#{1,6}\s+\S.*|(?:\S+\s+)?\*\*[^*]+\*\*:?|⚠️.*)\s*$")
+_RULE_LINE_RE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+def split_markdown_sections(text: str) -> list:
+    """
+    Split Markdown into (segment, translatable) pairs that join back with "\\n" to `text`.
+
+    Label lines (headings, bold labels, the disclaimer) are single segments so they
+    can be cached and reused across answers; the body between two labels is one
+    segment; rules and blank lines around them are kept verbatim.
+    """
+    segments = []  # (lines, translatable)
+    current = None  # segment that following lines may extend
+    for line in text.split("\n"):
+        if _RULE_LINE_RE.match(line) or _LABEL_LINE_RE.match(line):
+            segments.append(([line], not _RULE_LINE_RE.match(line)))
+            current = None
+        elif not line.strip() and current is not None:
+            current[0].append(line)  # blank lines stay with the body (or blank run) they follow
+        elif current is not None and current[1]:
+            current[0].append(line)
+        else:
+            current = ([line], bool(line.strip()))
+            segments.append(current)
+
+    pairs = [("\n".join(lines), translatable) for lines, translatable in segments]
+    return [(segment, translatable and bool(_LETTER_RE.search(segment))) for segment, translatable in pairs]
@@ -0,0 +1,117 @@
+"""
+utils/language_detect.py
+
+Offline language identification (script + stopword/vocabulary scoring) used to
+skip the LLM translator for plain-English queries.
+"""
+
+import re
+from typing import Tuple
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Distinctive function words plus common English medical vocabulary, so that
+# short keyword queries ("diabetes symptoms") still score as English.
+_VOCAB = {
+    "en": """
+        the of and to is are was were be been being what whats which who whom why how when where
+        does do did can could should would will shall may might must have has had having
+        i my me you your it its this that these those there their they them we our
+        with about from for at by on or if than then not any some after before during
+        between into without against because should get getting feel feeling help
+        symptom symptoms treatment treatments treat cause causes caused causing pain painful
+        disease diseases medicine medication medications side effect effects risk risks
+        child children kid kids baby pregnancy pregnant blood pressure high low heart
+        chest stomach skin rash cough cold flu headache sore throat sleep weight loss
+        long term chronic acute best way ways prevent prevention diagnosis cure normal
+        dose dosage take taking safe dangerous early signs sign test tests
+    """,
+    "es": """
+        el la los las de del que y en un una unos unas es son por para con sin sobre como cómo
+        qué cuál cuáles cuando cuándo donde dónde porque mi mis tu tus su sus al lo se le les
+        síntomas síntoma tratamiento tratamientos causa causas dolor enfermedad medicamento
+        niños embarazo presión sangre cabeza tengo puedo debo
+    """,
+    "fr": """
+        le la les de des du que qui et en un une est sont pour par avec sans sur comme quoi quel
+        quelle quels quelles quand où pourquoi mon ma mes ton ta tes son sa ses au aux ce cette
+        ces je tu il elle nous vous ils elles symptômes traitement traitements cause causes
+        douleur maladie médicament enfants grossesse tension sang tête
+    """,
+    "de": """
+        der die das den dem des und ist sind ein eine einer eines für mit ohne über wie was
+        welche welcher wann wo warum mein meine dein deine sein seine ich du er sie wir ihr
+        nicht auch bei von zu im symptome behandlung ursache ursachen schmerzen krankheit
+        medikament kinder schwangerschaft blutdruck kopf
+    """,
+    "it": """
+        il lo la gli le di del della dei delle che e è sono per con senza su come cosa quale
+        quali quando dove perché mio mia miei tuo tua suo sua un una uno non anche sintomi
+        trattamento cura causa cause dolore malattia farmaco bambini gravidanza pressione
+        sangue testa
+    """,
+    "pt": """
+        o a os as de do da dos das que e é são para por com sem sobre como quais quando onde
+        porque meu minha teu tua seu sua um uma não também sintomas tratamento causa causas
+        dor doença remédio medicamento crianças gravidez pressão sangue cabeça
+    """,
+    "nl": """
+        de het een en is zijn van voor met zonder over hoe wat welke wanneer waar waarom mijn
+        jouw zijn haar ik jij hij zij wij niet ook bij naar symptomen behandeling oorzaak
+        oorzaken pijn ziekte medicijn kinderen zwangerschap bloeddruk hoofd
+    """,
+}
+VOCAB = {lang: frozenset(words.split()) for lang, words in _VOCAB.items()}
+
+
+def _non_latin_ratio(letters: str) -> float:
+    """Share of letters outside the Latin blocks (Cyrillic, Greek, Arabic, CJK, ...)."""
+    if not letters:
+        return 0.0
+    return sum(1 for ch in letters if ord(ch) > 0x024F) / len(letters)
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """
+    Return (language_code, confidence) for `text`.
+
+    Codes are ISO 639-1 for the languages in VOCAB, "other" for non-Latin scripts
+    and "unknown" when there is not enough evidence (confidence 0.0).
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return "unknown", 0.0
+
+    letters = "".join(words)
+    non_latin = _non_latin_ratio(letters)
+    if non_latin > 0.2:
+        return "other", min(1.0, non_latin + 0.5)
+
+    scores = {lang: sum(1 for w in words if w in vocab) for lang, vocab in VOCAB.items()}
+    best = max(scores, key=scores.get)
+    hits = scores[best]
+    if hits == 0:
+        return "unknown", 0.0
+
+    runner_up = max(score for lang, score in scores.items() if lang != best)
+    share = hits / (hits + runner_up)
+    coverage = hits / len(words)
+    confidence = share * min(1.0, 0.5 + coverage)
+
+    # Accented letters are rare in English medical questions
+    if best == "en" and any(ord(ch) > 0x7F for ch in letters):
+        confidence *= 0.5
+    return best, round(confidence, 3)
+
+
+def is_confidently_english(text: str, threshold: float) -> bool:
+    lang, confidence = detect_language(text)
+    return lang == "en" and confidence >= threshold
+
+
+def looks_english(text: str, threshold: float) -> bool:
+    """Weaker check: English is the best guess, or an all-ASCII query matched no vocabulary at all."""
+    lang, confidence = detect_language(text)
+    if lang == "unknown":
+        return text.isascii()
+    return lang == "en" and confidence >= threshold
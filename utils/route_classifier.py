@@ -0,0 +1,258 @@
+"""
+utils/route_classifier.py
+
+Offline search / no-search query classifier: logistic regression over hashed
+word, word-bigram and word-prefix features, trained on the labelled queries in
+utils/data/route_queries.tsv. Pure Python with ~2k sparse weights, so
+routing a question costs microseconds and no model call.
+
+Train and evaluate (reports cross-validated precision/recall for the model,
+the keyword regex and always-search, and the search calls each would make):
+
+    python -m utils.route_classifier train
+    python -m utils.route_classifier eval
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DATA_PATH = os.path.join(DATA_DIR, "route_queries.tsv")
+DEFAULT_WEIGHTS_PATH = os.path.join(DATA_DIR, "route_weights.json")
+
+SEARCH, NO_SEARCH = "search", "no_search"
+NUM_BUCKETS = 1 << 18
+PREFIX_LEN = 5
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+# --------------------------------
+# Features
+# --------------------------------
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash(): str hashes are salted per process
+    return zlib.crc32(feature.encode("utf-8")) & (NUM_BUCKETS - 1)
+
+
+def features(text: str) -> List[int]:
+    """Hashed feature indices for `text` (duplicates kept, so counts act as weights)."""
+    words = _WORD_RE.findall(text.lower())
+    feats = []
+    prev = "^"
+    for word in words:
+        feats.append("w:" + word)
+        feats.append("b:" + prev + " " + word)
+        if len(word) > PREFIX_LEN:
+            feats.append("p:" + word[:PREFIX_LEN])  # treat/treated/treatment, sympt...
+        prev = word
+    return [_bucket(f) for f in feats]
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+# --------------------------------
+# Model
+# --------------------------------
+class RouteClassifier:
+    """Sparse linear model; `needs_search(text)` compares P(search) with `threshold`."""
+
+    def __init__(self, weights: dict, bias: float = 0.0, threshold: float = 0.5):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+
+    def probability(self, text: str) -> float:
+        w = self.weights
+        return _sigmoid(self.bias + sum(w.get(i, 0.0) for i in features(text)))
+
+    def needs_search(self, text: str) -> bool:
+        return self.probability(text) >= self.threshold
+
+    def to_dict(self) -> dict:
+        return {
+            "num_buckets": NUM_BUCKETS,
+            "prefix_len": PREFIX_LEN,
+            "bias": round(self.bias, 6),
+            "threshold": round(self.threshold, 4),
+            "weights": {str(i): round(v, 4) for i, v in sorted(self.weights.items()) if abs(v) >= 1e-4},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RouteClassifier":
+        if data.get("num_buckets") != NUM_BUCKETS or data.get("prefix_len") != PREFIX_LEN:
+            raise ValueError("route weights were trained with different feature settings; retrain them")
+        weights = {int(i): float(v) for i, v in data["weights"].items()}
+        return cls(weights, float(data["bias"]), float(data["threshold"]))
+
+    def save(self, path: str = DEFAULT_WEIGHTS_PATH) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+            f.write("\n")
+
+
+def load(path: str = DEFAULT_WEIGHTS_PATH) -> RouteClassifier:
+    with open(path, encoding="utf-8") as f:
+        return RouteClassifier.from_dict(json.load(f))
+
+
+# --------------------------------
+# Training
+# --------------------------------
+def load_examples(path: str = DEFAULT_DATA_PATH) -> List[Tuple[str, bool]]:
+    """Read `label<TAB>query` lines (# comments and blank lines skipped) as (query, needs_search)."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            label, query = line.split("\t", 1)
+            if label not in (SEARCH, NO_SEARCH):
+                raise ValueError(f"unknown label {label!r} in {path}")
+            examples.append((query, label == SEARCH))
+    return examples
+
+
+def train(examples: List[Tuple[str, bool]], epochs: int = 30, lr: float = 0.5,
+          l2: float = 1e-4, seed: int = 0) -> RouteClassifier:
+    """Fit a logistic regression with AdaGrad SGD (threshold left at 0.5)."""
+    rng = random.Random(seed)
+    data = [(features(query), 1.0 if label else 0.0) for query, label in examples]
+    weights, grad_sq = {}, {}
+    bias, bias_sq = 0.0, 1e-8
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for feats, y in data:
+            p = _sigmoid(bias + sum(weights.get(i, 0.0) for i in feats))
+            g = p - y
+            bias_sq += g * g
+            bias -= lr * g / math.sqrt(bias_sq)
+            for i in feats:
+                w = weights.get(i, 0.0)
+                gi = g + l2 * w
+                grad_sq[i] = grad_sq.get(i, 1e-8) + gi * gi
+                weights[i] = w - lr * gi / math.sqrt(grad_sq[i])
+    return RouteClassifier(weights, bias)
+
+
+def cross_val_probabilities(examples: List[Tuple[str, bool]], folds: int = 5,
+                            seed: int = 0, **train_kwargs) -> List[float]:
+    """Out-of-fold P(search) for every example (each fold scored by a model that never saw it)."""
+    order = list(range(len(examples)))
+    random.Random(seed).shuffle(order)
+    probs = [0.0] * len(examples)
+    for k in range(folds):
+        held_out = set(order[k::folds])
+        model = train([ex for i, ex in enumerate(examples) if i not in held_out], seed=seed, **train_kwargs)
+        for i in held_out:
+            probs[i] = model.probability(examples[i][0])
+    return probs
+
+
+def pick_threshold(probs: List[float], labels: List[bool], min_recall: float) -> float:
+    """Highest cut-off that still sends at least `min_recall` of the search questions to search."""
+    positives = sorted((p for p, y in zip(probs, labels) if y), reverse=True)
+    if not positives:
+        return 0.5
+    keep = max(math.ceil(min_recall * len(positives)), 1)
+    return min(positives[keep - 1], 0.5)
+
+
+# --------------------------------
+# Evaluation
+# --------------------------------
+def evaluate(predictions: Iterable[bool], labels: Iterable[bool], calls_per_search: int) -> dict:
+    """Precision/recall of the `search` route plus search calls per 1000 questions."""
+    tp = fp = fn = tn = 0
+    for pred, y in zip(predictions, labels):
+        if pred and y:
+            tp += 1
+        elif pred:
+            fp += 1
+        elif y:
+            fn += 1
+        else:
+            tn += 1
+    total = tp + fp + fn + tn
+    per_1k = 1000 / total if total else 0.0
+    return {
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "searches_per_1k": round((tp + fp) * per_1k, 1),
+        "search_calls_per_1k": round((tp + fp) * per_1k * calls_per_search, 1),
+        "unnecessary_search_calls_per_1k": round(fp * per_1k * calls_per_search, 1),
+    }
+
+
+def report(examples: List[Tuple[str, bool]], model: Optional[RouteClassifier] = None, folds: int = 5) -> dict:
+    """Compare always-search and the keyword regex with cross-validated (and, if given, bundled) classifier routing."""
+    # Deferred: the router pulls in the search/summarise services
+    from services.router import keyword_should_search
+    from services.search_engine import SAFE_SOURCES
+
+    calls = len(SAFE_SOURCES)
+    queries = [q for q, _ in examples]
+    labels = [y for _, y in examples]
+    threshold = model.threshold if model else 0.5
+
+    results = {
+        "examples": len(examples),
+        "search_share": round(sum(labels) / len(labels), 4),
+        "calls_per_search": calls,
+        "always_search": evaluate((True for _ in queries), labels, calls),
+        "keywords": evaluate((keyword_should_search(q) for q in queries), labels, calls),
+        "classifier_cv": evaluate((p >= threshold for p in cross_val_probabilities(examples, folds)), labels, calls),
+    }
+    if model:
+        results["classifier_bundled"] = evaluate((model.needs_search(q) for q in queries), labels, calls)
+    cv = results["classifier_cv"]
+    # Negative vs keywords means the classifier searches for questions the regex wrongly answered directly
+    results["search_calls_saved_per_1k"] = {
+        baseline: round(results[baseline]["search_calls_per_1k"] - cv["search_calls_per_1k"], 1)
+        for baseline in ("always_search", "keywords")
+    }
+    results["unnecessary_search_calls_saved_per_1k"] = round(
+        results["keywords"]["unnecessary_search_calls_per_1k"] - cv["unnecessary_search_calls_per_1k"], 1
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train / evaluate the search routing classifier.")
+    parser.add_argument("command", choices=("train", "eval"))
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH, help="Labelled queries (label<TAB>query).")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH, help="Weights file to write (train) or read (eval).")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.93,
+                        help="Cross-validated search recall the chosen threshold must keep.")
+    args = parser.parse_args()
+
+    examples = load_examples(args.data)
+    if args.command == "train":
+        probs = cross_val_probabilities(examples, args.folds)
+        model = train(examples)
+        model.threshold = pick_threshold(probs, [y for _, y in examples], args.min_recall)
+        model.save(args.weights)
+        print(f"Wrote {len(model.weights)} weights to {args.weights} (threshold {model.threshold:.3f})")
+    else:
+        model = load(args.weights)
+    print(json.dumps(report(examples, model, args.folds), indent=2))
+
+
+if __name__ == "__main__":
+    main()